@@ -1,17 +1,35 @@
 import os
-from flask import Flask, request, jsonify, make_response
+from flask import Flask, Response, request, jsonify, make_response
 from flask_cors import CORS
 from json_unicode import jsonify_unicode
+from sheet_cache import Snapshot, SnapshotCache
+from http_client import http_get, http_stream
+from sheet_table import SheetTable, SHEET_NAME_KEY, as_sheet_table
+from normalization import GENDER, GRADE, GRADE_BAND, REGION, SCHOOL, LLM_USAGE, GRADE_BANDS, CANONICAL_FIELDS, normalize_table
+from crosstab import crosstab
+from keyword_index import keyword_index
+from row_filter import AllOf, ColumnIn, ColumnWhere
+from prompt_budget import PromptBudget, truncate_to_tokens
+from row_ranking import row_ranker
+from column_relevance import column_index
+from survey_dates import survey_period, survey_periods_by_sheet
+from prefetch import PrefetchScheduler
+from snapshot_store import open_snapshot_store
+from google_clients import get_google_service
 from functools import wraps
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from anthropic import Anthropic
 from dotenv import load_dotenv
 import json
-import requests
+import re
+import time
+import atexit
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import csv
 import io
+import tempfile
 import pickle
 from datetime import datetime
 
@@ -63,6 +81,55 @@ SPREADSHEET_ID = '1-wkdWGG1aE9yfYNN0GFoIQXRxKTSf0x8ZcltGCgYltI'
 RANGE_NAME = 'Sheet1!A:Z'  # Sheet1의 모든 열 읽기
 DEFAULT_SHEET_GID = '187909252'  # Sheet1's GID
 
+# On-disk copy of the last fetched sheets/documents for fast cold starts (empty path disables it).
+# The default location survives process restarts only; deploys that replace the service
+# directory (Render) need a path on a persistent disk, see render.yaml
+SNAPSHOT_STORE_PATH = os.getenv('SNAPSHOT_STORE_PATH', os.path.join(os.path.dirname(__file__), '.snapshot_store.sqlite3'))
+snapshot_store = open_snapshot_store(SNAPSHOT_STORE_PATH)
+
+# Sheet snapshot cache - (spreadsheet_id, gid) -> parsed rows
+# Fresh for SHEET_CACHE_TTL seconds, then served stale while a background refresh runs
+SHEET_CACHE_TTL = float(os.getenv('SHEET_CACHE_TTL', '60'))
+SHEET_CACHE_MAX_STALE = float(os.getenv('SHEET_CACHE_MAX_STALE', '3600'))
+sheet_cache = SnapshotCache(ttl=SHEET_CACHE_TTL, max_stale=SHEET_CACHE_MAX_STALE, name='sheets',
+                            restore=lambda key: restore_sheet_snapshot(key))
+
+# Sheet exports larger than this are spooled to a temp file while downloading
+SHEET_SPOOL_MAX_MEMORY = int(os.getenv('SHEET_SPOOL_MAX_MEMORY', str(8 * 1024 * 1024)))
+
+# Append-only sync: fetch only new rows via the Sheets API when credentials are available,
+# with a full export at least every SHEET_FULL_SYNC_INTERVAL seconds to pick up edits
+SHEET_INCREMENTAL_SYNC = os.getenv('SHEET_INCREMENTAL_SYNC', 'true').lower() in ('1', 'true', 'yes')
+SHEET_FULL_SYNC_INTERVAL = float(os.getenv('SHEET_FULL_SYNC_INTERVAL', '3600'))
+
+# Interview transcript cache - document_id -> text content
+DOC_CACHE_TTL = float(os.getenv('DOC_CACHE_TTL', '300'))
+DOC_CACHE_MAX_STALE = float(os.getenv('DOC_CACHE_MAX_STALE', '86400'))
+doc_cache = SnapshotCache(ttl=DOC_CACHE_TTL, max_stale=DOC_CACHE_MAX_STALE, name='docs',
+                          restore=lambda key: restore_doc_snapshot(key))
+
+# Upper bound on concurrent sheet fetches for a single /api/chat request
+SHEET_FETCH_MAX_WORKERS = int(os.getenv('SHEET_FETCH_MAX_WORKERS', '4'))
+
+# Background prefetch of every registered data source
+PREFETCH_ENABLED = os.getenv('PREFETCH_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+PREFETCH_INTERVAL = float(os.getenv('PREFETCH_INTERVAL', '300'))
+PREFETCH_JITTER = float(os.getenv('PREFETCH_JITTER', '0.2'))
+PREFETCH_MAX_WORKERS = int(os.getenv('PREFETCH_MAX_WORKERS', '2'))
+
+# Prompt size: statistics, column list, search results and instructions always go in;
+# sample rows (and the cells in them) fill the rest of this estimated input-token budget
+PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', '12000'))
+PROMPT_MAX_SAMPLE_ROWS = int(os.getenv('PROMPT_MAX_SAMPLE_ROWS', '100'))
+PROMPT_MIN_CELL_TOKENS = int(os.getenv('PROMPT_MIN_CELL_TOKENS', '40'))
+# Sample rows show only this many question-relevant columns (plus name/gender/grade/region)
+PROMPT_MAX_COLUMNS = int(os.getenv('PROMPT_MAX_COLUMNS', '6'))
+
+# Prompt caching: the system rules and the sheet data card are sent as a stable prefix with
+# cache breakpoints, so follow-up turns on the same data reuse them instead of re-reading them
+# (system blocks with cache_control need anthropic>=0.42, see requirements.txt)
+PROMPT_CACHING = os.getenv('PROMPT_CACHING', 'true').lower() in ('1', 'true', 'yes')
+
 # Custom data sources file
 DATA_SOURCES_FILE = os.path.join(os.path.dirname(__file__), 'data_sources.json')
 
@@ -350,7 +417,7 @@ def extract_participant_info(content):
     
     return participants
 
-def get_google_docs_content(document_id):
+def fetch_google_docs_content(document_id):
     """Fetch content from Google Docs using the document ID"""
     try:
         # First, try to fetch directly via HTTP for public documents
@@ -362,7 +429,7 @@ def get_google_docs_content(document_id):
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
             'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate, br',
+            'Accept-Encoding': 'gzip, deflate',
             'Connection': 'keep-alive',
             'Upgrade-Insecure-Requests': '1'
         }
@@ -371,7 +438,7 @@ def get_google_docs_content(document_id):
         print(f"URL: {export_url}")
         
         # Don't follow redirects automatically to see what's happening
-        response = requests.get(export_url, headers=headers, allow_redirects=False)
+        response = http_get(export_url, headers=headers, follow_redirects=False)
         print(f"Initial response status: {response.status_code}")
         
         # If we get a redirect, it might be to a login page
@@ -384,7 +451,7 @@ def get_google_docs_content(document_id):
                 print(f"Document {document_id} requires authentication (redirect to login)")
             else:
                 # Follow the redirect
-                response = requests.get(redirect_url, headers=headers, allow_redirects=True)
+                response = http_get(redirect_url, headers=headers)
                 print(f"After following redirect, status: {response.status_code}")
         
         if response.status_code == 200:
@@ -401,14 +468,9 @@ def get_google_docs_content(document_id):
         else:
             print(f"HTTP {response.status_code} when fetching document")
         
-        # If direct HTTP failed, try using service account credentials
-        if os.path.exists('credentials.json'):
-            credentials = service_account.Credentials.from_service_account_file(
-                'credentials.json',
-                scopes=['https://www.googleapis.com/auth/documents.readonly']
-            )
-            service = build('docs', 'v1', credentials=credentials)
-            
+        # If direct HTTP failed, try the Docs API (service account or API key)
+        service = get_google_service('docs')
+        if service is not None:
             # Retrieve the document
             document = service.documents().get(documentId=document_id).execute()
             
@@ -422,28 +484,10 @@ def get_google_docs_content(document_id):
             
             return content.strip()
         else:
-            # Try using API key
-            api_key = os.getenv('GOOGLE_API_KEY')
-            if api_key and api_key != 'your_google_api_key_here':
-                service = build('docs', 'v1', developerKey=api_key)
-                
-                # Retrieve the document
-                document = service.documents().get(documentId=document_id).execute()
-                
-                # Extract the text content
-                content = ""
-                for element in document.get('body', {}).get('content', []):
-                    if 'paragraph' in element:
-                        for text_element in element['paragraph'].get('elements', []):
-                            if 'textRun' in text_element:
-                                content += text_element['textRun'].get('content', '')
-                
-                return content.strip()
-            else:
-                print("Warning: No Google API credentials found for Docs API")
-                # If we couldn't fetch via HTTP and have no API credentials, return None
-                if response.status_code != 200:
-                    return None
+            print("Warning: No Google API credentials found for Docs API")
+            # If we couldn't fetch via HTTP and have no API credentials, return None
+            if response.status_code != 200:
+                return None
     
     except HttpError as e:
         if e.resp.status == 403:
@@ -458,6 +502,46 @@ def get_google_docs_content(document_id):
         print(f"Error fetching Google Docs content: {str(e)}")
         return None
 
+def doc_snapshot_loader(document_id):
+    """Return a snapshot cache loader for one Google Docs transcript"""
+    def load(previous):
+        content = fetch_google_docs_content(document_id)
+        if content is None:
+            return None
+        payload = content.encode('utf-8')
+        digest = hashlib.sha256(payload).hexdigest()
+        if previous is not None and previous.digest == digest:
+            snapshot = Snapshot(previous.value, digest=digest)
+            if snapshot_store:
+                snapshot_store.touch('doc', document_id, snapshot.fetched_at)
+            return snapshot
+        
+        snapshot = Snapshot(content, digest=digest)
+        if snapshot_store:
+            snapshot_store.save('doc', document_id, payload, digest, snapshot.fetched_at)
+        return snapshot
+    return load
+
+def restore_doc_snapshot(document_id):
+    """Load a transcript saved by an earlier process (None if there is none)"""
+    stored = snapshot_store.load('doc', document_id) if snapshot_store else None
+    if stored is None:
+        return None
+    payload, digest, fetched_at, meta = stored
+    return Snapshot(payload.decode('utf-8'), fetched_at=fetched_at, digest=digest)
+
+def get_google_docs_content(document_id):
+    """Get Google Docs content by document ID (served from the snapshot cache)"""
+    snapshot = doc_cache.get(document_id, doc_snapshot_loader(document_id))
+    return snapshot.value if snapshot is not None else None
+
+def refresh_doc_snapshot(document_id):
+    """Force a fetch of one Google Docs transcript into the cache"""
+    previous = doc_cache.peek(document_id)
+    snapshot = doc_cache.refresh(document_id, doc_snapshot_loader(document_id))
+    # A failed fetch hands back the previous snapshot unchanged
+    return snapshot is not None and snapshot is not previous
+
 # Save custom data sources
 def save_data_sources(sources):
     """Save custom data sources to file"""
@@ -478,6 +562,12 @@ def add_no_cache_headers(response):
     response.headers['X-Content-Type-Options'] = 'nosniff'
     return response
 
+# Make sure the prefetcher runs in this process (also covers the Flask dev server)
+@app.before_request
+def ensure_prefetch_running():
+    if PREFETCH_ENABLED and not prefetch_scheduler.is_running():
+        start_prefetch()
+
 # Apply no-cache headers to all responses
 @app.after_request
 def after_request(response):
@@ -505,7 +595,7 @@ def perform_google_search(query, num_results=5):
             'hl': 'ko'  # Korean language preference
         }
         
-        response = requests.get(url, params=params)
+        response = http_get(url, params=params)
         
         if response.status_code == 200:
             search_results = response.json()
@@ -530,38 +620,111 @@ def perform_google_search(query, num_results=5):
         print(f"Error in Google Search: {str(e)}")
         return []
 
+# gid -> sheet title, per spreadsheet (titles are needed for A1 ranges)
+_sheet_titles = {}
+
+def get_sheet_title(service, spreadsheet_id, sheet_gid):
+    """Look up a sheet's title by GID (cached per process)"""
+    key = (spreadsheet_id, str(sheet_gid))
+    if key not in _sheet_titles:
+        spreadsheet = service.spreadsheets().get(
+            spreadsheetId=spreadsheet_id,
+            fields='sheets.properties(sheetId,title)'
+        ).execute()
+        for sheet in spreadsheet.get('sheets', []):
+            properties = sheet.get('properties', {})
+            _sheet_titles[(spreadsheet_id, str(properties.get('sheetId', '')))] = properties.get('title')
+    return _sheet_titles.get(key)
+
+def _trim_cells(cells):
+    """Drop trailing empty cells (the Sheets API omits them)"""
+    cells = list(cells)
+    while cells and cells[-1] == '':
+        cells.pop()
+    return cells
+
+def sync_sheet_tail(previous, sheet_gid, sheet_name, spreadsheet_id):
+    """Bring a cached sheet up to date by fetching only rows appended since it was taken
+
+    Response sheets only grow through the form's appendRow, so the rows we
+    already have are re-checked by comparing the header row and the last known
+    row; anything else changing is caught by the periodic full sync. Returns a
+    new Snapshot, or None when a full export is needed (no credentials, edits
+    or deletions detected, full sync due).
+    """
+    table = previous.value
+    if not SHEET_INCREMENTAL_SYNC or not isinstance(table, SheetTable) or len(table) == 0:
+        return None
+    if time.time() - previous.meta.get('full_synced_at', previous.fetched_at) > SHEET_FULL_SYNC_INTERVAL:
+        return None
+    last_known_row = table.raw_row(len(table) - 1)
+    if last_known_row is None:
+        return None
+    
+    service = get_google_service('sheets')
+    if service is None:
+        return None
+    title = get_sheet_title(service, spreadsheet_id, sheet_gid)
+    if not title:
+        return None
+    
+    # Header is sheet row 1, so the last known data row is row len(table) + 1
+    quoted_title = "'" + title.replace("'", "''") + "'"
+    result = service.spreadsheets().values().batchGet(
+        spreadsheetId=spreadsheet_id,
+        ranges=[f"{quoted_title}!1:1", f"{quoted_title}!A{len(table) + 1}:ZZZ"]
+    ).execute()
+    header_range, tail_range = (result.get('valueRanges', []) + [{}, {}])[:2]
+    api_headers = (header_range.get('values') or [[]])[0]
+    tail = tail_range.get('values', [])
+    
+    if _trim_cells(api_headers) != _trim_cells(table.headers):
+        print(f"Sheet {sheet_name or sheet_gid}: header changed, falling back to a full fetch")
+        return None
+    if not tail or _trim_cells(tail[0]) != _trim_cells(last_known_row):
+        print(f"Sheet {sheet_name or sheet_gid}: existing rows were edited or deleted, falling back to a full fetch")
+        return None
+    
+    meta = dict(previous.meta, full_synced_at=previous.meta.get('full_synced_at', previous.fetched_at))
+    new_rows = tail[1:]
+    if not new_rows:
+        return Snapshot(table, digest=previous.digest, meta=meta)
+    
+    # Chain the digest so a later full export is never mistaken for this state
+    digest = hashlib.sha256((previous.digest or '').encode('utf-8') +
+                            json.dumps(new_rows, ensure_ascii=False).encode('utf-8')).hexdigest()
+    print(f"Sheet {sheet_name or sheet_gid}: appended {len(new_rows)} new rows (incremental sync)")
+    return Snapshot(prepare_sheet_table(table.extend_rows(new_rows)), digest=digest, meta=meta)
+
 def get_all_sheet_names():
     """Get all sheet names from the Google Sheets document"""
     try:
         # Try using API first
-        if os.path.exists('credentials.json'):
-            credentials = service_account.Credentials.from_service_account_file(
-                'credentials.json',
-                scopes=['https://www.googleapis.com/auth/spreadsheets.readonly']
-            )
-            service = build('sheets', 'v4', credentials=credentials)
-        else:
-            api_key = os.getenv('GOOGLE_API_KEY')
-            if api_key and api_key != 'your_google_api_key_here':
-                service = build('sheets', 'v4', developerKey=api_key)
-            else:
-                # If no API credentials, return hardcoded sheet IDs for now
-                # You can add more sheet IDs here as needed
-                return [
-                    {'name': 'Sheet1', 'gid': '187909252'},
-                    {'name': 'tablet behavior', 'gid': '2040429429'}
-                ]
-        
-        # Get spreadsheet metadata
-        spreadsheet = service.spreadsheets().get(spreadsheetId=SPREADSHEET_ID).execute()
+        service = get_google_service('sheets')
+        if service is None:
+            # If no API credentials, return hardcoded sheet IDs for now
+            # You can add more sheet IDs here as needed
+            return [
+                {'name': 'Sheet1', 'gid': '187909252'},
+                {'name': 'tablet behavior', 'gid': '2040429429'}
+            ]
+        
+        # Get spreadsheet metadata (titles and grid sizes only, no cell data)
+        spreadsheet = service.spreadsheets().get(
+            spreadsheetId=SPREADSHEET_ID,
+            fields='sheets.properties(sheetId,title,gridProperties(rowCount))'
+        ).execute()
         sheets = spreadsheet.get('sheets', [])
         
         sheet_info = []
         for sheet in sheets:
             properties = sheet.get('properties', {})
+            gid = str(properties.get('sheetId', ''))
+            _sheet_titles[(SPREADSHEET_ID, gid)] = properties.get('title')
             sheet_info.append({
                 'name': properties.get('title', ''),
-                'gid': str(properties.get('sheetId', ''))
+                'gid': gid,
+                'grid_row_count': properties.get('gridProperties', {}).get('rowCount')
             })
         
         return sheet_info
@@ -574,8 +737,35 @@ def get_all_sheet_names():
             {'name': 'tablet behavior', 'gid': '2040429429'}
         ]
 
-def get_sheet_data_by_gid(sheet_gid, sheet_name=None, spreadsheet_id=None):
-    """Get data from a specific sheet by its GID"""
+def spool_response(response, hasher=None):
+    """Copy a streamed response body into a rewound binary buffer
+
+    The body stays in memory up to SHEET_SPOOL_MAX_MEMORY bytes and moves to an
+    anonymous temp file beyond that, so a huge export is never held as bytes,
+    text and parsed rows at the same time.
+    """
+    buffer = io.BytesIO()
+    try:
+        for chunk in response.iter_bytes():
+            if hasher is not None:
+                hasher.update(chunk)
+            buffer.write(chunk)
+            if isinstance(buffer, io.BytesIO) and buffer.tell() > SHEET_SPOOL_MAX_MEMORY:
+                spilled = tempfile.TemporaryFile()
+                spilled.write(buffer.getbuffer())
+                buffer = spilled
+        buffer.seek(0)
+        return buffer
+    except Exception:
+        buffer.close()
+        raise
+
+def fetch_sheet_export(sheet_gid, sheet_name=None, spreadsheet_id=None):
+    """Stream a sheet's raw CSV export
+
+    Returns (buffer, digest) where buffer is a rewound binary file holding the
+    export and digest its SHA-256, or None if the fetch failed.
+    """
     try:
         # Use provided spreadsheet_id or default
         if not spreadsheet_id:
@@ -594,48 +784,215 @@ def get_sheet_data_by_gid(sheet_gid, sheet_name=None, spreadsheet_id=None):
             'Pragma': 'no-cache',
             'Expires': '0'
         }
-        response = requests.get(csv_url, headers=headers)
-        
-        if response.status_code == 200:
-            # Ensure proper UTF-8 encoding
-            response.encoding = 'utf-8'
-            
-            # CSV 데이터 파싱
-            csv_data = csv.reader(io.StringIO(response.text))
-            rows = list(csv_data)
-            
-            if not rows:
-                print(f"Warning: No rows found in sheet {sheet_name or sheet_gid}")
-                return []
-            
-            # 첫 번째 행을 헤더로 사용
-            headers = rows[0]
-            data = []
-            
-            for row in rows[1:]:
-                if row:  # 빈 행 제외
-                    row_dict = {}
-                    for i, header in enumerate(headers):
-                        row_dict[header] = row[i] if i < len(row) else ''
-                    # Add sheet name to each row for tracking
-                    row_dict['_sheet_name'] = sheet_name or f'Sheet_{sheet_gid}'
-                    data.append(row_dict)
-            
-            print(f"Successfully retrieved {len(data)} rows from sheet {sheet_name or sheet_gid}")
-            return data
-        else:
-            print(f"Error: HTTP {response.status_code} when accessing sheet {sheet_name or sheet_gid}")
-            print(f"URL: {csv_url}")
-            if response.status_code == 403:
-                print("Access denied. The sheet might be private or require authentication.")
-            elif response.status_code == 404:
-                print("Sheet not found. Check if the spreadsheet ID and GID are correct.")
+        with http_stream(csv_url, headers=headers) as response:
+            if response.status_code == 200:
+                hasher = hashlib.sha256()
+                buffer = spool_response(response, hasher)
+                return buffer, hasher.hexdigest()
+            else:
+                print(f"Error: HTTP {response.status_code} when accessing sheet {sheet_name or sheet_gid}")
+                print(f"URL: {csv_url}")
+                if response.status_code == 403:
+                    print("Access denied. The sheet might be private or require authentication.")
+                elif response.status_code == 404:
+                    print("Sheet not found. Check if the spreadsheet ID and GID are correct.")
         
-        return []
+        return None
     
     except Exception as e:
         print(f"Error reading sheet {sheet_name or sheet_gid}: {str(e)}")
+        return None
+
+def parse_sheet_csv(source, sheet_gid, sheet_name=None):
+    """Parse a raw CSV export (bytes or a binary file) into a columnar SheetTable
+
+    The export is decoded and parsed line by line and each row goes straight
+    into the column store, so no full decoded copy or list of rows is built.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    
+    # Ensure proper UTF-8 encoding
+    text = io.TextIOWrapper(source, encoding='utf-8', errors='replace', newline='')
+    try:
+        # CSV 데이터 파싱
+        csv_data = csv.reader(text)
+        
+        # 첫 번째 행을 헤더로 사용
+        headers = next(csv_data, None)
+        # Sheet name is kept on the table for tracking (rows expose it as _sheet_name)
+        data = SheetTable(headers or [], sheet_name or f'Sheet_{sheet_gid}')
+        
+        if headers is None:
+            print(f"Warning: No rows found in sheet {sheet_name or sheet_gid}")
+            return prepare_sheet_table(data)
+        
+        for row in csv_data:
+            if row:  # 빈 행 제외
+                data.append_row(row)
+    finally:
+        # Leave the underlying buffer open for the caller
+        text.detach()
+    
+    print(f"Successfully retrieved {len(data)} rows from sheet {sheet_name or sheet_gid}")
+    return prepare_sheet_table(data)
+
+def prepare_sheet_table(table):
+    """Ingest-time work shared by every reader of a snapshot
+
+    Canonical grade/gender/region columns and the keyword index are built
+    once here instead of per request.
+    """
+    normalize_table(table)
+    keyword_index(table)
+    return table
+
+def sheet_snapshot_loader(sheet_gid, sheet_name, spreadsheet_id):
+    """Return a snapshot cache loader for one sheet's CSV export"""
+    def load(previous):
+        if previous is not None:
+            try:
+                snapshot = sync_sheet_tail(previous, sheet_gid, sheet_name, spreadsheet_id)
+            except Exception as e:
+                print(f"Incremental sync of sheet {sheet_name or sheet_gid} failed: {str(e)}")
+                snapshot = None
+            if snapshot is not None:
+                # The on-disk copy is only rewritten by full syncs; after a restart the
+                # tail sync catches up from it again
+                return snapshot
+        
+        fetched = fetch_sheet_export(sheet_gid, sheet_name, spreadsheet_id)
+        if fetched is None:
+            return None
+        
+        buffer, digest = fetched
+        meta = {'full_synced_at': time.time()}
+        store_key = f"{spreadsheet_id}:{sheet_gid}"
+        with buffer:
+            # Most refreshes return identical bytes - keep the parsed rows when the digest matches
+            if previous is not None and previous.digest == digest:
+                print(f"Sheet {sheet_name or sheet_gid} unchanged ({digest[:12]}), reusing parsed rows")
+                snapshot = Snapshot(previous.value, digest=digest, meta=meta)
+                if snapshot_store:
+                    snapshot_store.touch('sheet', store_key, snapshot.fetched_at)
+                return snapshot
+            
+            snapshot = Snapshot(parse_sheet_csv(buffer, sheet_gid, sheet_name), digest=digest, meta=meta)
+            if snapshot_store:
+                buffer.seek(0)
+                snapshot_store.save('sheet', store_key, buffer, digest, snapshot.fetched_at,
+                                    {'sheet_name': sheet_name, 'row_count': len(snapshot.value)})
+        return snapshot
+    return load
+
+def restore_sheet_snapshot(key):
+    """Load a sheet export saved by an earlier process (None if there is none)"""
+    spreadsheet_id, sheet_gid = key
+    stored = snapshot_store.load('sheet', f"{spreadsheet_id}:{sheet_gid}") if snapshot_store else None
+    if stored is None:
+        return None
+    content, digest, fetched_at, meta = stored
+    data = parse_sheet_csv(content, sheet_gid, meta.get('sheet_name'))
+    return Snapshot(data, fetched_at=fetched_at, digest=digest, meta={'full_synced_at': fetched_at})
+
+def get_sheet_data_by_gid(sheet_gid, sheet_name=None, spreadsheet_id=None):
+    """Get data from a specific sheet by its GID (served from the snapshot cache)"""
+    if not spreadsheet_id:
+        spreadsheet_id = SPREADSHEET_ID
+    
+    loader = sheet_snapshot_loader(sheet_gid, sheet_name, spreadsheet_id)
+    snapshot = sheet_cache.get((spreadsheet_id, str(sheet_gid)), loader)
+    if snapshot is None:
         return []
+    
+    data = snapshot.value
+    # The snapshot is shared between callers, so re-label a view instead of the cached table
+    label = sheet_name or f'Sheet_{sheet_gid}'
+    if data.sheet_name != label:
+        data = data.with_name(label)
+    return data
+
+def refresh_sheet_snapshot(sheet_gid, sheet_name=None, spreadsheet_id=None):
+    """Force a fetch of one sheet into the cache"""
+    if not spreadsheet_id:
+        spreadsheet_id = SPREADSHEET_ID
+    key = (spreadsheet_id, str(sheet_gid))
+    previous = sheet_cache.peek(key)
+    snapshot = sheet_cache.refresh(key, sheet_snapshot_loader(sheet_gid, sheet_name, spreadsheet_id))
+    # A failed fetch hands back the previous snapshot unchanged
+    return snapshot is not None and snapshot is not previous
+
+_sheet_fetch_executor = None
+_sheet_fetch_executor_pid = None
+_sheet_fetch_executor_lock = threading.Lock()
+
+def get_sheet_fetch_executor():
+    """Shared bounded thread pool for fetching several sheets at once"""
+    global _sheet_fetch_executor, _sheet_fetch_executor_pid
+    with _sheet_fetch_executor_lock:
+        # Pools do not survive a fork - create one per worker process
+        if _sheet_fetch_executor is None or _sheet_fetch_executor_pid != os.getpid():
+            _sheet_fetch_executor = ThreadPoolExecutor(max_workers=SHEET_FETCH_MAX_WORKERS,
+                                                       thread_name_prefix='sheet-fetch')
+            _sheet_fetch_executor_pid = os.getpid()
+        return _sheet_fetch_executor
+
+def fetch_sheets_parallel(sheets, spreadsheet_id=None):
+    """Fetch several sheets concurrently and return (sheet, data) pairs in input order"""
+    def fetch(sheet):
+        try:
+            # Use the provided spreadsheet_id for custom sheets
+            return get_sheet_data_by_gid(sheet['gid'], sheet['name'], spreadsheet_id)
+        except Exception as e:
+            print(f"Error fetching sheet {sheet.get('name')}: {str(e)}")
+            return []
+    
+    if len(sheets) <= 1:
+        return [(sheet, fetch(sheet)) for sheet in sheets]
+    return list(zip(sheets, get_sheet_fetch_executor().map(fetch, sheets)))
+
+def list_prefetch_sources():
+    """All sources the prefetcher keeps warm: default sheets plus data_sources.json"""
+    sources = {}
+    for sheet in get_all_sheet_names():
+        gid, name = sheet['gid'], sheet['name']
+        sources[f"sheet:{SPREADSHEET_ID}:{gid}"] = {
+            'label': name,
+            'refresh': lambda gid=gid, name=name: refresh_sheet_snapshot(gid, name, SPREADSHEET_ID)
+        }
+    for source in load_data_sources():
+        if source.get('type') == 'interview':
+            document_id = source.get('document_id')
+            if document_id:
+                sources[f"doc:{document_id}"] = {
+                    'label': source.get('title'),
+                    'refresh': lambda document_id=document_id: refresh_doc_snapshot(document_id)
+                }
+        elif source.get('gid') and source.get('spreadsheet_id'):
+            gid, name, spreadsheet_id = source['gid'], source.get('title'), source['spreadsheet_id']
+            sources.setdefault(f"sheet:{spreadsheet_id}:{gid}", {
+                'label': name,
+                'refresh': lambda gid=gid, name=name, spreadsheet_id=spreadsheet_id: refresh_sheet_snapshot(gid, name, spreadsheet_id)
+            })
+    return [dict(source, key=key) for key, source in sources.items()]
+
+prefetch_scheduler = PrefetchScheduler(
+    list_prefetch_sources,
+    interval=PREFETCH_INTERVAL,
+    jitter=PREFETCH_JITTER,
+    max_workers=PREFETCH_MAX_WORKERS
+)
+
+def start_prefetch():
+    """Start the background prefetcher if PREFETCH_ENABLED is set"""
+    if PREFETCH_ENABLED:
+        prefetch_scheduler.start()
+
+def stop_prefetch():
+    """Stop the background prefetcher"""
+    prefetch_scheduler.stop()
+
+atexit.register(stop_prefetch)
 
 def determine_sheet_context(user_question):
     """Determine which sheet(s) to query based on the question content"""
@@ -721,49 +1078,24 @@ def process_sheet_data(sheet_name, sheet_rows, user_question, sheet_date=None):
     if not sheet_rows:
         return None
     
+    sheet_rows = normalize_table(as_sheet_table(sheet_rows, sheet_name))
+    
     summary = f"[{sheet_name} 데이터 분석]\n"
     if sheet_date:
         summary += f"조사 시기: {sheet_date}\n"
     summary += f"응답자 수: {len(sheet_rows)}명\n"
     
-    # 기본 통계 계산
-    gender_stats = {}
-    grade_stats = {}
-    region_stats = {}
-    
     # 태블릿 관련 키워드 검색
     tablet_keywords = ['태블릿', 'tablet', 'ipad', '아이패드', '갤탭', 'tab']
-    tablet_users = []
     
-    for row in sheet_rows:
-        # 성별 통계
-        gender = row.get('성별이 어떻게 되나요?', '').strip()
-        if gender:
-            gender_stats[gender] = gender_stats.get(gender, 0) + 1
-        
-        # 학년 통계
-        grade = row.get('현재 학년이 어떻게 되나요?', '').strip()
-        if grade:
-            if grade in ['춈8', '춈2', '춈3', '춈4', '춈5', '춈6']:
-                grade_stats['초등학생'] = grade_stats.get('초등학생', 0) + 1
-            elif grade in ['중1', '중2', '중3']:
-                grade_stats['중학생'] = grade_stats.get('중학생', 0) + 1
-            elif grade in ['고1', '고2', '고3']:
-                grade_stats['고등학생'] = grade_stats.get('고등학생', 0) + 1
-            else:
-                grade_stats[grade] = grade_stats.get(grade, 0) + 1
-        
-        # 지역 통계
-        region = row.get('현재 거주중인 지역이 어디인가요? ', '') or row.get('거주지역', '')
-        region = region.strip()
-        if region:
-            region_stats[region] = region_stats.get(region, 0) + 1
-        
-        # 태블릿 사용자 확인
-        for key, value in row.items():
-            if any(keyword in str(value).lower() for keyword in tablet_keywords):
-                tablet_users.append(row)
-                break
+    # 학년 통계 - 수집 시 정규화된 컬럼 사용
+    grade_stats = {band: count for band, count in sheet_rows.value_counts(GRADE_BAND).items() if band}
+    
+    # 태블릿 사용자 확인 - 수집 시 만든 키워드 색인에서 조회 (시트 스냅샷당 한 번)
+    def find_tablet_mentions(table):
+        tablet_row_indices, tablet_mention_columns = keyword_index(table).mentions(tablet_keywords)
+        return table.take(tablet_row_indices), tablet_mention_columns
+    tablet_users, tablet_mention_columns = sheet_rows.derive('tablet_mentions', find_tablet_mentions)
     
     # 질문에 따라 관련 정보만 포함
     if '태블릿' in user_question:
@@ -772,11 +1104,7 @@ def process_sheet_data(sheet_name, sheet_rows, user_question, sheet_date=None):
             
             # 태블릿 사용자의 다양한 특징 분석
             # 1. 학년 분석
-            tablet_grades = {}
-            for user in tablet_users:
-                grade = user.get('현재 학년이 어떻게 되나요?', '').strip()
-                if grade:
-                    tablet_grades[grade] = tablet_grades.get(grade, 0) + 1
+            tablet_grades = {grade: count for grade, count in tablet_users.value_counts(GRADE).items() if grade}
             
             if tablet_grades:
                 summary += "\n태블릿 사용자 학년 분포:\n"
@@ -785,11 +1113,7 @@ def process_sheet_data(sheet_name, sheet_rows, user_question, sheet_date=None):
                     summary += f"  - {grade}: {count}명 ({percentage:.1f}%)\n"
             
             # 2. 성별 분석
-            tablet_genders = {}
-            for user in tablet_users:
-                gender = user.get('성별이 어떻게 되나요?', '').strip()
-                if gender:
-                    tablet_genders[gender] = tablet_genders.get(gender, 0) + 1
+            tablet_genders = {gender: count for gender, count in tablet_users.value_counts(GENDER).items() if gender}
             
             if tablet_genders:
                 summary += "\n태블릿 사용자 성별 분포:\n"
@@ -798,11 +1122,7 @@ def process_sheet_data(sheet_name, sheet_rows, user_question, sheet_date=None):
                     summary += f"  - {gender}: {count}명 ({percentage:.1f}%)\n"
             
             # 3. 지역 분석
-            tablet_regions = {}
-            for user in tablet_users:
-                region = user.get('현재 거주중인 지역이 어디인가요? ', '').strip()
-                if region:
-                    tablet_regions[region] = tablet_regions.get(region, 0) + 1
+            tablet_regions = {region: count for region, count in tablet_users.value_counts(REGION).items() if region}
             
             if tablet_regions:
                 summary += "\n태블릿 사용자 상위 5개 지역:\n"
@@ -812,13 +1132,6 @@ def process_sheet_data(sheet_name, sheet_rows, user_question, sheet_date=None):
                     summary += f"  - {region}: {count}명 ({percentage:.1f}%)\n"
             
             # 4. 어떤 컬럼에서 태블릿이 언급되었는지 분석
-            tablet_mention_columns = {}
-            for user in tablet_users:
-                for key, value in user.items():
-                    if any(keyword in str(value).lower() for keyword in tablet_keywords):
-                        if key not in ['_sheet_name'] and key:
-                            tablet_mention_columns[key] = tablet_mention_columns.get(key, 0) + 1
-            
             if tablet_mention_columns:
                 summary += "\n태블릿이 언급된 주요 항목:\n"
                 for col, count in sorted(tablet_mention_columns.items(), key=lambda x: x[1], reverse=True)[:3]:
@@ -836,12 +1149,165 @@ def process_sheet_data(sheet_name, sheet_rows, user_question, sheet_date=None):
     
     return summary
 
+# "학년별로 ..." 질문은 전체 데이터로 정확히 교차 집계해서 프롬프트에 넣음
+# (질문 표현, 기준이 되는 정규화 컬럼, 표시 이름)
+CROSSTAB_DIMENSIONS = [
+    ('학년별로', GRADE, '학년별'),
+    ('성별로', GENDER, '성별'),
+    ('지역별로', REGION, '지역별'),
+]
+CROSSTAB_MAX_CATEGORIES = 30  # 이보다 답변 종류가 많은 컬럼은 주관식으로 보고 제외
+CROSSTAB_MAX_TARGETS = 3
+CROSSTAB_TOP_ANSWERS = 8
+CROSSTAB_SAMPLE_ROWS = 10  # 교차표가 있으면 원본 행은 참고용으로만 조금 포함
+
+def find_crosstab_targets(sheet_data, user_question, exclude=()):
+    """질문과 단어가 겹치는 객관식 컬럼 찾기 (예: '재미있는 과목' -> '다음 중 가장 *재미있는* 과목을...')"""
+    words = [word.strip('?.,!~') for word in user_question.split()]
+    words = [word for word in words if len(word) >= 2 and not word.endswith('별로')]
+    scored = []
+    for name in sheet_data.column_names:
+        if name in exclude or name == SHEET_NAME_KEY:
+            continue
+        if len(sheet_data.columns[name].categories) > CROSSTAB_MAX_CATEGORIES:
+            continue
+        header = name.replace('*', '')
+        # 조사 한 글자("과목을", "학생들이")까지는 떼고 비교
+        score = sum(1 for word in words if word in header or (len(word) > 2 and word[:-1] in header))
+        if score:
+            scored.append((score, name))
+    if not scored:
+        return []
+    # 가장 많이 겹치는 컬럼만 사용 ("하고", "있는" 같은 흔한 말로 걸린 컬럼 제외)
+    best = max(score for score, _ in scored)
+    return [name for score, name in scored if score == best][:CROSSTAB_MAX_TARGETS]
+
+def build_crosstab_section(sheet_data, user_question):
+    """Exact group-by tables for 학년별로/성별로/지역별로 questions ('' when not applicable)"""
+    sources = {field.name: field.sources for field in CANONICAL_FIELDS}
+    section = ""
+    for phrase, dimension, label in CROSSTAB_DIMENSIONS:
+        if phrase not in user_question:
+            continue
+        targets = find_crosstab_targets(sheet_data, user_question, exclude=sources.get(dimension, ()))
+        for target in targets:
+            table = crosstab(sheet_data, dimension, target)
+            if not table:
+                continue
+            section += f"\n{label} × {target} (응답 {table.total}명):\n"
+            for group in table.groups():
+                answers = ", ".join(f"{answer} {count}명 ({percentage:.1f}%)"
+                                    for answer, count, percentage in table.top_answers(group, CROSSTAB_TOP_ANSWERS))
+                section += f"  - {group} ({table.group_totals[group]}명): {answers}\n"
+    if section:
+        section = (f"\n[교차 분석 - 전체 {len(sheet_data)}개 데이터 기준 정확한 집계]\n"
+                   "아래 수치는 샘플이 아닌 전체 응답을 집계한 것이므로 그대로 인용하세요.\n" + section)
+    return section
+
+def format_summary_statistics(sheet_data):
+    """성별/학년/지역/학교/LLM 사용 분포 (전체 행 기준 정확한 집계)"""
+    section = ""
+    # 기본 통계 계산
+    gender_stats = {}
+    grade_stats = {}
+    llm_usage_stats = {}
+    
+    # 성별/학년 통계 - alias 컬럼과 "01. 중2" 형식은 수집 시 정규화됨
+    for gender, count in sheet_data.value_counts(GENDER).items():
+        if gender:
+            gender_stats[gender] = count
+    
+    for band, count in sheet_data.value_counts(GRADE_BAND).items():
+        if band:
+            grade_stats[band] = count
+    
+    # Check for child grade column (for parent surveys) - Updated column name
+    for child_grade, count in sheet_data.value_counts('현재 자녀의 학년').items():
+        child_grade = child_grade.strip()
+        # Use exact values from spreadsheet
+        if child_grade in ['초등 자녀', '중등 자녀', '고등 자녀']:
+            grade_stats[child_grade] = grade_stats.get(child_grade, 0) + count
+    
+    # LLM 사용 통계
+    for usage, count in sheet_data.value_counts(LLM_USAGE).items():
+        if usage:
+            llm_usage_stats[usage] = count
+    
+    # 요약 통계 출력
+    if gender_stats:
+        section += "\n성별 분포:\n"
+        for gender, count in gender_stats.items():
+            percentage = (count / len(sheet_data)) * 100
+            section += f"  - {gender}: {count}명 ({percentage:.1f}%)\n"
+    
+    if grade_stats:
+        section += "\n학년 분포:\n"
+        for grade, count in sorted(grade_stats.items()):
+            percentage = (count / len(sheet_data)) * 100
+            section += f"  - {grade}: {count}명 ({percentage:.1f}%)\n"
+    
+    # 지역/학교 - 긴 꼬리 컬럼은 상위 5개와 나머지 고유값 수만 표시 (전체 응답 기준 정확한 집계)
+    for name, title, unit in [(REGION, '지역 분포', '지역'), (SCHOOL, '학교 분포', '학교')]:
+        top_values = sheet_data.top_values(name, 5)
+        if not top_values:
+            continue
+        section += f"\n{title}:\n"
+        for value, count in top_values:
+            percentage = (count / len(sheet_data)) * 100
+            section += f"  - {value}: {count}명 ({percentage:.1f}%)\n"
+        distinct = sheet_data.distinct_count(name)
+        if distinct > 5:
+            section += f"  - 기타 {distinct - 5}개 {unit}\n"
+    
+    if llm_usage_stats:
+        section += "\nLLM 사용 현황:\n"
+        for usage, count in llm_usage_stats.items():
+            percentage = (count / len(sheet_data)) * 100
+            section += f"  - {usage}: {count}명 ({percentage:.1f}%)\n"
+    return section
+
 def create_prompt(user_question, sheet_data, search_results=None):
     """사용자 질문과 시트 데이터, 웹 검색 결과를 결합하여 프롬프트 생성"""
-    prompt_parts = []
+    return build_prompt(user_question, sheet_data, search_results)[0]
+
+def build_prompt(user_question, sheet_data, search_results=None, selection=None):
+    """Build the prompt within PROMPT_TOKEN_BUDGET; returns (prompt, usage)"""
+    data_card, request_prompt, usage = build_prompt_sections(user_question, sheet_data, search_results,
+                                                             selection)
+    return data_card + request_prompt, usage
+
+def build_prompt_sections(user_question, sheet_data, search_results=None, selection=None):
+    """Build the prompt as (data_card, request_prompt, usage)
+    
+    ``data_card`` depends only on ``sheet_data`` (statistics, column list and
+    guidelines) and stays the same across questions about it, so it can be
+    cached; ``request_prompt`` holds what the question selects - the
+    statistics of the rows in ``selection`` (ascending row indices a
+    follow-up question narrowed the sheet to, if any), crosstabs, sample
+    rows, search results and instructions, all computed over those rows.
+    Column relevance and row ranking use the sheet's own indexes (built once
+    per snapshot), restricted to the selection.
+    
+    Statistics, the column list, search results and instructions are always
+    included; sample rows are added, with cells cut to a fair share of what
+    is left, until the estimated budget is used up. ``usage`` holds the
+    estimated tokens per section and how many rows were shown.
+    """
+    budget = PromptBudget(PROMPT_TOKEN_BUDGET)
+    request_str = ""
     
-    # Initialize filtered_data to avoid undefined variable error
-    filtered_data = sheet_data if sheet_data else []
+    # Statistics below read whole columns; lists of row dicts are converted once
+    sheet_data = normalize_table(as_sheet_table(sheet_data))
+    is_filtered = selection is not None
+    # Only the selected rows' codes are copied; their counts are what the statistics need
+    filtered_data = sheet_data.take(selection) if is_filtered else sheet_data
+    sample_data = []
+    
+    # Search results and instructions are required, so they are counted before any rows
+    search_str = format_search_results(search_results) if search_results else ""
+    budget.charge('search', search_str)
+    instructions = build_prompt_instructions(user_question, filtered_data, search_results)
+    budget.charge('instructions', instructions)
     
     # Check if this is interview data
     is_interview_data = (sheet_data and len(sheet_data) > 0 and 
@@ -855,136 +1321,23 @@ def create_prompt(user_question, sheet_data, search_results=None):
             data_str = "=== 인터뷰 데이터 ===\n\n"
             data_str += f"문서 ID: {sheet_data[0].get('document_id')}\n"
             data_str += "\n인터뷰 내용:\n"
-            data_str += sheet_data[0].get('content', '인터뷰 내용을 불러올 수 없습니다.') + "\n"
+            # Leave a quarter of the budget for the statistics and sample below
+            content = sheet_data[0].get('content', '인터뷰 내용을 불러올 수 없습니다.')
+            data_str += truncate_to_tokens(content, budget.remaining * 3 // 4, '... (truncated)') + "\n"
         else:
             # Handle survey data
             data_str = "=== 구글 시트 데이터 ===\n\n"
         
-        # Get survey date from data
-        survey_date = None
-        from datetime import datetime
-        if sheet_data:
-            timestamp_str = sheet_data[0].get('Submitted At', '')
-            if timestamp_str:
-                try:
-                    date_parsed = False
-                    # Handle Korean date format first
-                    if '오전' in timestamp_str or '오후' in timestamp_str:
-                        try:
-                            date_part = timestamp_str.split(' 오')[0].strip()
-                            date_obj = datetime.strptime(date_part, '%Y. %m. %d')
-                            survey_date = f"{date_obj.year}년 {date_obj.month}월"
-                            date_parsed = True
-                        except:
-                            pass
-                    
-                    # Try other formats
-                    if not date_parsed:
-                        for fmt in ['%Y-%m-%d %H:%M:%S', '%m/%d/%Y %H:%M:%S', '%Y/%m/%d %H:%M:%S', '%d/%m/%Y %H:%M:%S']:
-                            try:
-                                date_obj = datetime.strptime(timestamp_str.split('.')[0], fmt)
-                                survey_date = f"{date_obj.year}년 {date_obj.month}월"
-                                date_parsed = True
-                                break
-                            except:
-                                continue
-                except Exception as e:
-                    print(f"Error parsing survey date: {str(e)}")
+        # Survey period (parsed once per snapshot, over all responses)
+        period = survey_period(sheet_data) if not is_interview_data else None
+        if period:
+            data_str += f"조사 기간: {period.range_label}\n"
         
         # Overall summary
-        # 기본 통계 계산
-        gender_stats = {}
-        grade_stats = {}
-        region_stats = {}
-        llm_usage_stats = {}
-        
-        for row in sheet_data:
-            # 성별 통계 - Handle different column names
-            gender = row.get('성별이 어떻게 되나요?', '') or row.get('성별', '')
-            gender = gender.strip()
-            if gender:
-                gender_stats[gender] = gender_stats.get(gender, 0) + 1
-            
-            # 학년 통계 - Handle different column names
-            grade = row.get('현재 학년이 어떻게 되나요?', '') or row.get('학년', '')
-            grade = grade.strip()
-            
-            # For tablet behavior sheet, handle grade format like "01. 중2"
-            if grade and '. ' in grade:
-                grade = grade.split('. ')[1]  # Extract "중2" from "01. 중2"
-            
-            if grade:
-                if grade in ['초1', '초2', '초3', '초4', '초5', '초6']:
-                    grade_stats['초등학생'] = grade_stats.get('초등학생', 0) + 1
-                elif grade in ['중1', '중2', '중3']:
-                    grade_stats['중학생'] = grade_stats.get('중학생', 0) + 1
-                elif grade in ['고1', '고2', '고3']:
-                    grade_stats['고등학생'] = grade_stats.get('고등학생', 0) + 1
-                else:
-                    grade_stats[grade] = grade_stats.get(grade, 0) + 1
-            
-            # Also check 중/고등 column for tablet behavior sheet
-            school_level = row.get('중/고등', '').strip()
-            if school_level and not grade:
-                if '중등' in school_level:
-                    grade_stats['중학생'] = grade_stats.get('중학생', 0) + 1
-                elif '고등' in school_level:
-                    grade_stats['고등학생'] = grade_stats.get('고등학생', 0) + 1
-            
-            # Check for child grade column (for parent surveys) - Updated column name
-            child_grade = row.get('현재 자녀의 학년', '').strip()
-            if child_grade:
-                # Use exact values from spreadsheet
-                if child_grade == '초등 자녀':
-                    grade_stats['초등 자녀'] = grade_stats.get('초등 자녀', 0) + 1
-                elif child_grade == '중등 자녀':
-                    grade_stats['중등 자녀'] = grade_stats.get('중등 자녀', 0) + 1
-                elif child_grade == '고등 자녀':
-                    grade_stats['고등 자녀'] = grade_stats.get('고등 자녀', 0) + 1
-            
-            # 지역 통계 - Handle different column names
-            region = row.get('현재 거주중인 지역이 어디인가요? ', '') or row.get('거주지역', '') or row.get('지역', '')
-            region = region.strip()
-            if region:
-                region_stats[region] = region_stats.get(region, 0) + 1
-            
-            # LLM 사용 통계
-            general_usage = row.get('GPT, Gemini와 같은 LLM 인공지능 서비스를 *평소에 활용*하고 계신가요?', '').strip()
-            if general_usage:
-                llm_usage_stats[general_usage] = llm_usage_stats.get(general_usage, 0) + 1
-        
-        # 요약 통계 출력
-        if gender_stats:
-            data_str += "\n성별 분포:\n"
-            for gender, count in gender_stats.items():
-                percentage = (count / len(sheet_data)) * 100
-                data_str += f"  - {gender}: {count}명 ({percentage:.1f}%)\n"
-        
-        if grade_stats:
-            data_str += "\n학년 분포:\n"
-            for grade, count in sorted(grade_stats.items()):
-                percentage = (count / len(sheet_data)) * 100
-                data_str += f"  - {grade}: {count}명 ({percentage:.1f}%)\n"
-        
-        if region_stats:
-            data_str += "\n지역 분포:\n"
-            top_regions = sorted(region_stats.items(), key=lambda x: x[1], reverse=True)[:5]
-            for region, count in top_regions:
-                percentage = (count / len(sheet_data)) * 100
-                data_str += f"  - {region}: {count}명 ({percentage:.1f}%)\n"
-            if len(region_stats) > 5:
-                data_str += f"  - 기타 {len(region_stats) - 5}개 지역\n"
-        
-        if llm_usage_stats:
-            data_str += "\nLLM 사용 현황:\n"
-            for usage, count in llm_usage_stats.items():
-                percentage = (count / len(sheet_data)) * 100
-                data_str += f"  - {usage}: {count}명 ({percentage:.1f}%)\n"
+        data_str += format_summary_statistics(sheet_data)
         
         data_str += "\n--- 상세 데이터 ---\n"
         
-        # 질문에 따라 관련 데이터만 필터링
-        filtered_data = sheet_data if sheet_data else []
         headers = list(sheet_data[0].keys()) if sheet_data else []
         
         # Include all column information for LLM to make intelligent decisions
@@ -997,12 +1350,26 @@ def create_prompt(user_question, sheet_data, search_results=None):
         data_str += "위 컬럼 목록을 참고하여 질문에 가장 적합한 컬럼을 선택하여 분석하세요.\n"
         data_str += "예시: '학년별로 재미있는 과목'이라는 질문에는 '학년' 관련 컬럼과 '재미있는 과목' 관련 컬럼을 함께 분석해야 합니다.\n\n"
         
-        # LIMIT DATA TO PREVENT TOKEN OVERFLOW
-        # Only include a sample of data, not the entire dataset
-        MAX_ROWS = 50  # Limit to 50 rows to prevent token overflow
+        budget.charge('summary', data_str)
         
-        data_str += f"[데이터 샘플 - 총 {len(sheet_data)}개 중 {min(MAX_ROWS, len(sheet_data))}개 표시]\n"
-        relevant_headers = headers  # Provide all headers for complete context
+        # 후속 질문으로 좁힌 응답자의 통계 - 대화마다 달라지므로 데이터 카드가 아닌 요청 쪽에 포함
+        if is_filtered:
+            filtered_str = "=== 이전 대화 조건에 맞는 응답자 ===\n"
+            filtered_str += f"전체 {len(sheet_data)}명 중 조건에 맞는 응답자: {len(filtered_data)}명\n"
+            filtered_str += format_summary_statistics(filtered_data) + "\n"
+            request_str += budget.charge('filtered_summary', filtered_str)
+        
+        # 교차 분석 질문이면 (조건에 맞는) 전체 데이터 기준 교차표를 넣고 원본 샘플은 줄임
+        # (질문마다 달라지므로 데이터 카드가 아닌 요청 쪽에 포함)
+        crosstab_section = build_crosstab_section(filtered_data, user_question)
+        request_str += budget.charge('crosstab', crosstab_section)
+        
+        # 교차표가 있으면 원본 행은 참고용으로만 조금 포함
+        max_rows = CROSSTAB_SAMPLE_ROWS if crosstab_section else PROMPT_MAX_SAMPLE_ROWS
+        
+        # 질문과 관련된 컬럼만 샘플 행에 표시 - 헤더와 응답 어휘가 질문과 겹치는 상위 컬럼
+        # (관련 컬럼을 찾지 못하면 전체 컬럼)
+        relevant_headers = column_index(sheet_data).top(user_question, PROMPT_MAX_COLUMNS) or list(headers)
         
         # 교차 분석이 필요한 경우 ("학년별로", "성별로" 등의 표현이 있을 때)
         if any(keyword in user_question for keyword in ['학년별로', '성별로', '지역별로', '별로']):
@@ -1023,78 +1390,107 @@ def create_prompt(user_question, sheet_data, search_results=None):
                     if rh not in relevant_headers:
                         relevant_headers.append(rh)
         
-        # 항상 포함해야 할 기본 헤더들
-        essential_headers = ['이름을 적어주세요', '성별이 어떻게 되나요?', '현재 학년이 어떻게 되나요?', '현재 거주중인 지역이 어디인가요? ']
+        # 항상 포함해야 할 기본 헤더들 - 이름과 성별/학년/지역 (시트마다 다른 헤더 이름 포함)
+        essential_headers = ['이름을 적어주세요'] + [source for field in CANONICAL_FIELDS
+                                                 if field.name in (GENDER, GRADE, REGION)
+                                                 for source in field.sources]
+        if SHEET_NAME_KEY in filtered_data.columns:
+            # 여러 시트를 합친 데이터면 어느 시트의 응답인지도 표시
+            essential_headers.append(SHEET_NAME_KEY)
         
         # Always include essential headers for context
         for eh in essential_headers:
             if eh in headers and eh not in relevant_headers:
-                relevant_headers.insert(0, eh)
+                relevant_headers.append(eh)
+        relevant_headers = [h for h in headers if h in relevant_headers]  # 시트의 컬럼 순서대로
         
         # 인터뷰 스크립트나 긴 텍스트가 있는지 확인
         has_long_text = False
-        sample_data = filtered_data[:MAX_ROWS]  # Only check in sample data
+        # 질문과 가장 관련 있는 행부터 (BM25, 표마다 한 번 만든 색인) - 부족하면 시트 순서로 채움
+        candidates = sheet_data.take(row_ranker(sheet_data).rank(user_question, max_rows, selection))
         
         for h in relevant_headers:
             if 'interview' in h.lower() or 'script' in h.lower():
                 has_long_text = True
                 break
-            for row in sample_data:
+            for row in candidates:
                 if len(str(row.get(h, ''))) > 200:
                     has_long_text = True
                     break
             if has_long_text:
                 break
         
+        def sample_header(shown):
+            return f"[데이터 샘플 - 총 {len(filtered_data)}개 중 {shown}개 표시]\n"
+        
+        def sample_note(shown):
+            return f"\n[참고: 전체 {len(filtered_data)}개 데이터 중 {shown}개 샘플만 표시됨. 통계는 전체 데이터 기준입니다.]\n"
+        
+        budget.charge('sample', sample_header(len(candidates)) + sample_note(len(candidates)))
+        # Cells get an even share of the remaining budget (never less than PROMPT_MIN_CELL_TOKENS);
+        # rows are added until the next one no longer fits
+        cell_tokens = max(PROMPT_MIN_CELL_TOKENS,
+                          budget.remaining // max(len(candidates) * len(relevant_headers), 1))
+        
+        rows_str = ""
         if has_long_text:
             # 긴 텍스트가 있는 경우 다른 형식으로 표시
-            for i, row in enumerate(sample_data, 1):
-                data_str += f"\n--- 응답자 #{i} ---\n"
+            for i, row in enumerate(candidates, 1):
+                row_str = f"\n--- 응답자 #{i} ---\n"
                 for header in relevant_headers:
                     value = str(row.get(header, ''))
                     if value:
-                        if len(value) > 500:  # Further limit long text
-                            # Truncate very long text
-                            data_str += f"\n[{header}]:\n{value[:500]}... (truncated)\n"
-                        else:
-                            data_str += f"\n[{header}]:\n{value}\n"
-                data_str += "\n"
+                        row_str += f"\n[{header}]:\n{truncate_to_tokens(value, cell_tokens, '... (truncated)')}\n"
+                row_str += "\n"
+                if not budget.try_charge('sample', row_str):
+                    break
+                rows_str += row_str
+                sample_data.append(row)
         else:
             # 짧은 데이터는 테이블 형식으로
-            data_str += " | ".join(relevant_headers) + "\n"
-            data_str += "-" * (len(relevant_headers) * 20) + "\n"
-            
-            for row in sample_data:
-                row_values = []
-                for header in relevant_headers:
-                    value = str(row.get(header, ''))
-                    # Truncate individual cell values if too long
-                    if len(value) > 100:
-                        value = value[:100] + "..."
-                    row_values.append(value)
-                data_str += " | ".join(row_values) + "\n"
+            table_header = " | ".join(relevant_headers) + "\n"
+            table_header += "-" * (len(relevant_headers) * 20) + "\n"
+            if budget.try_charge('sample', table_header):
+                rows_str += table_header
+                for row in candidates:
+                    row_values = [truncate_to_tokens(str(row.get(header, '')), cell_tokens)
+                                  for header in relevant_headers]
+                    row_str = " | ".join(row_values) + "\n"
+                    if not budget.try_charge('sample', row_str):
+                        break
+                    rows_str += row_str
+                    sample_data.append(row)
         
+        request_str += sample_header(len(sample_data)) + rows_str
         # Add note about data sampling
-        data_str += f"\n[참고: 전체 {len(sheet_data)}개 데이터 중 {len(sample_data)}개 샘플만 표시됨. 통계는 전체 데이터 기준입니다.]\n"
+        request_str += sample_note(len(sample_data))
     else:
         data_str = "=== 구글 시트 데이터 ===\n데이터가 없습니다.\n"
-    
-    prompt_parts.append(data_str)
+        budget.charge('summary', data_str)
     
     # 2. 웹 검색 결과 섹션
-    if search_results:
-        search_str = "\n\n=== 웹 검색 결과 ===\n\n"
-        for idx, result in enumerate(search_results, 1):
-            search_str += f"[{idx}] {result['title']}\n"
-            search_str += f"   출처: {result['displayLink']}\n"
-            search_str += f"   요약: {result['snippet']}\n"
-            search_str += f"   링크: {result['link']}\n\n"
-        prompt_parts.append(search_str)
-    
-    # 3. 전체 프롬프트 조합
-    full_prompt = "\n".join(prompt_parts)
-    
-    # 4. 질문과 주의사항 추가
+    if search_str:
+        request_str += "\n" + search_str
+    
+    usage = budget.usage()
+    usage['sample_rows'] = len(sample_data)
+    usage['total_rows'] = len(filtered_data) if sheet_data else 0
+    
+    # 3. 질문과 주의사항 추가
+    return data_str, request_str + instructions, usage
+
+def format_search_results(search_results):
+    """웹 검색 결과 섹션"""
+    search_str = "\n\n=== 웹 검색 결과 ===\n\n"
+    for idx, result in enumerate(search_results, 1):
+        search_str += f"[{idx}] {result['title']}\n"
+        search_str += f"   출처: {result['displayLink']}\n"
+        search_str += f"   요약: {result['snippet']}\n"
+        search_str += f"   링크: {result['link']}\n\n"
+    return search_str
+
+def build_prompt_instructions(user_question, filtered_data, search_results=None):
+    """질문과 주의사항 (수량 질문이면 전체 데이터 기준 정확한 수치 포함)"""
     if search_results:
         instructions = f"""
 
@@ -1118,38 +1514,13 @@ def create_prompt(user_question, sheet_data, search_results=None):
             # Count by school year
             school_year_counts = {}
             grade_detail_counts = {}
-            for row in (filtered_data if filtered_data else sheet_data):
-                # Handle different column names
-                school_year = row.get('현재 학년이 어떻게 되나요?', '') or row.get('학년', '')
-                school_year = school_year.strip()
-                
-                # Handle format like "01. 중2"
-                if school_year and '. ' in school_year:
-                    school_year = school_year.split('. ')[1]
-                
+            for (school_year, category), count in filtered_data.joint_counts([GRADE, GRADE_BAND]).items():
                 if school_year:
                     # Keep detailed grade counts
-                    grade_detail_counts[school_year] = grade_detail_counts.get(school_year, 0) + 1
-                    
-                    # Group into categories
-                    if school_year in ['초1', '초2', '초3', '초4', '초5', '초6']:
-                        category = '초등학생'
-                    elif school_year in ['중1', '중2', '중3']:
-                        category = '중학생'
-                    elif school_year in ['고1', '고2', '고3']:
-                        category = '고등학생'
-                    else:
-                        category = school_year
-                    
-                    school_year_counts[category] = school_year_counts.get(category, 0) + 1
-                
-                # Also check 중/고등 column for tablet behavior sheet if no grade found
-                if not school_year:
-                    school_level = row.get('중/고등', '').strip()
-                    if '중등' in school_level:
-                        school_year_counts['중학생'] = school_year_counts.get('중학생', 0) + 1
-                    elif '고등' in school_level:
-                        school_year_counts['고등학생'] = school_year_counts.get('고등학생', 0) + 1
+                    grade_detail_counts[school_year] = grade_detail_counts.get(school_year, 0) + count
+                # Grouped category (falls back to the 중/고등 column when there is no grade)
+                if category:
+                    school_year_counts[category] = school_year_counts.get(category, 0) + count
             
             # Create dynamic summary
             summary_lines = [f"- 총 응답자 수: {total_count}명"]
@@ -1195,269 +1566,127 @@ def create_prompt(user_question, sheet_data, search_results=None):
 4. 데이터를 기반으로 정확한 정보를 제공하고, 필요한 경우 추가적인 분석이나 인사이트도 제공하세요.
 """
     
-    return full_prompt + instructions
+    return instructions
 
-@app.route('/api/chat', methods=['POST'])
-def chat():
-    """사용자 질문을 받아 LLM 응답을 반환하는 API"""
-    try:
-        data = request.json
-        user_question = data.get('question', '')
-        enable_web_search = data.get('enable_web_search', False)  # 웹 검색 활성화 옵션
-        sheet_gid = data.get('sheet_gid', None)  # 특정 시트 GID
-        sheet_name = data.get('sheet_name', None)  # 특정 시트 이름
-        conversation_history = data.get('conversation_history', [])  # 대화 히스토리
-        
-        if not user_question:
-            return jsonify({'error': '질문을 입력해주세요.'}), 400
-        
-        # Get source type and document_id from request
-        source_type = data.get('source_type', 'survey')
-        document_id = data.get('document_id', None)
-        spreadsheet_id = data.get('spreadsheet_id', SPREADSHEET_ID)
-        
-        # Handle interview data source (Google Docs)
-        if source_type == 'interview' and document_id:
-            # Fetch the actual content from Google Docs
-            print(f"Fetching interview data from document: {document_id}")
-            doc_content = get_google_docs_content(document_id)
-            
-            if doc_content:
-                interview_data = [{
-                    '_source_type': 'interview',
-                    'document_id': document_id,
-                    'content': doc_content
-                }]
-                print(f"Successfully fetched interview content: {len(doc_content)} characters")
-            else:
-                # If we couldn't fetch the content, provide an error message
-                interview_data = [{
-                    '_source_type': 'interview',
-                    'document_id': document_id,
-                    'content': f"인터뷰 문서를 불러올 수 없습니다. 문서가 공개되어 있거나 적절한 권한이 설정되어 있는지 확인해주세요.\n\n문서 ID: {document_id}\n\n해결 방법:\n1. Google Docs에서 문서를 열어 '공유' 버튼을 클릭합니다\n2. '링크가 있는 모든 사용자'를 선택하고 '뷰어' 권한을 부여합니다\n3. 또는 서비스 계정 이메일에 문서를 공유합니다"
-                }]
-                print(f"Failed to fetch interview content from document: {document_id}")
-            
-            sheet_data = interview_data
-            access_errors = []
-            sheets_to_query = []  # Empty list for interview data
-        else:
-            # Handle survey data source (Google Sheets)
-            # Determine which sheet(s) to query based on question if not explicitly specified
-            if not sheet_gid and not sheet_name:
-                sheets_to_query = determine_sheet_context(user_question)
-            else:
-                # Use the explicitly provided sheet
-                sheets_to_query = [{
-                    'gid': sheet_gid or DEFAULT_SHEET_GID,
-                    'name': sheet_name or 'Sheet1'
-                }]
-            
-            # Get data from all relevant sheets
-            sheet_data = []
-            access_errors = []
-            for sheet in sheets_to_query:
-                # Use the provided spreadsheet_id for custom sheets
-                data = get_sheet_data_by_gid(sheet['gid'], sheet['name'], spreadsheet_id)
-                if not data:
-                    # Check if this is a custom sheet that failed to load
-                    if spreadsheet_id != SPREADSHEET_ID:
-                        access_errors.append({
-                            'sheet_name': sheet['name'],
-                            'spreadsheet_id': spreadsheet_id,
-                            'gid': sheet['gid']
-                        })
-                else:
-                    sheet_data.extend(data)
-        
-        print(f"Total data from {len(sheets_to_query)} sheet(s): {len(sheet_data)} rows")
-        
-        # If no data was retrieved and there were access errors, return a more helpful error message
-        if not sheet_data and access_errors:
-            error_msg = f"시트에 접근할 수 없습니다. Google Sheets가 공개되어 있거나 올바른 권한이 설정되어 있는지 확인해주세요.\n\n"
-            error_msg += f"접근 실패한 시트:\n"
-            for error in access_errors:
-                error_msg += f"- {error['sheet_name']} (Spreadsheet ID: {error['spreadsheet_id']}, GID: {error['gid']})\n"
-            error_msg += f"\n해결 방법:\n"
-            error_msg += f"1. Google Sheets를 열어 '공유' 버튼을 클릭합니다\n"
-            error_msg += f"2. '링크가 있는 모든 사용자'를 선택하고 '뷰어' 권한을 부여합니다\n"
-            error_msg += f"3. 또는 서비스 계정 이메일에 시트를 공유합니다"
-            
-            return jsonify({'error': error_msg}), 403
-        
-        # 웹 검색 수행 (항상 수행, enable_web_search 플래그 무시)
-        search_results = None
-        # 검색 쿼리 추출
-        search_queries = extract_search_queries(user_question, sheet_data)
-        
-        if search_queries:  # 검색 쿼리가 있을 때만 검색 수행
-            # 각 쿼리에 대해 검색 수행
-            all_search_results = []
-            for query in search_queries:
-                results = perform_google_search(query, num_results=3)
-                all_search_results.extend(results)
-            
-            # 중복 제거 (동일한 링크 기준)
-            seen_links = set()
-            search_results = []
-            for result in all_search_results:
-                if result['link'] not in seen_links:
-                    seen_links.add(result['link'])
-                    search_results.append(result)
-            
-            # 관련성 높은 결과만 필터링
-            if search_results:
-                relevant_results = []
-                for result in search_results[:5]:  # 최대 5개 결과만 검토
-                    # 제목이나 스니펫에 질문의 핵심 키워드가 포함되어 있는지 확인
-                    title_snippet = (result.get('title', '') + ' ' + result.get('snippet', '')).lower()
-                    # 관련성 키워드 체크
-                    relevant = False
-                    question_keywords = user_question.lower().split()
-                    # 최소 2개 이상의 주요 키워드가 포함되어 있으면 관련성 있다고 판단
-                    matching_keywords = sum(1 for keyword in question_keywords if len(keyword) > 2 and keyword in title_snippet)
-                    if matching_keywords >= 2:
-                        relevant_results.append(result)
-                
-                search_results = relevant_results if relevant_results else None
-        
-        # 대화 컨텍스트에서 필터링 조건 추출
-        context_filter = None
-        if conversation_history and len(conversation_history) > 0:
-            # "그 중에서", "그 중에", "위에서" 등의 표현 확인
-            context_keywords = ['그 중에서', '그 중에', '위에서', '이 중에서', '그들 중']
-            if any(keyword in user_question for keyword in context_keywords):
-                # 직전 대화에서 특정 그룹 찾기 (예: 고등학생, 중학생 등)
-                for msg in reversed(conversation_history):
-                    if msg.get('role') == 'assistant':
-                        content = msg.get('content', '')
-                        # 학년 그룹 찾기
-                        if '고등학생' in content and ('명' in content or '%' in content):
-                            context_filter = {'type': 'grade', 'value': ['고1', '고2', '고3']}
-                            print(f"Context filter detected: High school students")
-                            break
-                        elif '중학생' in content and ('명' in content or '%' in content):
-                            context_filter = {'type': 'grade', 'value': ['중1', '중2', '중3']}
-                            print(f"Context filter detected: Middle school students")
-                            break
-                        elif '초등학생' in content and ('명' in content or '%' in content):
-                            context_filter = {'type': 'grade', 'value': ['초1', '초2', '초3', '초4', '초5', '초6']}
-                            print(f"Context filter detected: Elementary school students")
-                            break
-        
-        # 컨텍스트 필터가 있으면 데이터 필터링
-        filtered_sheet_data = sheet_data
-        if context_filter:
-            filtered_sheet_data = []
-            for row in sheet_data:
-                grade = row.get('현재 학년이 어떻게 되나요?', '') or row.get('학년', '')
-                grade = grade.strip()
-                if '. ' in grade:
-                    grade = grade.split('. ')[1]
-                if grade in context_filter['value']:
-                    filtered_sheet_data.append(row)
-            print(f"Filtered data: {len(filtered_sheet_data)} out of {len(sheet_data)} rows")
-        
-        # 프롬프트 생성 (필터링된 데이터 사용)
-        prompt = create_prompt(user_question, filtered_sheet_data, search_results)
-        
-        # 디버깅을 위해 데이터 출력
-        print(f"Sheet data retrieved: {len(sheet_data)} rows")
-        if sheet_data:
-            print(f"First row: {sheet_data[0]}")
-        if search_results:
-            print(f"Web search results: {len(search_results)} results")
-        
-        # Debug: Check what's in the prompt for middle school questions
-        middle_keywords = ['중학생', '중1', '중2', '중3']
-        if any(keyword in user_question for keyword in middle_keywords):
-            print("\n=== DEBUG: Middle school query detected ===")
-            print(f"Question: {user_question}")
-            # Count actual middle school students in sheet_data
-            actual_middle_count = sum(1 for row in sheet_data if row.get('현재 학년이 어떻게 되나요?', '') in ['중1', '중2', '중3'])
-            print(f"Actual middle school students in data: {actual_middle_count}")
-            # Check if the prompt contains the detailed counts
-            if '[' in prompt and '학년별 상세 분포:' in prompt:
-                print("Grade detail section found in prompt")
-            # Find the instructions section
-            instructions_start = prompt.find('=== 중요 수량 정보 ===')
-            if instructions_start > 0:
-                print("\nInstructions section:")
-                print(prompt[instructions_start:instructions_start+500])
-            print("=== END DEBUG ===")
-        
-        # Claude API 호출
-        if not client:
-            return jsonify({'error': 'Claude API가 설정되지 않았습니다. ANTHROPIC_API_KEY를 확인해주세요.'}), 500
-        
-        # 시스템 프롬프트 조정
-        # Get survey dates from each sheet separately
-        sheet_dates = {}
-        if sheet_data:
-            # Group data by sheet to get dates
-            sheet_grouped = {}
-            for row in sheet_data:
-                sheet_name = row.get('_sheet_name', 'Unknown')
-                if sheet_name not in sheet_grouped:
-                    sheet_grouped[sheet_name] = []
-                sheet_grouped[sheet_name].append(row)
-            
-            # Get date for each sheet
-            from datetime import datetime
-            for sheet_name, rows in sheet_grouped.items():
-                if rows:
-                    # Try both 'Submitted At' and 'Submitted at'
-                    timestamp_str = rows[0].get('Submitted At', '') or rows[0].get('Submitted at', '')
-                    if timestamp_str:
-                        try:
-                            date_parsed = False
-                            # Handle Korean date format first
-                            if '오전' in timestamp_str or '오후' in timestamp_str:
-                                try:
-                                    date_part = timestamp_str.split(' 오')[0].strip()
-                                    date_obj = datetime.strptime(date_part, '%Y. %m. %d')
-                                    sheet_dates[sheet_name] = f"{date_obj.year}년 {date_obj.month}월"
-                                    date_parsed = True
-                                except:
-                                    pass
-                            
-                            # Handle Sheet2's short format like "2025. 01"
-                            if not date_parsed and '. ' in timestamp_str and len(timestamp_str) <= 10:
-                                try:
-                                    # Format: "2025. 01"
-                                    parts = timestamp_str.strip().split('. ')
-                                    if len(parts) == 2:
-                                        year = int(parts[0])
-                                        month = int(parts[1])
-                                        sheet_dates[sheet_name] = f"{year}년 {month}월"
-                                        date_parsed = True
-                                except:
-                                    pass
-                            
-                            # Try other formats
-                            if not date_parsed:
-                                for fmt in ['%Y-%m-%d %H:%M:%S', '%m/%d/%Y %H:%M:%S', '%Y/%m/%d %H:%M:%S', '%d/%m/%Y %H:%M:%S']:
-                                    try:
-                                        date_obj = datetime.strptime(timestamp_str.split('.')[0], fmt)
-                                        sheet_dates[sheet_name] = f"{date_obj.year}년 {date_obj.month}월"
-                                        date_parsed = True
-                                        break
-                                    except:
-                                        continue
-                        except:
-                            pass
-            
-            print(f"Sheet dates detected: {sheet_dates}")
-        
-        # Use the appropriate date based on context
-        survey_date = list(sheet_dates.values())[0] if sheet_dates else "데이터"
-        
-        # For dynamic context, use current date
-        from datetime import datetime
-        current_date = datetime.now()
-        data_context = f"{current_date.year}년 {current_date.month}월"
-        
-        system_prompt = f"""당신은 데이터 분석을 도와주는 친절한 어시스턴트입니다. 주어진 데이터를 기반으로 정확하게 답변해주세요.
+# 후속 질문 - "그 중에서 ..."는 직전 대화의 그룹을, "고등학생 중에서 ..."는 질문 속 그룹을 기준으로 좁힘
+FOLLOW_UP_KEYWORDS = ['그 중에서', '그 중에', '위에서', '이 중에서', '그들 중']
+# "수학과 영어 중에 뭐가..." 같은 선택 질문과 구분하려고 그룹 명사 바로 뒤의 '중에(서)'만 인정
+NESTED_PATTERN = re.compile(r'(학생|응답자)들?\s*중에')
+GENDER_TERMS = {'여학생': '여', '여자': '여', '남학생': '남', '남자': '남'}
+# 예/아니요 문항 헤더에서 조건어로 쓰지 않는 흔한 말
+GENERIC_HEADER_WORDS = {'하고', '있나요', '계신가요', '하나요', '있는', '어떻게', '되나요', '현재', '사용하고', '같은'}
+# 헤더 단어 끝에서 떼는 조사 ("과외를" -> "과외", "평소에" -> "평소")
+HEADER_PARTICLES = ('에서', '에도', '으로', '를', '을', '이', '가', '은', '는', '에', '와', '과', '의', '로', '도')
+MIN_HEADER_KEYWORD_LENGTH = 2
+NEGATION_TERMS = ['안 하는', '안하는', '않는', '하지 않', '안 받는']
+# 부정어는 조건어 바로 뒤 이 글자 수 안에 있을 때만 그 조건에 적용 ("과외를 안 하는")
+NEGATION_WINDOW = 8
+
+def is_follow_up(text, conversation_history=None):
+    """대화 히스토리를 가리키는 표현(히스토리가 있을 때) 또는 "학생 중에서" 형태의 하위 그룹 질문"""
+    if conversation_history and any(keyword in text for keyword in FOLLOW_UP_KEYWORDS):
+        return True
+    return bool(NESTED_PATTERN.search(text))
+
+def header_keywords(name):
+    """예/아니요 문항 헤더의 조건어 - 조사를 뗀 단어 중 흔한 말을 뺀 것"""
+    keywords = set()
+    for word in name.replace('*', ' ').split():
+        word = word.strip('?.,')
+        if word in HEADER_PARTICLES:
+            continue
+        for particle in HEADER_PARTICLES:
+            if word.endswith(particle) and len(word) - len(particle) >= MIN_HEADER_KEYWORD_LENGTH:
+                word = word[:-len(particle)]
+                break
+        if len(word) >= MIN_HEADER_KEYWORD_LENGTH and word not in GENERIC_HEADER_WORDS:
+            keywords.add(word)
+    return keywords
+
+def yes_no_keywords(sheet_data):
+    """{예/아니요 문항: 그 문항에만 있는 조건어} (시트당 한 번)
+    
+    여러 헤더에 나오는 말('GPT', '서비스')로는 어느 문항인지 알 수 없으므로 뺌
+    """
+    def build(table):
+        keywords = {name: header_keywords(name) for name in table.column_names}
+        shared = set()
+        seen = set()
+        for words in keywords.values():
+            shared |= seen & words
+            seen |= words
+        result = {}
+        for name in table.column_names:
+            answers = {value.strip() for value in table.columns[name].categories if value.strip()}
+            if not answers or len(answers) > 5 or not all(answer.startswith(('네', '아니')) for answer in answers):
+                continue
+            if keywords[name] - shared:
+                result[name] = keywords[name] - shared
+        return result
+    return sheet_data.derive('yes_no_keywords', build)
+
+def question_conditions(text, sheet_data):
+    """질문에 언급된 학년/성별/지역/예-아니요 조건을 RowFilter 목록으로 변환"""
+    conditions = []
+    grades = [grade for grades in GRADE_BANDS.values() for grade in grades if grade in text]
+    bands = [band for band in GRADE_BANDS if band in text]
+    if grades:
+        conditions.append(ColumnIn(GRADE, grades))
+    elif bands:
+        conditions.append(ColumnIn(GRADE_BAND, bands))
+    
+    genders = {gender for term, gender in GENDER_TERMS.items() if term in text}
+    if len(genders) == 1:
+        conditions.append(ColumnIn(GENDER, genders))
+    
+    regions = [region for region in sheet_data.value_counts(REGION) if region and region in text]
+    if regions:
+        conditions.append(ColumnIn(REGION, regions))
+    
+    # 예/아니요 문항: "과외 하는" -> '과외를 하고 있나요?'가 '네...'인 응답자
+    for name, keywords in yes_no_keywords(sheet_data).items():
+        matches = [text.find(keyword) + len(keyword) for keyword in keywords if keyword in text]
+        if not matches:
+            continue
+        negated = any(term in text[end:end + NEGATION_WINDOW] for end in matches for term in NEGATION_TERMS)
+        prefix = '아니' if negated else '네'
+        conditions.append(ColumnWhere(name, lambda value, prefix=prefix: value.strip().startswith(prefix),
+                                      label=f"{prefix}*"))
+    return conditions
+
+def constrains_grade(conditions):
+    return any(isinstance(condition, ColumnIn) and condition.name in (GRADE, GRADE_BAND)
+               for condition in conditions)
+
+def build_follow_up_filter(user_question, conversation_history, sheet_data):
+    """후속 질문이면 대화 흐름 전체의 조건을 AND로 묶은 RowFilter 반환 (아니면 None)"""
+    if not is_follow_up(user_question, conversation_history):
+        return None
+    conditions = question_conditions(user_question, sheet_data)
+    
+    if conversation_history and any(keyword in user_question for keyword in FOLLOW_UP_KEYWORDS):
+        # 연속된 이전 후속 질문들의 조건도 유지 ("그 중에서 여학생은?" -> "그 중에서 과외 하는 학생은?")
+        for msg in reversed(conversation_history):
+            if msg.get('role') == 'user':
+                content = msg.get('content', '')
+                if not is_follow_up(content, conversation_history):
+                    break
+                conditions.extend(question_conditions(content, sheet_data))
+        # 직전 대화에서 특정 그룹 찾기 (예: 고등학생, 중학생 등) - 질문에 학년이 이미 있으면 질문을 따름
+        if not constrains_grade(conditions):
+            for msg in reversed(conversation_history):
+                if msg.get('role') == 'assistant':
+                    content = msg.get('content', '')
+                    band = next((band for band in ['고등학생', '중학생', '초등학생'] if band in content), None)
+                    if band and ('명' in content or '%' in content):
+                        conditions.append(ColumnIn(GRADE_BAND, [band]))
+                        print(f"Context filter detected: {band}")
+                        break
+    
+    return AllOf(*conditions) if conditions else None
+
+# 채팅 시스템 프롬프트 - 요청마다 같으므로 캐시되는 접두부의 첫 블록
+CHAT_SYSTEM_PROMPT = """당신은 데이터 분석을 도와주는 친절한 어시스턴트입니다. 주어진 데이터를 기반으로 정확하게 답변해주세요.
 
 [최우선 규칙 - 대화 컨텍스트 이해]
 대화 히스토리가 있는 경우, 반드시 이전 대화 내용을 참고하여 답변해야 합니다.
@@ -1500,123 +1729,440 @@ def chat():
 - 예시: "학습 도움 도구로서의 역할 (응답률 87%)"
 - 예시: "모르는 문제를 이해하기 쉽게 설명해준다 (72%)"
 - 포인트 1, 2, 3, 4와 같이 번호를 매긴 목록을 만들 때는 각 포인트에 해당하는 백분율을 반드시 포함하세요"""
-        if search_results:
-            system_prompt += "\n\n웹 검색 결과가 포함된 경우, 출처를 명확히 밝히고 시트 데이터와 통합하여 분석해주세요."
-        
-        # Build messages array with conversation history
-        messages = []
-        
-        # Add conversation history if provided
-        if conversation_history:
-            for msg in conversation_history:
-                if msg.get('role') and msg.get('content'):
-                    messages.append({
-                        "role": msg['role'],
-                        "content": msg['content']
-                    })
+
+CHAT_SEARCH_NOTE = "웹 검색 결과가 포함된 경우, 출처를 명확히 밝히고 시트 데이터와 통합하여 분석해주세요."
+
+def cached_text_block(text):
+    """A text content block, marked as a prompt-cache breakpoint when PROMPT_CACHING is on"""
+    block = {"type": "text", "text": text}
+    if PROMPT_CACHING:
+        block["cache_control"] = {"type": "ephemeral"}
+    return block
+
+def build_chat_system(data_card, search_results=None):
+    """System blocks: the fixed rules, then the data card, each cached up to its end
+    
+    The rules are the same for every request and the data card for every
+    question about the same data, so both are reused from the cache on
+    follow-up turns; anything that varies goes after them.
+    """
+    system = [cached_text_block(CHAT_SYSTEM_PROMPT), cached_text_block(data_card)]
+    if search_results:
+        system.append({"type": "text", "text": CHAT_SEARCH_NOTE})
+    return system
+
+def build_chat_messages(conversation_history, request_prompt):
+    """Conversation history, then the current question with its sample rows
+    
+    The last history message is a cache breakpoint too, so the next turn
+    (which repeats this history) only pays for the new exchange.
+    """
+    messages = [{"role": msg['role'], "content": msg['content']}
+                for msg in conversation_history or []
+                if msg.get('role') and msg.get('content')]
+    if messages and PROMPT_CACHING and isinstance(messages[-1]['content'], str):
+        messages[-1]['content'] = [cached_text_block(messages[-1]['content'])]
+    messages.append({"role": "user", "content": request_prompt})
+    return messages
+
+def record_cache_usage(response_usage, prompt_usage):
+    """Add the cache read/write token counts from ``response.usage`` to ``prompt_usage`` and log them"""
+    cache_read = getattr(response_usage, 'cache_read_input_tokens', None) or 0
+    cache_write = getattr(response_usage, 'cache_creation_input_tokens', None) or 0
+    prompt_usage['input_tokens'] = getattr(response_usage, 'input_tokens', None)
+    prompt_usage['cache_read_input_tokens'] = cache_read
+    prompt_usage['cache_creation_input_tokens'] = cache_write
+    print(f"Prompt cache {'hit' if cache_read else 'miss'}: read {cache_read}, "
+          f"written {cache_write}, uncached input {prompt_usage['input_tokens']} tokens")
+
+def prepare_chat(data):
+    """Gather the data for a chat request and build its Claude request
+    
+    Shared by /api/chat and /api/chat/stream. Returns ``(context, None)``, where
+    ``context`` holds the ``request`` keyword arguments for client.messages and
+    what the answer is post-processed with, or ``(None, error_response)``.
+    """
+    user_question = data.get('question', '')
+    enable_web_search = data.get('enable_web_search', False)  # 웹 검색 활성화 옵션
+    sheet_gid = data.get('sheet_gid', None)  # 특정 시트 GID
+    sheet_name = data.get('sheet_name', None)  # 특정 시트 이름
+    conversation_history = data.get('conversation_history', [])  # 대화 히스토리
+    
+    if not user_question:
+        return None, (jsonify({'error': '질문을 입력해주세요.'}), 400)
+    
+    # Get source type and document_id from request
+    source_type = data.get('source_type', 'survey')
+    document_id = data.get('document_id', None)
+    spreadsheet_id = data.get('spreadsheet_id', SPREADSHEET_ID)
+    
+    # Handle interview data source (Google Docs)
+    if source_type == 'interview' and document_id:
+        # Fetch the actual content from Google Docs
+        print(f"Fetching interview data from document: {document_id}")
+        doc_content = get_google_docs_content(document_id)
         
-        # Add current user question with data context
-        messages.append({"role": "user", "content": prompt})
+        if doc_content:
+            interview_data = [{
+                '_source_type': 'interview',
+                'document_id': document_id,
+                'content': doc_content
+            }]
+            print(f"Successfully fetched interview content: {len(doc_content)} characters")
+        else:
+            # If we couldn't fetch the content, provide an error message
+            interview_data = [{
+                '_source_type': 'interview',
+                'document_id': document_id,
+                'content': f"인터뷰 문서를 불러올 수 없습니다. 문서가 공개되어 있거나 적절한 권한이 설정되어 있는지 확인해주세요.\n\n문서 ID: {document_id}\n\n해결 방법:\n1. Google Docs에서 문서를 열어 '공유' 버튼을 클릭합니다\n2. '링크가 있는 모든 사용자'를 선택하고 '뷰어' 권한을 부여합니다\n3. 또는 서비스 계정 이메일에 문서를 공유합니다"
+            }]
+            print(f"Failed to fetch interview content from document: {document_id}")
         
-        # Log conversation context for debugging
-        print(f"Conversation history length: {len(conversation_history)}")
-        print(f"Total messages to Claude: {len(messages)}")
+        sheet_data = interview_data
+        access_errors = []
+        sheets_to_query = []  # Empty list for interview data
+    else:
+        # Handle survey data source (Google Sheets)
+        # Determine which sheet(s) to query based on question if not explicitly specified
+        if not sheet_gid and not sheet_name:
+            sheets_to_query = determine_sheet_context(user_question)
+        else:
+            # Use the explicitly provided sheet
+            sheets_to_query = [{
+                'gid': sheet_gid or DEFAULT_SHEET_GID,
+                'name': sheet_name or 'Sheet1'
+            }]
+        
+        # Get data from all relevant sheets
+        sheet_tables = []
+        access_errors = []
+        # Fetch concurrently; results come back in sheets_to_query order
+        for sheet, data in fetch_sheets_parallel(sheets_to_query, spreadsheet_id):
+            if not data:
+                # Check if this is a custom sheet that failed to load
+                if spreadsheet_id != SPREADSHEET_ID:
+                    access_errors.append({
+                        'sheet_name': sheet['name'],
+                        'spreadsheet_id': spreadsheet_id,
+                        'gid': sheet['gid']
+                    })
+            else:
+                sheet_tables.append(data)
         
-        response = client.messages.create(
+        sheet_data = SheetTable.concat(sheet_tables) if sheet_tables else []
+    
+    sheet_data = normalize_table(as_sheet_table(sheet_data))
+    print(f"Total data from {len(sheets_to_query)} sheet(s): {len(sheet_data)} rows")
+    
+    # If no data was retrieved and there were access errors, return a more helpful error message
+    if not sheet_data and access_errors:
+        error_msg = f"시트에 접근할 수 없습니다. Google Sheets가 공개되어 있거나 올바른 권한이 설정되어 있는지 확인해주세요.\n\n"
+        error_msg += f"접근 실패한 시트:\n"
+        for error in access_errors:
+            error_msg += f"- {error['sheet_name']} (Spreadsheet ID: {error['spreadsheet_id']}, GID: {error['gid']})\n"
+        error_msg += f"\n해결 방법:\n"
+        error_msg += f"1. Google Sheets를 열어 '공유' 버튼을 클릭합니다\n"
+        error_msg += f"2. '링크가 있는 모든 사용자'를 선택하고 '뷰어' 권한을 부여합니다\n"
+        error_msg += f"3. 또는 서비스 계정 이메일에 시트를 공유합니다"
+        
+        return None, (jsonify({'error': error_msg}), 403)
+    
+    # 웹 검색 수행 (항상 수행, enable_web_search 플래그 무시)
+    search_results = None
+    # 검색 쿼리 추출
+    search_queries = extract_search_queries(user_question, sheet_data)
+    
+    if search_queries:  # 검색 쿼리가 있을 때만 검색 수행
+        # 각 쿼리에 대해 검색 수행
+        all_search_results = []
+        for query in search_queries:
+            results = perform_google_search(query, num_results=3)
+            all_search_results.extend(results)
+        
+        # 중복 제거 (동일한 링크 기준)
+        seen_links = set()
+        search_results = []
+        for result in all_search_results:
+            if result['link'] not in seen_links:
+                seen_links.add(result['link'])
+                search_results.append(result)
+        
+        # 관련성 높은 결과만 필터링
+        if search_results:
+            relevant_results = []
+            for result in search_results[:5]:  # 최대 5개 결과만 검토
+                # 제목이나 스니펫에 질문의 핵심 키워드가 포함되어 있는지 확인
+                title_snippet = (result.get('title', '') + ' ' + result.get('snippet', '')).lower()
+                # 관련성 키워드 체크
+                relevant = False
+                question_keywords = user_question.lower().split()
+                # 최소 2개 이상의 주요 키워드가 포함되어 있으면 관련성 있다고 판단
+                matching_keywords = sum(1 for keyword in question_keywords if len(keyword) > 2 and keyword in title_snippet)
+                if matching_keywords >= 2:
+                    relevant_results.append(result)
+            
+            search_results = relevant_results if relevant_results else None
+    
+    # 대화 컨텍스트에서 필터링 조건 추출 - 값별 행 비트셋을 AND로 결합 (행 복사 없음)
+    selection = None
+    row_filter = build_follow_up_filter(user_question, conversation_history, sheet_data) if sheet_data else None
+    if row_filter is not None:
+        selection = row_filter.rows(sheet_data)
+        print(f"Filtered data ({row_filter!r}): {len(selection)} out of {len(sheet_data)} rows")
+    
+    # 프롬프트 생성 (PROMPT_TOKEN_BUDGET 이내) - 캐시되는 데이터 카드는 전체 시트 기준,
+    # 필터링된 응답자의 통계/교차표/샘플은 요청 쪽에 들어감
+    data_card, request_prompt, prompt_usage = build_prompt_sections(user_question, sheet_data, search_results,
+                                                                    selection)
+    prompt = data_card + request_prompt
+    print(f"Prompt: ~{prompt_usage['estimated_tokens']} of {prompt_usage['budget']} tokens "
+          f"({prompt_usage['sample_rows']}/{prompt_usage['total_rows']} sample rows) {prompt_usage['sections']}")
+    
+    # 디버깅을 위해 데이터 출력
+    print(f"Sheet data retrieved: {len(sheet_data)} rows")
+    if sheet_data:
+        print(f"First row: {sheet_data[0]}")
+    if search_results:
+        print(f"Web search results: {len(search_results)} results")
+    
+    # Debug: Check what's in the prompt for middle school questions
+    middle_keywords = ['중학생', '중1', '중2', '중3']
+    if any(keyword in user_question for keyword in middle_keywords):
+        print("\n=== DEBUG: Middle school query detected ===")
+        print(f"Question: {user_question}")
+        # Count actual middle school students in sheet_data
+        actual_middle_count = sum(1 for row in sheet_data if row.get('현재 학년이 어떻게 되나요?', '') in ['중1', '중2', '중3'])
+        print(f"Actual middle school students in data: {actual_middle_count}")
+        # Check if the prompt contains the detailed counts
+        if '[' in prompt and '학년별 상세 분포:' in prompt:
+            print("Grade detail section found in prompt")
+        # Find the instructions section
+        instructions_start = prompt.find('=== 중요 수량 정보 ===')
+        if instructions_start > 0:
+            print("\nInstructions section:")
+            print(prompt[instructions_start:instructions_start+500])
+        print("=== END DEBUG ===")
+    
+    # Claude API 호출
+    if not client:
+        return None, (jsonify({'error': 'Claude API가 설정되지 않았습니다. ANTHROPIC_API_KEY를 확인해주세요.'}), 500)
+    
+    # Get survey dates from each sheet separately (cached per snapshot)
+    sheet_dates = {}
+    if isinstance(sheet_data, SheetTable):
+        sheet_dates = {name: period.label for name, period in survey_periods_by_sheet(sheet_data).items()}
+        print(f"Sheet dates detected: {sheet_dates}")
+    
+    # Use the appropriate date based on context
+    survey_date = list(sheet_dates.values())[0] if sheet_dates else "데이터"
+    
+    # For dynamic context, use current date
+    from datetime import datetime
+    current_date = datetime.now()
+    data_context = f"{current_date.year}년 {current_date.month}월"
+    
+    # 캐시 가능한 고정 부분(규칙, 데이터 카드)을 앞에, 질문과 히스토리는 그 뒤에
+    system = build_chat_system(data_card, search_results)
+    messages = build_chat_messages(conversation_history, request_prompt)
+    
+    # Log conversation context for debugging
+    print(f"Conversation history length: {len(conversation_history)}")
+    print(f"Total messages to Claude: {len(messages)}")
+    
+    context = {
+        'question': user_question,
+        'sheet_data': sheet_data,
+        'search_results': search_results,
+        'prompt_usage': prompt_usage,
+        'survey_date': survey_date,
+        'data_context': data_context,
+        'sheet_dates': sheet_dates,
+        'request': dict(
             model="claude-3-5-sonnet-20241022",
-            system=system_prompt,
+            system=system,
             messages=messages,
             temperature=0.7,
             max_tokens=1500  # 웹 검색 결과 포함 시 더 긴 답변 허용
-        )
+        ),
+    }
+    return context, None
+
+# 답변 첫 문장으로 인정되는 조사 시점 표현 (월이 빠진 표현은 조사 시점으로 바꿔 씀)
+PARTIAL_TIMESTAMPS = [
+    "데이터를 분석해보면,",
+    "조사 결과에 따르면,"
+]
+
+def required_timestamps(context):
+    """Opening phrases an answer may already start with"""
+    return [
+        f"{context['survey_date']} 진행된 조사 결과에 따르면,",
+        f"{context['data_context']} 기준 데이터를 분석한 결과,",
+        "최근 수집된 조사 자료에 의하면,"
+    ]
+
+def add_timestamp_prefix(answer, context):
+    """Make the answer start with "<조사 시점> 진행된 조사 결과에 따르면," (rewriting a partial one)"""
+    user_question = context['question']
+    survey_date = context['survey_date']
+    data_context = context['data_context']
+    sheet_dates = context['sheet_dates']
+    
+    # Debug logging
+    print(f"\n=== TIMESTAMP DEBUG ===")
+    print(f"Original answer starts with: {answer[:50]}...")
+    print(f"Data context: {data_context}")
+    
+    # Check if the answer starts with the required timestamp phrase
+    required_starts = required_timestamps(context)
+    
+    # Also check for partial timestamps (without month)
+    partial_timestamps = PARTIAL_TIMESTAMPS
+    
+    # Check which phrase it starts with, if any
+    starts_with_required = False
+    starts_with_partial = False
+    
+    # First check for exact matches
+    for start in required_starts:
+        if answer.startswith(start):
+            print(f"Answer already starts with required phrase: {start}")
+            starts_with_required = True
+            break
+    
+    # If no exact match, check for partial timestamps
+    if not starts_with_required:
+        for partial in partial_timestamps:
+            if answer.startswith(partial):
+                print(f"Answer starts with partial timestamp: {partial}")
+                starts_with_partial = True
+                # Determine the appropriate date to use based on context
+                date_to_use = survey_date
+                # If tablet question, find the date for the sheet containing tablets
+                if '태블릿' in user_question and sheet_dates:
+                    for sheet_name, date in sheet_dates.items():
+                        if sheet_name == 'Sheet2':  # We know tablets are in Sheet2
+                            date_to_use = date
+                            break
+                # Replace the partial timestamp with the appropriate date
+                answer = answer.replace(partial, f"{date_to_use} 진행된 조사 결과에 따르면,", 1)
+                print(f"Replaced with date: {date_to_use}")
+                break
+    
+    # If no timestamp at all, prepend one
+    if not starts_with_required and not starts_with_partial:
+        print("Answer does NOT start with any timestamp. Adding timestamp...")
+        # Determine the appropriate date to use
+        date_to_use = survey_date
+        if '태블릿' in user_question and sheet_dates:
+            for sheet_name, date in sheet_dates.items():
+                if sheet_name == 'Sheet2':
+                    date_to_use = date
+                    break
+        answer = f"{date_to_use} 진행된 조사 결과에 따르면, {answer}"
+        print(f"Modified answer starts with: {answer[:50]}...")
+    
+    print("=== END TIMESTAMP DEBUG ===")
+    return answer
+
+def timestamp_phrases(context):
+    """Every phrase add_timestamp_prefix looks for at the start of an answer"""
+    return required_timestamps(context) + PARTIAL_TIMESTAMPS
+
+def chat_response_data(answer, context):
+    """/api/chat response body"""
+    search_results = context['search_results']
+    response_data = {
+        'answer': answer,
+        'data_count': len(context['sheet_data']),
+        'prompt_usage': context['prompt_usage']
+    }
+    
+    if search_results:
+        response_data['web_search_count'] = len(search_results)
+        response_data['search_sources'] = [{
+            'title': r['title'],
+            'link': r['link'],
+            'source': r['displayLink']
+        } for r in search_results]
+    
+    return response_data
+
+@app.route('/api/chat', methods=['POST'])
+def chat():
+    """사용자 질문을 받아 LLM 응답을 반환하는 API"""
+    try:
+        context, error = prepare_chat(request.json)
+        if error:
+            return error
+        
+        response = client.messages.create(**context['request'])
+        record_cache_usage(response.usage, context['prompt_usage'])
         
         answer = response.content[0].text
         print(f"\n=== RESPONSE PROCESSING STARTED ===")
         print(f"Raw answer from Claude: {answer[:100]}...")
         
-        # Debug logging
-        print(f"\n=== TIMESTAMP DEBUG ===")
-        print(f"Original answer starts with: {answer[:50]}...")
-        print(f"Data context: {data_context}")
-        
-        # Check if the answer starts with the required timestamp phrase
-        required_starts = [
-            f"{survey_date} 진행된 조사 결과에 따르면,",
-            f"{data_context} 기준 데이터를 분석한 결과,",
-            "최근 수집된 조사 자료에 의하면,"
-        ]
-        
-        # Also check for partial timestamps (without month)
-        partial_timestamps = [
-            "데이터를 분석해보면,",
-            "조사 결과에 따르면,"
-        ]
-        
-        # Check which phrase it starts with, if any
-        starts_with_required = False
-        starts_with_partial = False
-        
-        # First check for exact matches
-        for start in required_starts:
-            if answer.startswith(start):
-                print(f"Answer already starts with required phrase: {start}")
-                starts_with_required = True
-                break
-        
-        # If no exact match, check for partial timestamps
-        if not starts_with_required:
-            for partial in partial_timestamps:
-                if answer.startswith(partial):
-                    print(f"Answer starts with partial timestamp: {partial}")
-                    starts_with_partial = True
-                    # Determine the appropriate date to use based on context
-                    date_to_use = survey_date
-                    # If tablet question, find the date for the sheet containing tablets
-                    if '태블릿' in user_question and sheet_dates:
-                        for sheet_name, date in sheet_dates.items():
-                            if sheet_name == 'Sheet2':  # We know tablets are in Sheet2
-                                date_to_use = date
-                                break
-                    # Replace the partial timestamp with the appropriate date
-                    answer = answer.replace(partial, f"{date_to_use} 진행된 조사 결과에 따르면,", 1)
-                    print(f"Replaced with date: {date_to_use}")
-                    break
-        
-        # If no timestamp at all, prepend one
-        if not starts_with_required and not starts_with_partial:
-            print("Answer does NOT start with any timestamp. Adding timestamp...")
-            # Determine the appropriate date to use
-            date_to_use = survey_date
-            if '태블릿' in user_question and sheet_dates:
-                for sheet_name, date in sheet_dates.items():
-                    if sheet_name == 'Sheet2':
-                        date_to_use = date
-                        break
-            answer = f"{date_to_use} 진행된 조사 결과에 따르면, {answer}"
-            print(f"Modified answer starts with: {answer[:50]}...")
-        
-        print("=== END TIMESTAMP DEBUG ===")
+        answer = add_timestamp_prefix(answer, context)
         
         # Use custom Unicode-safe JSON response
-        response_data = {
-            'answer': answer,
-            'data_count': len(sheet_data)
-        }
-        
-        if search_results:
-            response_data['web_search_count'] = len(search_results)
-            response_data['search_sources'] = [{
-                'title': r['title'],
-                'link': r['link'],
-                'source': r['displayLink']
-            } for r in search_results]
-        
-        return jsonify_unicode(response_data)
+        return jsonify_unicode(chat_response_data(answer, context))
     
     except Exception as e:
         print(f"Error in chat endpoint: {str(e)}")
         return jsonify({'error': f'처리 중 오류가 발생했습니다: {str(e)}'}), 500
 
+def sse_event(event, data):
+    """One server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """/api/chat, with the answer relayed as server-sent events while it is written
+    
+    Events: ``delta`` ({'text'}) for each piece of the answer, then ``done``
+    with the /api/chat response body, or ``error`` ({'error'}). Errors before
+    the answer starts are returned as JSON, as from /api/chat.
+    """
+    try:
+        context, error = prepare_chat(request.json)
+        if error:
+            return error
+    except Exception as e:
+        print(f"Error in chat stream endpoint: {str(e)}")
+        return jsonify({'error': f'처리 중 오류가 발생했습니다: {str(e)}'}), 500
+    
+    def generate():
+        phrases = timestamp_phrases(context)
+        longest = max(len(phrase) for phrase in phrases)
+        # The timestamp prefix is checked on the first chunk: text is held back only
+        # until it is long enough to tell, or no longer matches any known phrase
+        head = ""
+        answer = None
+        try:
+            with client.messages.stream(**context['request']) as stream:
+                for text in stream.text_stream:
+                    if answer is None:
+                        head += text
+                        if len(head) < longest and any(phrase.startswith(head) for phrase in phrases):
+                            continue
+                        text = answer = add_timestamp_prefix(head, context)
+                    else:
+                        answer += text
+                    yield sse_event('delta', {'text': text})
+                record_cache_usage(stream.get_final_message().usage, context['prompt_usage'])
+            if answer is None:
+                # Answer shorter than any prefix phrase
+                answer = add_timestamp_prefix(head, context)
+                yield sse_event('delta', {'text': answer})
+            yield sse_event('done', chat_response_data(answer, context))
+        except Exception as e:
+            print(f"Error in chat stream endpoint: {str(e)}")
+            yield sse_event('error', {'error': f'처리 중 오류가 발생했습니다: {str(e)}'})
+    
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/demographics', methods=['GET'])
 def demographics():
     """Get demographic statistics from Google Sheets data"""
@@ -1634,44 +2180,35 @@ def demographics():
         gemini_usage_count = 0
         total_students = len(sheet_data)
         
-        # Count demographics
-        for row in sheet_data:
-            # Gender
-            gender = row.get('성별이 어떻게 되나요?', '').strip()
+        # Count demographics from the canonical columns built at ingest
+        sheet_data = normalize_table(sheet_data)
+        # Gender
+        for gender, count in sheet_data.value_counts(GENDER).items():
             if gender:
-                gender_count[gender] = gender_count.get(gender, 0) + 1
-            
-            # School year - group into categories
-            school_year = row.get('현재 학년이 어떻게 되나요?', '').strip()
+                gender_count[gender] = count
+        
+        # School year - grouped into 초등학생/중학생/고등학생, others kept as is
+        for school_year, count in sheet_data.value_counts(GRADE_BAND).items():
             if school_year:
-                # Group elementary school
-                if school_year in ['초1', '초2', '초3', '초4', '초5', '초6']:
-                    school_year_count['초등학생'] = school_year_count.get('초등학생', 0) + 1
-                # Group middle school
-                elif school_year in ['중1', '중2', '중3']:
-                    school_year_count['중학생'] = school_year_count.get('중학생', 0) + 1
-                # Group high school
-                elif school_year in ['고1', '고2', '고3']:
-                    school_year_count['고등학생'] = school_year_count.get('고등학생', 0) + 1
-                # Keep others as is
-                else:
-                    school_year_count[school_year] = school_year_count.get(school_year, 0) + 1
-            
-            # Geography
-            geography = row.get('현재 거주중인 지역이 어디인가요? ', '').strip()
+                school_year_count[school_year] = count
+        
+        # Geography
+        for geography, count in sheet_data.value_counts(REGION).items():
             if geography:
-                geography_count[geography] = geography_count.get(geography, 0) + 1
-            
-            # GPT/Gemini usage (checking multiple relevant columns)
+                geography_count[geography] = count
+        
+        # GPT/Gemini usage (checking multiple relevant columns)
+        usage_columns = [
             # Check general usage
-            general_usage = row.get('GPT, Gemini와 같은 LLM 인공지능 서비스를 *평소에 활용*하고 계신가요?', '').strip()
+            LLM_USAGE,
             # Check math usage
-            math_usage = row.get('GPT, Gemini와 같은 LLM 인공지능 서비스를 *수학 문제를 풀때*에도 사용하고 계신가요?', '').strip()
-            
-            # Count as user only if they answered exactly these responses
-            target_responses = ['네 활발하게 사용하고 있습니다', '네 가끔 사용합니다']
-            if general_usage in target_responses or math_usage in target_responses:
-                gpt_usage_count += 1
+            'GPT, Gemini와 같은 LLM 인공지능 서비스를 *수학 문제를 풀때*에도 사용하고 계신가요?'
+        ]
+        # Count as user only if they answered exactly these responses
+        target_responses = ['네 활발하게 사용하고 있습니다', '네 가끔 사용합니다']
+        for (general_usage, math_usage), count in sheet_data.joint_counts(usage_columns).items():
+            if general_usage.strip() in target_responses or math_usage.strip() in target_responses:
+                gpt_usage_count += count
         
         # Calculate percentages for individual data points
         gender_percentages = {}
@@ -1688,10 +2225,18 @@ def demographics():
         
         gpt_usage_percentage = round((gpt_usage_count / total_students) * 100, 1)
         
+        # Schools have a long tail - top 10 and the number of schools
+        schools = {
+            'top': {school: round((count / total_students) * 100, 1)
+                    for school, count in sheet_data.top_values(SCHOOL, 10)},
+            'distinct_count': sheet_data.distinct_count(SCHOOL)
+        }
+        
         return jsonify_unicode({
             'gender': gender_percentages,
             'school_year': school_year_percentages,
             'geography': geography_percentages,
+            'schools': schools,
             'llm_usage_percentage': gpt_usage_percentage,
             'total_count': total_students
         })
@@ -1700,20 +2245,48 @@ def demographics():
         print(f"Error in demographics endpoint: {str(e)}")
         return jsonify({'error': f'처리 중 오류가 발생했습니다: {str(e)}'}), 500
 
+def cached_sheet_row_count(sheet, spreadsheet_id=None):
+    """Row count of a sheet without fetching it: (row_count, source, as_of)
+
+    Prefers the in-memory snapshot, then the row count recorded with the
+    on-disk snapshot. ``as_of`` is when the count was last known to be true;
+    everything is None when neither is available (the Sheets API grid size
+    also counts blank rows, so it is only reported as ``grid_rows``).
+    """
+    if not spreadsheet_id:
+        spreadsheet_id = SPREADSHEET_ID
+    snapshot = sheet_cache.peek((spreadsheet_id, str(sheet['gid'])))
+    if snapshot is not None:
+        return len(snapshot.value), 'snapshot', snapshot.fetched_at
+    
+    stored = snapshot_store.load_meta('sheet', f"{spreadsheet_id}:{sheet['gid']}") if snapshot_store else None
+    if stored is not None and stored[2].get('row_count') is not None:
+        _, fetched_at, meta = stored
+        return meta['row_count'], 'stored_snapshot', fetched_at
+    return None, None, None
+
 @app.route('/api/sheets', methods=['GET'])
 def list_sheets():
-    """List all available sheets in the Google Sheets document"""
+    """List all available sheets in the Google Sheets document
+    
+    Row counts come from cached snapshots; this never downloads sheet data,
+    so counts may lag behind by up to ``stale_as_of``. Sheets not cached yet
+    have no ``row_count``, only ``grid_rows``: the sheet's grid size minus
+    the header, an upper bound that includes blank rows.
+    """
     try:
         sheet_info = get_all_sheet_names()
         
-        # Get count from each sheet
         sheet_details = []
         for sheet in sheet_info:
-            sheet_data = get_sheet_data_by_gid(sheet['gid'], sheet['name'])
+            row_count, source, as_of = cached_sheet_row_count(sheet)
             sheet_details.append({
                 'name': sheet['name'],
                 'gid': sheet['gid'],
-                'row_count': len(sheet_data)
+                'row_count': row_count,
+                'row_count_source': source,
+                'stale_as_of': datetime.fromtimestamp(as_of).isoformat() if as_of else None,
+                'grid_rows': max(sheet['grid_row_count'] - 1, 0) if sheet.get('grid_row_count') is not None else None
             })
         
         return jsonify_unicode({
@@ -1841,56 +2414,9 @@ def get_sheet_info():
         # Get columns
         columns = list(sheet_data[0].keys()) if sheet_data else []
         
-        # Get survey date
-        survey_date = None
-        from datetime import datetime
-        if sheet_data:
-            timestamp_str = sheet_data[0].get('Submitted At', '') or sheet_data[0].get('Submitted at', '')
-            print(f"DEBUG: timestamp_str = '{timestamp_str}'")
-            if timestamp_str:
-                try:
-                    date_parsed = False
-                    # Handle Korean date format first
-                    if '오전' in timestamp_str or '오후' in timestamp_str:
-                        try:
-                            date_part = timestamp_str.split(' 오')[0].strip()
-                            # Try with periods
-                            try:
-                                date_obj = datetime.strptime(date_part, '%Y. %m. %d')
-                            except:
-                                # Try without periods
-                                date_obj = datetime.strptime(date_part, '%Y. %m. %d.')
-                            survey_date = f"{date_obj.year}년 {date_obj.month}월"
-                            date_parsed = True
-                            print(f"DEBUG: Parsed Korean date format: {survey_date}")
-                        except Exception as e:
-                            print(f"DEBUG: Failed to parse Korean date: {e}")
-                            pass
-                    
-                    # Handle short format like "2025. 01"
-                    if not date_parsed and '. ' in timestamp_str and len(timestamp_str) <= 10:
-                        try:
-                            parts = timestamp_str.strip().split('. ')
-                            if len(parts) == 2:
-                                year = int(parts[0])
-                                month = int(parts[1])
-                                survey_date = f"{year}년 {month}월"
-                                date_parsed = True
-                        except:
-                            pass
-                    
-                    # Try other formats
-                    if not date_parsed:
-                        for fmt in ['%Y-%m-%d %H:%M:%S', '%m/%d/%Y %H:%M:%S', '%Y/%m/%d %H:%M:%S', '%d/%m/%Y %H:%M:%S']:
-                            try:
-                                date_obj = datetime.strptime(timestamp_str.split('.')[0], fmt)
-                                survey_date = f"{date_obj.year}년 {date_obj.month}월"
-                                date_parsed = True
-                                break
-                            except:
-                                continue
-                except:
-                    pass
+        # Get survey date (first response month, plus the full range of responses)
+        period = survey_period(sheet_data)
+        survey_date = period.label if period else None
         
         # Calculate demographics
         demographics = {
@@ -1898,28 +2424,22 @@ def get_sheet_info():
             'genders': {}
         }
         
-        for row in sheet_data:
-            # Check for grade data - handle both column name formats
-            grade = row.get('현재 학년이 어떻게 되나요?', row.get('학년', '')).strip()
+        # Grade and gender from the canonical columns (alias headers and "01. 중2" handled at ingest)
+        sheet_data = normalize_table(sheet_data)
+        for grade, count in sheet_data.value_counts(GRADE).items():
             if grade:
-                # Handle formats like "01. 중2"
-                if '. ' in grade:
-                    grade = grade.split('. ', 1)[1]
-                demographics['grades'][grade] = demographics['grades'].get(grade, 0) + 1
-            
-            # Check for gender data - handle both column name formats
-            gender = row.get('성별이 어떻게 되나요?', row.get('성별', '')).strip()
+                demographics['grades'][grade] = count
+        
+        for gender, count in sheet_data.value_counts(GENDER).items():
             if gender:
-                # Handle formats like "01. 남" 
-                if '. ' in gender:
-                    gender = gender.split('. ', 1)[1]
-                demographics['genders'][gender] = demographics['genders'].get(gender, 0) + 1
+                demographics['genders'][gender] = count
         
         return jsonify_unicode({
             'total_rows': len(sheet_data),
             'columns': columns,
             'demographics': demographics,
-            'survey_date': survey_date
+            'survey_date': survey_date,
+            'survey_period': period.to_dict() if period else None
         })
     
     except Exception as e:
@@ -2218,6 +2738,16 @@ def health_check():
     """헬스 체크 엔드포인트"""
     return jsonify_unicode({'status': 'ok', 'version': 'v3.1-interview-edit-fix-2025-01-25'})
 
+@app.route('/api/prefetch-status', methods=['GET'])
+def prefetch_status():
+    """Last refresh time and duration of every prefetched data source"""
+    return jsonify_unicode({
+        'enabled': PREFETCH_ENABLED,
+        'running': prefetch_scheduler.is_running(),
+        'interval_seconds': prefetch_scheduler.interval,
+        'sources': prefetch_scheduler.status()
+    })
+
 @app.route('/api/debug/sheet-data', methods=['GET'])
 def debug_sheet_data():
     """디버그용: 현재 시트 데이터 확인"""
@@ -2228,7 +2758,7 @@ def debug_sheet_data():
             'range': RANGE_NAME,
             'data_count': len(sheet_data),
             'headers': list(sheet_data[0].keys()) if sheet_data else [],
-            'first_row': sheet_data[0] if sheet_data else None,
+            'first_row': dict(sheet_data[0]) if sheet_data else None,
             'all_names': [row.get('이름을 적어주세요', row.get('이름', row.get('Name', ''))) for row in sheet_data] if sheet_data else []
         }
         # Create response with explicit UTF-8 encoding
@@ -0,0 +1,299 @@
+"""
+Offline benchmark for the sheet ingest, aggregation and prompt pipeline
+
+Generates synthetic survey exports with the real form's Korean headers (plus
+long free-text answers) and times each stage on them, without touching Google
+or Anthropic:
+
+    python benchmark.py                          # 1k, 10k and 100k rows
+    python benchmark.py --rows 1000,1000000      # include the 1M-row run
+    python benchmark.py --json results.json      # save results
+    python benchmark.py --baseline results.json  # exit 1 if a stage got slower
+
+Each size is ingested twice: once for wall-clock times and once under
+tracemalloc for peak memory, so the times are not inflated by tracing.
+"""
+import argparse
+import csv
+import gc
+import hashlib
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Keep the benchmark away from the on-disk snapshot store and background refreshes
+os.environ['SNAPSHOT_STORE_PATH'] = ''
+os.environ['PREFETCH_ENABLED'] = 'false'
+os.environ['SHEET_INCREMENTAL_SYNC'] = 'false'
+
+import app
+
+DEFAULT_ROWS = [1000, 10000, 100000]
+SHEET_GID = app.DEFAULT_SHEET_GID
+SHEET_NAME = 'Sheet1'
+
+QUESTIONS = [
+    'GPT를 어떻게 사용하고 있어?',
+    '학년별로 가장 재미있는 과목은?',
+    '서울 사는 여학생 중에서 과외를 하는 학생은 몇 명이야?',
+    '태블릿으로 공부할 때 불편한 점은?',
+]
+
+HEADERS = [
+    'Submitted At',
+    '이름을 적어주세요',
+    '성별이 어떻게 되나요?',
+    '현재 학년이 어떻게 되나요?',
+    '현재 거주중인 지역이 어디인가요? ',
+    '현재 다니고 있는 학교 이름을 적어주세요',
+    'GPT, Gemini와 같은 LLM 인공지능 서비스를 *평소에 활용*하고 계신가요?',
+    'GPT, Gemini와 같은 LLM 인공지능 서비스를 *수학 문제를 풀때*에도 사용하고 계신가요?',
+    '다음 중 가장 *재미있는* 과목을 선택해주세요',
+    '과외를 하고 있나요?',
+    '태블릿으로 공부할 때 불편한 점을 적어주세요',
+    'AI 서비스로 공부했던 경험을 자유롭게 적어주세요',
+    '중/고등',
+]
+
+GENDERS = ['남', '여', '01. 남', '02. 여', '']
+GRADES = ['초5', '초6', '중1', '중2', '중3', '고1', '고2', '고3', '01. 중2', ' 고1 ', '']
+REGIONS = ['서울', '경기', '부산', '대구', '인천', '광주', '대전', '울산', '세종', '강원', '제주', '']
+LLM_ANSWERS = ['네 활발하게 사용하고 있습니다', '네 가끔 사용합니다', '아니요 사용하지 않습니다']
+SUBJECTS = ['수학', '영어', '국어', '과학', '사회', '체육']
+SCHOOLS = ['한빛', '새솔', '푸른', '하늘', '가람', '누리']
+FREE_TEXT_PHRASES = [
+    '아이패드로 필기할 때 손이 자꾸 화면에 닿아요',
+    '갤탭 배터리가 금방 닳아서 충전기를 들고 다녀요',
+    '태블릿 화면이 작아서 문제집 PDF를 보기 힘들어요',
+    'GPT한테 수학 풀이를 물어보면 중간 과정을 자세히 알려줘서 좋아요',
+    '가끔 틀린 답을 알려줘서 다시 확인해야 해요',
+    '영어 단어를 외울 때 예문을 만들어 달라고 해요',
+    '유튜브 알림 때문에 집중이 잘 안 돼요',
+    '학원 숙제를 정리할 때 쓰고 있어요',
+]
+
+
+def synthetic_row(rng, index):
+    month, day = rng.randint(1, 3), rng.randint(1, 28)
+    hour = rng.randint(1, 12)
+    return [
+        f"2025. {month}. {day} {rng.choice(['오전', '오후'])} {hour}:{rng.randint(0, 59):02d}:00",
+        f"학생{index}",
+        rng.choice(GENDERS),
+        rng.choice(GRADES),
+        rng.choice(REGIONS),
+        f"{rng.choice(SCHOOLS)}{rng.choice(['초등학교', '중학교', '고등학교'])}",
+        rng.choice(LLM_ANSWERS),
+        rng.choice(LLM_ANSWERS),
+        rng.choice(SUBJECTS),
+        rng.choice(['네', '아니요']),
+        ' '.join(rng.choices(FREE_TEXT_PHRASES, k=rng.randint(0, 3))),
+        # Long answers that are (almost) all distinct, like real essay questions
+        ' '.join(rng.choices(FREE_TEXT_PHRASES, k=rng.randint(2, 12))) + f" ({index})",
+        rng.choice(['중등', '고등', '']),
+    ]
+
+
+def write_survey_csv(path, rows, seed=0):
+    """Write a synthetic survey export with ``rows`` responses to ``path``"""
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADERS)
+        for index in range(rows):
+            writer.writerow(synthetic_row(rng, index))
+
+
+def synthetic_transcript(lines, seed=0):
+    """Interview transcript in the "Speaker: text" form the Docs fallback returns"""
+    rng = random.Random(seed)
+    speakers = ['강예린', '김민수', '이서연', '박지훈']
+    answers = [
+        '저는 고등학교 2학년이에요',
+        '중학교 3학년이고 여자입니다',
+        '수학 문제 풀 때 GPT를 자주 써요',
+        '대학교에서 컴퓨터공학과 다니고 있어요',
+        '태블릿으로 인강을 들어요',
+    ]
+    out = []
+    for index in range(lines):
+        if index % 50 == 0:
+            out.append(f"{index // 3600:02d}:{index // 60 % 60:02d}:{index % 60:02d}")
+        speaker = speakers[0] if index % 2 == 0 else rng.choice(speakers[1:])
+        text = '어떻게 공부하고 계신가요?' if speaker == speakers[0] else rng.choice(answers)
+        out.append(f"{speaker}: {text}")
+    return '\n'.join(out)
+
+
+def local_export(path):
+    """fetch_sheet_export replacement that serves ``path`` (hashed like a download)"""
+    def fetch(sheet_gid, sheet_name=None, spreadsheet_id=None):
+        buffer = open(path, 'rb')
+        hasher = hashlib.sha256()
+        for chunk in iter(lambda: buffer.read(1024 * 1024), b''):
+            hasher.update(chunk)
+        buffer.seek(0)
+        return buffer, hasher.hexdigest()
+    return fetch
+
+
+def load_sheet():
+    app.sheet_cache.invalidate()
+    return app.get_sheet_data_by_gid(SHEET_GID, SHEET_NAME)
+
+
+def stages(transcript):
+    """(name, callable) pairs in run order; later stages use the parsed table"""
+    state = {}
+    client = app.app.test_client()
+
+    def parse():
+        state['table'] = load_sheet()
+
+    def prompt():
+        for question in QUESTIONS:
+            app.create_prompt(question, state['table'])
+
+    def process():
+        for question in QUESTIONS:
+            app.process_sheet_data(SHEET_NAME, state['table'], question)
+
+    def demographics():
+        response = client.get('/api/demographics')
+        assert response.status_code == 200, response.status_code
+
+    def participants():
+        app.extract_participant_info(transcript)
+
+    return [
+        ('parse', parse),
+        ('create_prompt', prompt),
+        ('process_sheet_data', process),
+        ('demographics', demographics),
+        ('extract_participant_info', participants),
+    ]
+
+
+def run_size(rows, repeat, seed):
+    """Benchmark every stage on a ``rows``-response sheet
+
+    Returns {stage: {'cold_ms', 'warm_ms', 'peak_kb'}}; cold is the first call
+    on a freshly ingested table, warm the best of ``repeat`` further calls.
+    """
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    os.close(fd)
+    try:
+        write_survey_csv(path, rows, seed)
+        app.fetch_sheet_export = local_export(path)
+        transcript = synthetic_transcript(max(rows // 10, 10), seed)
+        results = {}
+
+        for name, fn in stages(transcript):
+            gc.collect()
+            start = time.perf_counter()
+            fn()
+            cold = time.perf_counter() - start
+            warm = None
+            if name != 'parse':
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    fn()
+                    elapsed = time.perf_counter() - start
+                    warm = elapsed if warm is None else min(warm, elapsed)
+            results[name] = {'cold_ms': cold * 1000, 'warm_ms': warm * 1000 if warm is not None else None}
+
+        for name, fn in stages(transcript):
+            gc.collect()
+            tracemalloc.start()
+            try:
+                fn()
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            results[name]['peak_kb'] = peak / 1024
+        return results
+    finally:
+        app.sheet_cache.invalidate()
+        os.unlink(path)
+
+
+def format_ms(value):
+    return '-' if value is None else f"{value:,.1f}"
+
+
+def print_results(rows, results):
+    print(f"\n{rows:,} rows")
+    print(f"  {'stage':<26}{'cold ms':>12}{'warm ms':>12}{'peak KiB':>12}")
+    for name, result in results.items():
+        print(f"  {name:<26}{format_ms(result['cold_ms']):>12}{format_ms(result['warm_ms']):>12}"
+              f"{result['peak_kb']:>12,.0f}")
+
+
+def compare(baseline, current, tolerance, min_ms):
+    """Stages slower than the baseline by more than ``tolerance`` (and ``min_ms``)"""
+    regressions = []
+    for rows, results in current.items():
+        for name, result in results.items():
+            before = baseline.get(rows, {}).get(name)
+            if not before:
+                continue
+            for metric in ('cold_ms', 'warm_ms'):
+                old, new = before.get(metric), result.get(metric)
+                if old is None or new is None:
+                    continue
+                if new > old * (1 + tolerance) and new - old > min_ms:
+                    regressions.append(f"{rows} rows {name} {metric}: {old:,.1f} -> {new:,.1f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', default=','.join(map(str, DEFAULT_ROWS)),
+                        help='comma separated sheet sizes (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3, help='warm calls per stage (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--baseline', help='results file from an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed slowdown against the baseline (default: %(default)s)')
+    parser.add_argument('--min-ms', type=float, default=5.0,
+                        help='ignore slowdowns smaller than this many ms (default: %(default)s)')
+    args = parser.parse_args()
+
+    sizes = [int(value) for value in args.rows.split(',') if value.strip()]
+    current = {}
+    for rows in sizes:
+        # The app's own progress prints would drown the table
+        stdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')
+        try:
+            results = run_size(rows, args.repeat, args.seed)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+        current[str(rows)] = results
+        print_results(rows, results)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(current, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, current, args.tolerance, args.min_ms)
+        if regressions:
+            print('\nSlower than baseline:')
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print('\nNo regressions against baseline')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
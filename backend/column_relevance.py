@@ -0,0 +1,63 @@
+"""
+Which columns a question is about, so prompts can leave the others out
+
+A column scores for every question bigram found in its header (from a
+header index built once per table) and, at a lower weight, for every
+question bigram found among its answers (from the table's KeywordIndex).
+Bigrams shared by most columns ('나요' in every "...하나요?" header) are
+skipped, and rarer ones weigh more.
+"""
+import math
+
+from keyword_index import keyword_index
+from row_ranking import char_ngrams
+from sheet_table import SHEET_NAME_KEY, SheetTable
+
+VALUE_WEIGHT = 0.5
+
+# Bigrams found in more than this share of columns carry no signal
+MAX_COLUMN_SHARE = 0.5
+
+
+class ColumnIndex:
+    """Header bigrams of one table's columns"""
+    def __init__(self, table):
+        self.table = table
+        self.headers = [name for name in table.column_names if name != SHEET_NAME_KEY]
+        # bigram -> headers containing it
+        self._postings = {}
+        for name in self.headers:
+            for gram in set(char_ngrams(name)):
+                self._postings.setdefault(gram, []).append(name)
+
+    def scores(self, question):
+        """{header: relevance to ``question``} for columns with any overlap"""
+        total = len(self.headers)
+        scores = {}
+        if not total:
+            return scores
+        index = keyword_index(self.table)
+        for term in set(char_ngrams(question)):
+            header_matches = self._postings.get(term, [])
+            value_matches = list(index.matching_cells(term))
+            for names, weight in ((header_matches, 1.0), (value_matches, VALUE_WEIGHT)):
+                if not names or len(names) > total * MAX_COLUMN_SHARE:
+                    continue
+                idf = math.log(1 + total / len(names))
+                for name in names:
+                    scores[name] = scores.get(name, 0) + weight * idf
+        return scores
+
+    def top(self, question, limit):
+        """Up to ``limit`` best-scoring headers, in sheet order"""
+        scores = self.scores(question)
+        best = set(sorted(scores, key=lambda name: -scores[name])[:limit])
+        return [name for name in self.headers if name in best]
+
+
+def column_index(table):
+    """Return the table's ColumnIndex, building it on first use"""
+    return table.derive('column_index', ColumnIndex)
+
+
+SheetTable.register_label_independent('column_index')
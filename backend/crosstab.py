@@ -0,0 +1,50 @@
+"""
+Exact group-by counts over a SheetTable's categorical codes
+"""
+
+
+class CrossTab:
+    """Counts of ``of`` answers within each ``by`` group
+
+    ``counts[group][answer]`` is the number of rows; rows where either value
+    is blank are left out, as they are in the other statistics.
+    """
+    def __init__(self, by, of, counts):
+        self.by = by
+        self.of = of
+        self.counts = counts
+        self.group_totals = {group: sum(answers.values()) for group, answers in counts.items()}
+        self.total = sum(self.group_totals.values())
+
+    def groups(self):
+        """Groups in display order"""
+        return sorted(self.counts)
+
+    def top_answers(self, group, limit=None):
+        """(answer, count, percent of group) for one group, most common first"""
+        answers = sorted(self.counts[group].items(), key=lambda item: (-item[1], item[0]))
+        if limit is not None:
+            answers = answers[:limit]
+        group_total = self.group_totals[group]
+        return [(answer, count, count / group_total * 100) for answer, count in answers]
+
+    def __bool__(self):
+        return self.total > 0
+
+
+def crosstab(table, by, of):
+    """Cross-tabulate columns ``by`` x ``of`` over every row of ``table``
+
+    Counting runs over the zipped code arrays of the two columns (one C-level
+    Counter pass via ``joint_counts``, memoized per table), so only the
+    distinct value pairs are ever turned back into strings.
+    """
+    counts = {}
+    for (group, answer), count in table.joint_counts([by, of]).items():
+        group = group.strip()
+        answer = answer.strip()
+        if not group or not answer:
+            continue
+        answers = counts.setdefault(group, {})
+        answers[answer] = answers.get(answer, 0) + count
+    return CrossTab(by, of, counts)
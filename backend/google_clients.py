@@ -0,0 +1,121 @@
+"""
+Process-wide registry of Google API clients (Sheets, Docs)
+"""
+import os
+import threading
+from datetime import datetime
+
+from google.auth.transport.requests import Request
+from google.oauth2 import service_account
+from googleapiclient.discovery import build
+
+# api name -> (version, read-only scopes)
+GOOGLE_APIS = {
+    'sheets': ('v4', ['https://www.googleapis.com/auth/spreadsheets.readonly']),
+    'docs': ('v1', ['https://www.googleapis.com/auth/documents.readonly']),
+}
+
+CREDENTIALS_PATH = 'credentials.json'
+# Refresh access tokens this many seconds before they expire
+TOKEN_REFRESH_MARGIN = 300
+
+
+class GoogleClientRegistry:
+    """Load credentials once and hand out ready-to-use discovery clients
+
+    Service account credentials are read from disk once per API and shared by
+    every thread; their access token is refreshed under a lock shortly before
+    it expires, so concurrent requests never race to refresh it. Discovery
+    clients are built once per thread because the httplib2 transport under
+    them is not thread-safe. Everything is rebuilt after a fork so gunicorn
+    workers never share sockets.
+    """
+    def __init__(self, credentials_path=CREDENTIALS_PATH, api_key_env='GOOGLE_API_KEY'):
+        self.credentials_path = credentials_path
+        self.api_key_env = api_key_env
+        self._lock = threading.Lock()
+        self._credentials = {}
+        self._local = threading.local()
+        self._pid = None
+
+    def get_service(self, api):
+        """Return a client for ``api`` ('sheets' or 'docs'), or None without credentials"""
+        self._check_pid()
+        services = getattr(self._local, 'services', None)
+        if services is None:
+            services = self._local.services = {}
+
+        credentials = self.get_credentials(api)
+        if credentials is not None:
+            self._ensure_token(credentials)
+
+        service = services.get(api)
+        if service is None:
+            version, _ = GOOGLE_APIS[api]
+            if credentials is not None:
+                service = build(api, version, credentials=credentials, cache_discovery=False)
+            else:
+                api_key = self.api_key()
+                if not api_key:
+                    return None
+                service = build(api, version, developerKey=api_key, cache_discovery=False)
+            services[api] = service
+        return service
+
+    def get_credentials(self, api):
+        """Return the shared service account credentials for ``api`` (None if there is no key file)"""
+        credentials = self._credentials.get(api)
+        if credentials is not None:
+            return credentials
+        if not os.path.exists(self.credentials_path):
+            return None
+        with self._lock:
+            credentials = self._credentials.get(api)
+            if credentials is None:
+                _, scopes = GOOGLE_APIS[api]
+                credentials = service_account.Credentials.from_service_account_file(
+                    self.credentials_path, scopes=scopes)
+                self._credentials[api] = credentials
+        return credentials
+
+    def api_key(self):
+        api_key = os.getenv(self.api_key_env)
+        if api_key and api_key != 'your_google_api_key_here':
+            return api_key
+        return None
+
+    def reset(self):
+        """Forget cached credentials and clients (e.g. after rotating the key file)"""
+        with self._lock:
+            self._credentials = {}
+            self._local = threading.local()
+
+    def _ensure_token(self, credentials):
+        if _token_fresh(credentials):
+            return
+        with self._lock:
+            if not _token_fresh(credentials):
+                credentials.refresh(Request())
+
+    def _check_pid(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._local = threading.local()
+                self._pid = os.getpid()
+
+
+def _token_fresh(credentials):
+    # google-auth keeps ``expiry`` as a naive UTC datetime
+    expiry = credentials.expiry
+    return bool(credentials.token) and expiry is not None and \
+        (expiry - datetime.utcnow()).total_seconds() > TOKEN_REFRESH_MARGIN
+
+
+google_clients = GoogleClientRegistry()
+
+
+def get_google_service(api):
+    """Return a process-wide client for ``api`` ('sheets' or 'docs'), or None without credentials"""
+    return google_clients.get_service(api)
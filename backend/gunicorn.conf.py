@@ -0,0 +1,13 @@
+"""
+Gunicorn hooks - run the snapshot prefetcher inside each worker process
+"""
+
+
+def post_worker_init(worker):
+    from app import start_prefetch
+    start_prefetch()
+
+
+def worker_exit(server, worker):
+    from app import stop_prefetch
+    stop_prefetch()
@@ -0,0 +1,79 @@
+"""
+Shared keep-alive HTTP client for Google and search upstreams
+"""
+import atexit
+import os
+import threading
+
+import httpx
+
+# Connect quickly or give up; exports of large sheets can take a while to read
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '30'))
+HTTP_MAX_CONNECTIONS = int(os.getenv('HTTP_MAX_CONNECTIONS', '20'))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', '60'))
+HTTP2_ENABLED = os.getenv('HTTP2_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+
+_client = None
+_client_pid = None
+_lock = threading.Lock()
+
+
+def _http2_available():
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def get_client():
+    """Return the process-wide httpx client, creating it on first use
+
+    httpx.Client is thread-safe and keeps a separate keep-alive pool per
+    origin (docs.google.com, www.googleapis.com, ...), so every upstream call
+    after the first one skips the TCP and TLS handshakes. The client is
+    recreated after a fork so gunicorn workers never share sockets.
+    """
+    global _client, _client_pid
+    if _client is not None and _client_pid == os.getpid():
+        return _client
+
+    with _lock:
+        if _client is None or _client_pid != os.getpid():
+            http2 = HTTP2_ENABLED and _http2_available()
+            if HTTP2_ENABLED and not http2:
+                print("Warning: HTTP2_ENABLED is set but the 'h2' package is not installed, using HTTP/1.1")
+            _client = httpx.Client(
+                http2=http2,
+                timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+                    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+                )
+            )
+            _client_pid = os.getpid()
+    return _client
+
+
+def http_get(url, params=None, headers=None, follow_redirects=True):
+    """GET ``url`` through the shared client"""
+    return get_client().get(url, params=params, headers=headers, follow_redirects=follow_redirects)
+
+
+def http_stream(url, params=None, headers=None, follow_redirects=True):
+    """Streaming GET through the shared client - use as ``with http_stream(url) as response:``"""
+    return get_client().stream('GET', url, params=params, headers=headers, follow_redirects=follow_redirects)
+
+
+def close_client():
+    """Close pooled connections (called automatically at interpreter exit)"""
+    global _client
+    with _lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+
+
+atexit.register(close_client)
@@ -0,0 +1,131 @@
+"""
+Inverted index from cell text tokens to the cells that contain them
+"""
+from array import array
+
+from sheet_table import SHEET_NAME_KEY, SheetTable
+
+# Vocabulary scans are remembered per keyword, up to this many keywords
+MAX_CACHED_KEYWORDS = 1024
+
+# An index carried over to a table with appended rows is rebuilt once the
+# unindexed values it has to scan exceed this fraction of the indexed ones
+MAX_TAIL_FRACTION = 0.25
+
+
+class KeywordIndex:
+    """Answer "which rows mention X, and in which columns" without scanning cells
+
+    Every distinct cell value (column, category code) is split into lowercased
+    whitespace tokens, and each token keeps the list of values it occurs in.
+    A keyword without whitespace occurs in a value exactly when it occurs in
+    one of the value's tokens, so a lookup only scans the token vocabulary
+    (much smaller than the cells, and shared by repeated answers) and the
+    results match ``keyword in str(value).lower()``. Row lists per value come
+    from ``SheetTable.rows_by_code``, built once per column that ever matches.
+    """
+    def __init__(self, table):
+        self.table = table
+        self._columns = [(name, column) for name, column in table.columns.items() if name != SHEET_NAME_KEY]
+        # Categories only ever grow, so values added after the index was built
+        # are found by scanning just the tail beyond this point
+        self._indexed = [len(column.categories) for _, column in self._columns]
+        self._width = max(len(self._columns), 1)
+        self._postings = {}
+        self._keyword_entries = {}
+        postings = self._postings
+        for position, (_, column) in enumerate(self._columns):
+            for code, value in enumerate(column.categories[:self._indexed[position]]):
+                entry = code * self._width + position
+                for token in set(str(value).lower().split()):
+                    posting = postings.get(token)
+                    if posting is None:
+                        posting = postings[token] = array('Q')
+                    posting.append(entry)
+
+    def extended(self, table):
+        """Index for ``table``, this index's table with rows appended
+
+        The postings and keyword memo are shared (they only describe values
+        that were already indexed); values first seen in the new rows are
+        covered by the tail scan until the tail grows large enough that a
+        rebuild pays off.
+        """
+        indexed = sum(self._indexed)
+        tail = sum(len(column.categories) for _, column in self._columns) - indexed
+        if tail > max(indexed * MAX_TAIL_FRACTION, 1):
+            return KeywordIndex(table)
+        index = KeywordIndex.__new__(KeywordIndex)
+        index.table = table
+        index._columns = [(name, table.columns[name]) for name, _ in self._columns]
+        index._indexed = self._indexed
+        index._width = self._width
+        index._postings = self._postings
+        index._keyword_entries = self._keyword_entries
+        return index
+
+    def matching_codes(self, keyword):
+        """Return {column position: set of codes} of values containing ``keyword``"""
+        keyword = keyword.lower()
+        matches = {}
+        if not keyword or keyword != ''.join(keyword.split()):
+            # Phrases can span tokens - fall back to testing every value
+            for position, (_, column) in enumerate(self._columns):
+                self._scan(matches, position, column.categories, 0, keyword)
+            return matches
+
+        entries = self._keyword_entries.get(keyword)
+        if entries is None:
+            entries = set()
+            for token, posting in self._postings.items():
+                if keyword in token:
+                    entries.update(posting)
+            if len(self._keyword_entries) >= MAX_CACHED_KEYWORDS:
+                self._keyword_entries.clear()
+            self._keyword_entries[keyword] = entries
+        for entry in entries:
+            code, position = divmod(entry, self._width)
+            matches.setdefault(position, set()).add(code)
+        for position, (_, column) in enumerate(self._columns):
+            self._scan(matches, position, column.categories, self._indexed[position], keyword)
+        return matches
+
+    def matching_cells(self, keyword):
+        """Return {column name: set of codes} of values containing ``keyword``"""
+        return {self._columns[position][0]: codes for position, codes in self.matching_codes(keyword).items()}
+
+    def mentions(self, keywords):
+        """Rows mentioning any of ``keywords`` and per-column mention counts
+
+        Returns (sorted row indices, {column name: number of matching rows}).
+        """
+        codes_by_position = {}
+        for keyword in keywords:
+            for position, codes in self.matching_codes(keyword).items():
+                codes_by_position.setdefault(position, set()).update(codes)
+
+        rows = set()
+        column_counts = {}
+        for position, codes in sorted(codes_by_position.items()):
+            name = self._columns[position][0]
+            rows_by_code = self.table.rows_by_code(name)
+            matching_rows = [row for code in codes for row in rows_by_code.get(code, ())]
+            rows.update(matching_rows)
+            if name and matching_rows:
+                column_counts[name] = len(matching_rows)
+        return sorted(rows), column_counts
+
+    @staticmethod
+    def _scan(matches, position, categories, start, keyword):
+        for code in range(start, len(categories)):
+            if keyword in str(categories[code]).lower():
+                matches.setdefault(position, set()).add(code)
+
+
+def keyword_index(table):
+    """Return the table's KeywordIndex, building it on first use"""
+    return table.derive('keyword_index', KeywordIndex)
+
+
+SheetTable.register_extender('keyword_index', lambda table, key, previous, start: previous.extended(table))
+SheetTable.register_label_independent('keyword_index')
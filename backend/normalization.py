@@ -0,0 +1,98 @@
+"""
+Canonical survey columns computed once when a sheet is ingested
+
+Each survey sheet asks the same questions under slightly different headers
+('현재 학년이 어떻게 되나요?' vs '학년', a region header with a trailing
+space) and some encode answers as numbered options ("01. 중2", "01. 남").
+The fields below map those variants onto one canonical column each, so
+statistics and filters read ``grade``, ``gender``, ... instead of cleaning
+the raw cells again in every request.
+"""
+from sheet_table import DerivedColumn
+
+GENDER = 'gender'
+GRADE = 'grade'
+GRADE_BAND = 'grade_band'
+REGION = 'region'
+SCHOOL = 'school'
+LLM_USAGE = 'llm_usage'
+
+GRADE_BANDS = {
+    '초등학생': ['초1', '초2', '초3', '초4', '초5', '초6'],
+    '중학생': ['중1', '중2', '중3'],
+    '고등학생': ['고1', '고2', '고3'],
+}
+_BAND_OF_GRADE = {grade: band for band, grades in GRADE_BANDS.items() for grade in grades}
+
+
+def strip_option_number(value):
+    """'01. 중2' -> '중2' (plain values are only stripped)"""
+    value = value.strip()
+    if '. ' in value:
+        value = value.split('. ', 1)[1].strip()
+    return value
+
+
+def first_answer(*values):
+    """First non-blank value among alias columns, stripped"""
+    for value in values:
+        value = value.strip()
+        if value:
+            return value
+    return ''
+
+
+def grade_band(grade, school_level=''):
+    """Group a grade into 초등학생/중학생/고등학생 (other answers are kept as is)
+
+    Sheets without a grade question fall back to the 중/고등 column.
+    """
+    if grade:
+        return _BAND_OF_GRADE.get(grade, grade)
+    if '중등' in school_level:
+        return '중학생'
+    if '고등' in school_level:
+        return '고등학생'
+    return ''
+
+
+class CanonicalField:
+    """One canonical column: alias source headers plus a cleaning function
+
+    ``normalize`` receives one value per source header ('' when the sheet has
+    no such header) and returns the canonical value ('' for no answer).
+    """
+    def __init__(self, name, sources, normalize):
+        self.name = name
+        self.sources = sources
+        self.normalize = normalize
+
+
+GRADE_SOURCES = ['현재 학년이 어떻게 되나요?', '학년']
+
+CANONICAL_FIELDS = [
+    CanonicalField(GENDER, ['성별이 어떻게 되나요?', '성별'],
+                   lambda *values: strip_option_number(first_answer(*values))),
+    CanonicalField(GRADE, GRADE_SOURCES,
+                   lambda *values: strip_option_number(first_answer(*values))),
+    CanonicalField(GRADE_BAND, GRADE_SOURCES + ['중/고등'],
+                   lambda grade, grade_alt, school_level: grade_band(
+                       strip_option_number(first_answer(grade, grade_alt)), school_level.strip())),
+    CanonicalField(REGION, ['현재 거주중인 지역이 어디인가요? ', '거주지역', '지역'], first_answer),
+    CanonicalField(SCHOOL, ['현재 다니고 있는 학교 이름을 적어주세요', '학교 이름', '학교'], first_answer),
+    CanonicalField(LLM_USAGE, ['GPT, Gemini와 같은 LLM 인공지능 서비스를 *평소에 활용*하고 계신가요?'],
+                   first_answer),
+]
+
+
+def build_canonical_column(table, field):
+    """Compute one canonical column; ``normalize`` runs once per distinct source combination"""
+    return DerivedColumn(field.name, field.sources, field.normalize).fill(table)
+
+
+def normalize_table(table, fields=CANONICAL_FIELDS):
+    """Attach the canonical columns to ``table`` (no-op if they are already there)"""
+    missing = [field for field in fields if field.name not in table.derived_columns]
+    if missing:
+        table.add_derived_columns({field.name: build_canonical_column(table, field) for field in missing})
+    return table
@@ -0,0 +1,154 @@
+"""
+Background refresher that keeps data source snapshots warm
+"""
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+
+class PrefetchScheduler:
+    """Periodically refresh every registered data source in a worker pool
+
+    ``list_sources()`` returns dicts with ``key`` (unique id), ``label`` and
+    ``refresh`` (a callable that forces a fetch and returns True on success).
+    The source list is re-read once per ``interval`` so newly added data
+    sources are picked up without a restart. Each source gets its own jittered
+    schedule, and at most ``max_workers`` refreshes run at the same time.
+    """
+    def __init__(self, list_sources, interval=300, jitter=0.2, max_workers=2, name='prefetch'):
+        self.list_sources = list_sources
+        self.interval = interval
+        self.jitter = jitter
+        self.max_workers = max_workers
+        self.name = name
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._executor = None
+        self._sources = {}
+        self._next_run = {}
+        self._in_flight = set()
+        self._status = {}
+
+    def start(self):
+        """Start the scheduler thread (no-op if it is already running in this process)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return False
+            # Threads do not survive a fork - start fresh in the worker process
+            self._stop = threading.Event()
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix=f'{self.name}-worker')
+            self._next_run = {}
+            self._in_flight = set()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+        print(f"[PREFETCH] Started (interval={self.interval}s, max_workers={self.max_workers})")
+        return True
+
+    def stop(self, timeout=5):
+        """Stop scheduling new refreshes and wait briefly for running ones"""
+        with self._lock:
+            thread, executor = self._thread, self._executor
+            if thread is None or self._pid != os.getpid():
+                return
+            self._stop.set()
+            self._thread = None
+            self._executor = None
+        thread.join(timeout)
+        executor.shutdown(wait=False, cancel_futures=True)
+        print("[PREFETCH] Stopped")
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive() and self._pid == os.getpid()
+
+    def status(self):
+        """Return last refresh time, duration and outcome for every known source"""
+        with self._lock:
+            entries = []
+            for key, source in self._sources.items():
+                entry = {'key': key, 'label': source.get('label'), 'in_flight': key in self._in_flight}
+                entry.update(self._status.get(key, {}))
+                next_run = self._next_run.get(key)
+                entry['next_refresh_at'] = datetime.fromtimestamp(next_run).isoformat() if next_run else None
+                entries.append(entry)
+            return entries
+
+    def _run(self):
+        stop = self._stop
+        sources_loaded_at = 0
+        while not stop.is_set():
+            now = time.time()
+            if now - sources_loaded_at >= self.interval:
+                self._reload_sources(now)
+                sources_loaded_at = now
+
+            for key in self._due_sources(now):
+                self._submit(key)
+
+            stop.wait(min(5.0, max(self.interval / 10, 0.5)))
+
+    def _reload_sources(self, now):
+        try:
+            sources = {source['key']: source for source in self.list_sources()}
+        except Exception as e:
+            print(f"[PREFETCH] Could not list data sources: {str(e)}")
+            return
+        with self._lock:
+            self._sources = sources
+            for key in list(self._next_run):
+                if key not in sources:
+                    del self._next_run[key]
+            for key in sources:
+                if key not in self._next_run:
+                    # Spread the first pass out so sources do not all hit Google at once
+                    self._next_run[key] = now + random.uniform(0, self.interval * self.jitter)
+
+    def _due_sources(self, now):
+        with self._lock:
+            return [key for key, due in self._next_run.items()
+                    if due <= now and key not in self._in_flight]
+
+    def _submit(self, key):
+        with self._lock:
+            source = self._sources.get(key)
+            executor = self._executor
+            if source is None or executor is None:
+                return
+            self._in_flight.add(key)
+        try:
+            executor.submit(self._refresh, key, source)
+        except RuntimeError:
+            # Executor was shut down by stop()
+            with self._lock:
+                self._in_flight.discard(key)
+
+    def _refresh(self, key, source):
+        started = time.time()
+        ok, error = False, None
+        try:
+            ok = bool(source['refresh']())
+        except Exception as e:
+            error = str(e)
+        duration = time.time() - started
+
+        with self._lock:
+            self._in_flight.discard(key)
+            status = self._status.setdefault(key, {})
+            status['last_attempt_at'] = datetime.fromtimestamp(started).isoformat()
+            status['last_duration_ms'] = round(duration * 1000, 1)
+            status['last_ok'] = ok
+            status['last_error'] = error
+            if ok:
+                status['last_refresh_at'] = status['last_attempt_at']
+            if key in self._next_run:
+                spread = self.interval * self.jitter
+                self._next_run[key] = time.time() + self.interval + random.uniform(-spread, spread)
+
+        if not ok:
+            print(f"[PREFETCH] Refresh of {source.get('label') or key} failed{': ' + error if error else ''}")
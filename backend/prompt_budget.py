@@ -0,0 +1,62 @@
+"""
+Token estimates and a running token budget for building prompts
+
+The estimate is deliberately simple and errs high: every non-ASCII character
+(Hangul, punctuation like '·') counts as one token and ASCII text as one
+token per four characters. Claude's tokenizer merges common Hangul syllables,
+so a prompt that fills its estimated budget stays under the real number.
+"""
+
+
+def estimate_tokens(text):
+    """Estimated token count of ``text``"""
+    ascii_chars = len(text.encode('ascii', 'ignore'))
+    return (ascii_chars + 3) // 4 + len(text) - ascii_chars
+
+
+def truncate_to_tokens(text, max_tokens, marker='...'):
+    """Cut ``text`` so that it, plus ``marker`` when cut, fits in ``max_tokens``"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    # Count in quarter tokens: ASCII costs 1, anything else 4
+    allowance = max(max_tokens - estimate_tokens(marker), 0) * 4
+    used = 0
+    for end, char in enumerate(text):
+        used += 1 if char < '\x80' else 4
+        if used > allowance:
+            return text[:end] + marker
+    return text
+
+
+class PromptBudget:
+    """Running estimate of a prompt's tokens against ``limit``
+
+    Sections are charged in priority order; required ones are always added
+    (``charge``) and optional ones only when they still fit (``try_charge``).
+    ``usage()`` reports the tokens per section.
+    """
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self.sections = {}
+
+    @property
+    def remaining(self):
+        return max(self.limit - self.used, 0)
+
+    def charge(self, section, text):
+        """Count ``text`` against the budget unconditionally and return it"""
+        tokens = estimate_tokens(text)
+        self.used += tokens
+        self.sections[section] = self.sections.get(section, 0) + tokens
+        return text
+
+    def try_charge(self, section, text):
+        """Count ``text`` if it fits in what is left; returns whether it did"""
+        if estimate_tokens(text) > self.remaining:
+            return False
+        self.charge(section, text)
+        return True
+
+    def usage(self):
+        return {'estimated_tokens': self.used, 'budget': self.limit, 'sections': dict(self.sections)}
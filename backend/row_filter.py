@@ -0,0 +1,171 @@
+"""
+Composable row filters evaluated on cached per-value bitsets
+
+A selection is a Python int used as a bitset (bit i set = row i selected), so
+AND/OR/NOT of conditions are single big-integer operations instead of passes
+over the rows. Bitsets per (column, value) are built once per table and
+carried over, updated for the new rows only, when the table is extended.
+"""
+from sheet_table import SheetTable
+
+# Columns with more distinct values than this (free text, names) are not
+# given per-value bitsets; conditions on them scan the codes once instead
+BITSET_MAX_CATEGORIES = 64
+
+
+def popcount(bits):
+    """Number of selected rows"""
+    return bin(bits).count('1')
+
+
+def bitset_rows(bits):
+    """Selected row indices in ascending order"""
+    rows = []
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+    for byte_index, byte in enumerate(data):
+        if byte:
+            base = byte_index * 8
+            for bit in range(8):
+                if byte >> bit & 1:
+                    rows.append(base + bit)
+    return rows
+
+
+def all_rows(table):
+    return (1 << len(table)) - 1
+
+
+def _value_bitsets(table, name, start=0):
+    """{value: bitset} over rows ``start:`` of one column (bit 0 = row ``start``)"""
+    column = table.column(name)
+    if column is None:
+        return {}
+    size = (len(table) - start + 7) // 8
+    masks = {}
+    for row, code in enumerate(column.codes[start:] if start else column.codes):
+        mask = masks.get(code)
+        if mask is None:
+            mask = masks[code] = bytearray(size)
+        mask[row >> 3] |= 1 << (row & 7)
+    return {column.categories[code]: int.from_bytes(mask, 'little') for code, mask in masks.items()}
+
+
+def column_bitsets(table, name):
+    """{value: bitset of rows with that value} for one column (memoized per table)"""
+    return table.derive(('bitsets', name), lambda table: _value_bitsets(table, name))
+
+
+def _extend_bitsets(table, key, previous, start):
+    bitsets = dict(previous)
+    for value, bits in _value_bitsets(table, key[1], start).items():
+        bitsets[value] = bitsets.get(value, 0) | bits << start
+    return bitsets
+
+
+SheetTable.register_extender('bitsets', _extend_bitsets)
+SheetTable.register_label_independent('bitsets')
+
+
+class RowFilter:
+    """Base class - combine filters with ``&``, ``|`` and ``~``"""
+    def evaluate(self, table):
+        """Return the bitset of rows of ``table`` that pass"""
+        raise NotImplementedError
+
+    def rows(self, table):
+        return bitset_rows(self.evaluate(table))
+
+    def __and__(self, other):
+        return AllOf(self, other)
+
+    def __or__(self, other):
+        return AnyOf(self, other)
+
+    def __invert__(self):
+        return Not(self)
+
+
+class ColumnIn(RowFilter):
+    """Rows whose value in ``name`` is one of ``values``"""
+    def __init__(self, name, values):
+        self.name = name
+        self.values = set(values)
+
+    def evaluate(self, table):
+        column = table.column(self.name)
+        if column is None:
+            return 0
+        if len(column.categories) <= BITSET_MAX_CATEGORIES:
+            bitsets = column_bitsets(table, self.name)
+            bits = 0
+            for value in self.values:
+                bits |= bitsets.get(value, 0)
+            return bits
+        codes = {column.code_of(value) for value in self.values} - {None}
+        mask = bytearray((len(table) + 7) // 8)
+        for row, code in enumerate(column.codes):
+            if code in codes:
+                mask[row >> 3] |= 1 << (row & 7)
+        return int.from_bytes(mask, 'little')
+
+    def __repr__(self):
+        return f"ColumnIn({self.name!r}, {sorted(self.values)!r})"
+
+
+class ColumnWhere(RowFilter):
+    """Rows whose value in ``name`` satisfies ``predicate`` (tested once per distinct value)"""
+    def __init__(self, name, predicate, label=None):
+        self.name = name
+        self.predicate = predicate
+        self.label = label
+
+    def evaluate(self, table):
+        column = table.column(self.name)
+        if column is None:
+            return 0
+        values = [value for value in column.categories if self.predicate(value)]
+        return ColumnIn(self.name, values).evaluate(table)
+
+    def __repr__(self):
+        return f"ColumnWhere({self.name!r}, {self.label or self.predicate!r})"
+
+
+class AllOf(RowFilter):
+    def __init__(self, *filters):
+        self.filters = filters
+
+    def evaluate(self, table):
+        bits = all_rows(table)
+        for row_filter in self.filters:
+            if not bits:
+                break
+            bits &= row_filter.evaluate(table)
+        return bits
+
+    def __repr__(self):
+        return ' & '.join(f"({row_filter!r})" for row_filter in self.filters)
+
+
+class AnyOf(RowFilter):
+    def __init__(self, *filters):
+        self.filters = filters
+
+    def evaluate(self, table):
+        bits = 0
+        for row_filter in self.filters:
+            bits |= row_filter.evaluate(table)
+        return bits
+
+    def __repr__(self):
+        return ' | '.join(f"({row_filter!r})" for row_filter in self.filters)
+
+
+class Not(RowFilter):
+    def __init__(self, row_filter):
+        self.filter = row_filter
+
+    def evaluate(self, table):
+        return all_rows(table) & ~self.filter.evaluate(table)
+
+    def __repr__(self):
+        return f"~({self.filter!r})"
@@ -0,0 +1,110 @@
+"""
+BM25 ranking of sheet rows against a question on character bigrams
+
+Korean answers inflect and run words together ("태블릿으로", "태블릿이"), so
+rows and questions are compared on two-character pieces of each word rather
+than on whole words. Cells containing a bigram are found through the
+table's KeywordIndex (built at ingest), so ranking adds no per-cell
+tokenizing of its own.
+"""
+from array import array
+import math
+
+from keyword_index import keyword_index
+from sheet_table import SHEET_NAME_KEY, SheetTable
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Terms found in more than this share of rows ('학생' in every name, '네')
+# say nothing about relevance and are skipped
+MAX_DOCUMENT_FREQUENCY = 0.5
+
+
+def char_ngrams(text, n=2):
+    """Lowercased character n-grams of each whitespace-separated word
+
+    Words of at most ``n`` characters are kept whole.
+    """
+    grams = []
+    for word in text.lower().split():
+        if len(word) <= n:
+            grams.append(word)
+        else:
+            grams.extend(word[i:i + n] for i in range(len(word) - n + 1))
+    return grams
+
+
+class RowRanker:
+    """Okapi BM25 over the rows of one table
+
+    A term's frequency in a row is the number of the row's cells that
+    contain it, and a row's length is its number of characters.
+    """
+    def __init__(self, table):
+        self.table = table
+        columns = [column for name, column in table.columns.items() if name != SHEET_NAME_KEY]
+        # Cell lengths once per distinct value, then summed across each row
+        lengths = []
+        for column in columns:
+            code_lengths = [len(str(value)) for value in column.categories]
+            lengths.append(map(code_lengths.__getitem__, column.codes))
+        self._row_lengths = array('I', map(sum, zip(*lengths))) if columns else array('I')
+        self._average_length = sum(self._row_lengths) / len(table) if len(table) else 0
+
+    def scores(self, question):
+        """{row: BM25 score} for rows sharing at least one informative term with ``question``"""
+        table = self.table
+        total = len(table)
+        scores = {}
+        if not total or not self._average_length:
+            return scores
+        index = keyword_index(table)
+        row_lengths = self._row_lengths
+        average_length = self._average_length
+        for term in set(char_ngrams(question)):
+            row_lists = []
+            for name, codes in index.matching_cells(term).items():
+                rows_by_code = table.rows_by_code(name)
+                row_lists.extend(rows_by_code[code] for code in codes if code in rows_by_code)
+            # Rows matching in several cells are counted more than once here,
+            # which only makes the cut-off stricter
+            if not row_lists or sum(map(len, row_lists)) > total * MAX_DOCUMENT_FREQUENCY:
+                continue
+            frequencies = {}
+            for rows in row_lists:
+                for row in rows:
+                    frequencies[row] = frequencies.get(row, 0) + 1
+            matched = len(frequencies)
+            idf = math.log((total - matched + 0.5) / (matched + 0.5) + 1)
+            for row, frequency in frequencies.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * row_lengths[row] / average_length)
+                scores[row] = scores.get(row, 0) + idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        return scores
+
+    def rank(self, question, limit=None, rows=None):
+        """Row indices, best match first, then the remaining rows in sheet order
+
+        ``rows`` (ascending row indices) limits the result to those rows; they
+        are scored against the whole table, so a selection ranks the same as
+        it would within the full sheet.
+        """
+        scores = self.scores(question)
+        if rows is not None:
+            selected = set(rows)
+            scores = {row: score for row, score in scores.items() if row in selected}
+        ranked = sorted(scores, key=lambda row: (-scores[row], row))
+        if limit is not None and len(ranked) >= limit:
+            return ranked[:limit]
+        rest = (row for row in (range(len(self.table)) if rows is None else rows) if row not in scores)
+        if limit is not None:
+            return ranked + [row for row, _ in zip(rest, range(limit - len(ranked)))]
+        return ranked + list(rest)
+
+
+def row_ranker(table):
+    """Return the table's RowRanker, building it on first use"""
+    return table.derive('row_ranker', RowRanker)
+
+
+SheetTable.register_label_independent('row_ranker')
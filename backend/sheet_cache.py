@@ -0,0 +1,149 @@
+"""
+In-process snapshot cache with a freshness window and stale-while-revalidate
+"""
+import threading
+import time
+
+
+class Snapshot:
+    """A cached value together with its fetch metadata"""
+    def __init__(self, value, fetched_at=None, digest=None, meta=None):
+        self.value = value
+        # Content hash of the raw upstream payload the value was parsed from
+        self.digest = digest
+        # Loader-specific bookkeeping (e.g. when the last full sync happened)
+        self.meta = meta or {}
+        # When the value was last confirmed against the upstream source
+        self.fetched_at = fetched_at if fetched_at is not None else time.time()
+        # When we last tried to revalidate (successfully or not)
+        self.checked_at = self.fetched_at
+
+    def age(self):
+        return time.time() - self.fetched_at
+
+
+class SnapshotCache:
+    """Keep the last good snapshot per key and revalidate it in the background
+
+    - Younger than ``ttl`` seconds: served as is.
+    - Older than ``ttl`` but within ``max_stale``: served as is while a single
+      background thread refreshes it.
+    - Older than that (or missing): loaded synchronously.
+
+    ``load(previous)`` is supplied per call and returns a new ``Snapshot`` or
+    ``None`` when the upstream fetch failed. A failed refresh never replaces
+    the last good snapshot.
+
+    ``restore(key)``, if given, returns a persisted snapshot for keys that are
+    not in memory yet (e.g. right after a restart). A restored snapshot is
+    served immediately and always revalidated in the background.
+    """
+    def __init__(self, ttl=60, max_stale=3600, name='cache', restore=None):
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.name = name
+        self.restore = restore
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._refreshing = set()
+
+    def get(self, key, load):
+        """Return the snapshot for ``key`` (or None if it could never be loaded)"""
+        snapshot = self._entries.get(key)
+        if snapshot is None:
+            snapshot = self._restore(key)
+            if snapshot is not None and time.time() - snapshot.fetched_at <= self.ttl + self.max_stale:
+                self._refresh_in_background(key, load)
+                return snapshot
+            return self.refresh(key, load)
+
+        now = time.time()
+        if now - snapshot.checked_at <= self.ttl:
+            return snapshot
+
+        if now - snapshot.fetched_at <= self.ttl + self.max_stale:
+            self._refresh_in_background(key, load)
+            return snapshot
+
+        return self.refresh(key, load)
+
+    def peek(self, key):
+        """Return the cached snapshot for ``key`` without triggering a load"""
+        return self._entries.get(key)
+
+    def invalidate(self, key=None):
+        """Drop one key (or everything) from the cache"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def refresh(self, key, load):
+        """Load ``key`` synchronously; concurrent callers share one upstream fetch"""
+        started_at = time.time()
+        with self._key_lock(key):
+            previous = self._entries.get(key) or self._restore(key)
+            # Another thread may have refreshed it while we waited for the lock
+            if previous is not None and previous.checked_at >= started_at:
+                return previous
+
+            try:
+                snapshot = load(previous)
+            except Exception as e:
+                print(f"[CACHE] {self.name}: refresh of {key} failed: {str(e)}")
+                snapshot = None
+
+            if snapshot is None:
+                if previous is not None:
+                    # Back off for one freshness window before retrying upstream
+                    previous.checked_at = time.time()
+                return previous
+
+            with self._lock:
+                self._entries[key] = snapshot
+            return snapshot
+
+    def _restore(self, key):
+        if self.restore is None:
+            return None
+        with self._key_lock(key):
+            snapshot = self._entries.get(key)
+            if snapshot is not None:
+                return snapshot
+            try:
+                snapshot = self.restore(key)
+            except Exception as e:
+                print(f"[CACHE] {self.name}: restore of {key} failed: {str(e)}")
+                snapshot = None
+            if snapshot is None:
+                return None
+            # Never treat a restored copy as freshly checked
+            snapshot.checked_at = 0
+            with self._lock:
+                self._entries[key] = snapshot
+            print(f"[CACHE] {self.name}: restored {key} from disk (age {snapshot.age():.0f}s)")
+            return snapshot
+
+    def _refresh_in_background(self, key, load):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                self.refresh(key, load)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=run, name=f'{self.name}-refresh', daemon=True).start()
+
+    def _key_lock(self, key):
+        with self._lock:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                lock = self._key_locks[key] = threading.RLock()
+            return lock
@@ -0,0 +1,475 @@
+"""
+Columnar storage for sheet data
+
+A SheetTable keeps one Column per header. Each Column stores the distinct cell
+values once and one small integer code per row, so long repeated answers
+("네 가끔 사용합니다", "01. 중2", ...) cost four bytes per row instead of a
+full string plus a dict slot. Rows are still available as read-only mappings
+for code that expects the old list-of-dicts shape.
+"""
+from array import array
+from collections import Counter
+from collections.abc import Mapping
+import heapq
+from operator import itemgetter
+import sys
+
+# Internal key that tells which sheet a row came from
+SHEET_NAME_KEY = '_sheet_name'
+
+
+class Column:
+    """One sheet column stored as categorical codes"""
+    def __init__(self, name, categories=None, index=None, codes=None):
+        self.name = name
+        # Distinct values in first-seen order; codes point into this list
+        self.categories = categories if categories is not None else []
+        self._index = index if index is not None else {}
+        self.codes = codes if codes is not None else array('I')
+
+    def append(self, value):
+        self.codes.append(self.encode(value))
+
+    def encode(self, value):
+        """Return the code for ``value``, adding it as a new category if needed"""
+        code = self._index.get(value)
+        if code is None:
+            code = self._index[value] = len(self.categories)
+            self.categories.append(value)
+        return code
+
+    def code_of(self, value):
+        """Return the code for ``value`` (None if it never occurs)"""
+        return self._index.get(value)
+
+    def take(self, indices):
+        """Return a column with only the given rows, sharing the category list"""
+        codes = self.codes
+        return Column(self.name, self.categories, self._index,
+                      array('I', [codes[i] for i in indices]))
+
+    def value_counts(self):
+        """Count rows per distinct value"""
+        categories = self.categories
+        return {categories[code]: count for code, count in Counter(self.codes).items()}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        return self.categories[self.codes[i]]
+
+    def __iter__(self):
+        categories = self.categories
+        return (categories[code] for code in self.codes)
+
+
+class DerivedColumn(Column):
+    """A column computed from other columns of the same table
+
+    ``function`` receives one value per name in ``sources`` ('' where the
+    table has no such column) and runs once per distinct combination of
+    source codes. Categories and that memo only ever grow, so when rows are
+    appended (see SheetTable.extend_rows) only the new rows are computed.
+    """
+    def __init__(self, name, sources, function, categories=None, index=None, codes=None, combos=None):
+        super().__init__(name, categories, index, codes)
+        self.sources = sources
+        self.function = function
+        self._combos = combos if combos is not None else {}
+
+    def fill(self, table):
+        """Compute the rows of ``table`` this column does not cover yet"""
+        start = len(self.codes)
+        lookup = [table.columns.get(source) for source in self.sources]
+        present = [column for column in lookup if column is not None]
+        if not present:
+            code = self.encode(self.function(*['' for _ in lookup]))
+            self.codes.extend(array('I', [code]) * (len(table) - start))
+            return self
+
+        codes = self.codes
+        combos = self._combos
+        for combo in zip(*[column.codes[start:] for column in present]):
+            code = combos.get(combo)
+            if code is None:
+                values = iter(column.categories[c] for column, c in zip(present, combo))
+                code = combos[combo] = self.encode(self.function(
+                    *[next(values) if column is not None else '' for column in lookup]))
+            codes.append(code)
+        return self
+
+    def extended(self, table):
+        """Copy of this column for ``table``, this column's table with rows appended"""
+        return DerivedColumn(self.name, self.sources, self.function, self.categories, self._index,
+                             array('I', self.codes), self._combos).fill(table)
+
+
+class RowView(Mapping):
+    """Read-only dict-like view of one table row"""
+    __slots__ = ('_table', '_index')
+
+    def __init__(self, table, index):
+        self._table = table
+        self._index = index
+
+    def __getitem__(self, key):
+        column = self._table.columns.get(key)
+        if column is not None:
+            return column[self._index]
+        if key == SHEET_NAME_KEY and self._table.sheet_name is not None:
+            return self._table.sheet_name
+        raise KeyError(key)
+
+    def __iter__(self):
+        table = self._table
+        yield from table.column_names
+        if table.sheet_name is not None and SHEET_NAME_KEY not in table.columns:
+            yield SHEET_NAME_KEY
+
+    def __len__(self):
+        table = self._table
+        extra = table.sheet_name is not None and SHEET_NAME_KEY not in table.columns
+        return len(table.column_names) + (1 if extra else 0)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class SheetTable:
+    """Column-oriented sheet data with list-of-dicts compatible row access"""
+    def __init__(self, headers, sheet_name=None):
+        self.sheet_name = sheet_name
+        # Header row exactly as exported (may contain duplicates or blanks)
+        self.headers = [sys.intern(header) for header in headers]
+        # Duplicate headers behave like the old dicts did: first position
+        # decides the order, the last occurrence provides the value
+        self.column_names = []
+        self.columns = {}
+        self._positions = []
+        last_position = {}
+        for i, header in enumerate(headers):
+            last_position[header] = i
+        for header in headers:
+            if header not in self.columns:
+                header = sys.intern(header)
+                self.column_names.append(header)
+                self.columns[header] = Column(header)
+                self._positions.append(last_position[header])
+        self._length = 0
+        # Columns computed from the sheet's own columns at ingest (e.g. canonical
+        # grade/gender); readable by name like any column but not part of rows
+        self.derived_columns = {}
+        # Aggregates computed from this exact data (see derive)
+        self._derived = {}
+        # Table this one relabels (see with_name), None for a table of its own
+        self._relabelled_from = None
+
+    # Derived value kind -> extend(table, key, previous, start) returning the
+    # value for ``table`` from the one computed before rows ``start:`` were
+    # appended (or None to recompute on demand); see extend_rows
+    extenders = {}
+
+    # Derived value kinds that never look at the sheet name, so relabelled
+    # views share them with the table they relabel (see with_name)
+    label_independent = set()
+
+    @classmethod
+    def register_extender(cls, kind, extend):
+        """Let derived values of ``kind`` (a key or a tuple key's first item) survive extend_rows"""
+        cls.extenders[kind] = extend
+
+    @classmethod
+    def register_label_independent(cls, kind):
+        """Share derived values of ``kind`` between a table and its relabelled views"""
+        cls.label_independent.add(kind)
+
+    @classmethod
+    def from_rows(cls, rows, sheet_name=None):
+        """Build a table from dict-like rows (keys may differ between rows)"""
+        rows = list(rows)
+        headers = {}
+        for row in rows:
+            for key in row.keys():
+                headers.setdefault(key, None)
+        table = cls(list(headers), sheet_name)
+        for row in rows:
+            table.append_row([row.get(header, '') for header in table.column_names])
+        return table
+
+    @classmethod
+    def concat(cls, tables):
+        """Merge several tables; rows keep their own ``_sheet_name``
+
+        The last merge is remembered on the first table, so asking for the
+        same tables again returns the same object (and its aggregates).
+        """
+        tables = list(tables)
+        if len(tables) == 1:
+            return tables[0]
+        if not tables:
+            return cls.from_rows([])
+        cached = tables[0]._derived.get('concat')
+        if cached is not None and len(cached[0]) == len(tables) and \
+                all(a is b for a, b in zip(cached[0], tables)):
+            return cached[1]
+        merged = cls.from_rows(row for table in tables for row in table)
+        tables[0]._derived['concat'] = (tables, merged)
+        return merged
+
+    def append_row(self, values):
+        """Append one raw row (a list of cells in header order)"""
+        width = len(values)
+        for column, position in zip(self.columns.values(), self._positions):
+            column.append(values[position] if position < width else '')
+        self._length += 1
+        if self._derived:
+            self._derived.clear()
+
+    def column(self, name):
+        """Return the Column for ``name`` (None if the sheet has no such header)"""
+        column = self.columns.get(name)
+        if column is None:
+            column = self.derived_columns.get(name)
+        return column
+
+    def add_derived_columns(self, columns):
+        """Attach computed Columns (one code per row) readable by name"""
+        for name, column in columns.items():
+            if len(column) != self._length:
+                raise ValueError(f"derived column {name!r} has {len(column)} rows, table has {self._length}")
+        # Update in place: relabelled views of this table share the same data
+        self.derived_columns.update(columns)
+
+    def derive(self, key, build):
+        """Return ``build(self)``, computed once per table
+
+        Tables are not modified once they are published (new data always
+        arrives as a new table), so anything computed from one can be kept
+        for its lifetime and shared by every endpoint that reads it. Callers
+        must not modify the returned value.
+        """
+        source = self._relabelled_from
+        if source is not None and _kind(key) in self.label_independent:
+            return source.derive(key, build)
+        try:
+            return self._derived[key]
+        except KeyError:
+            value = self._derived[key] = build(self)
+            return value
+
+    def value_counts(self, name):
+        """Count rows per distinct value of one column (memoized, do not modify)"""
+        return self.derive(('value_counts', name), lambda table: table._value_counts(name))
+
+    def top_values(self, name, n):
+        """(value, count) for the ``n`` most common non-blank values of one column"""
+        counts = self.value_counts(name)
+        return heapq.nlargest(n, ((value, count) for value, count in counts.items() if value.strip()),
+                              key=itemgetter(1))
+
+    def distinct_count(self, name):
+        """Number of distinct non-blank values of one column"""
+        return sum(1 for value in self.value_counts(name) if value.strip())
+
+    def joint_counts(self, names):
+        """Count rows per distinct combination of values across ``names``
+
+        Missing columns contribute ''. Only the distinct combinations are
+        returned, so callers can normalise each combination once instead of
+        once per row. The result is memoized; do not modify it.
+        """
+        names = tuple(names)
+        return self.derive(('joint_counts', names), lambda table: table._joint_counts(names))
+
+    def rows_by_code(self, name):
+        """{code: array of row indices} for one column (memoized, do not modify)"""
+        def build(table):
+            rows_by_code = {}
+            column = table.column(name)
+            if column is not None:
+                for row, code in enumerate(column.codes):
+                    rows = rows_by_code.get(code)
+                    if rows is None:
+                        rows = rows_by_code[code] = array('I')
+                    rows.append(row)
+            return rows_by_code
+        return self.derive(('rows_by_code', name), build)
+
+    def _value_counts(self, name, start=0):
+        column = self.column(name)
+        if column is None:
+            return {}
+        if not start:
+            return column.value_counts()
+        categories = column.categories
+        return {categories[code]: count for code, count in Counter(column.codes[start:]).items()}
+
+    def _joint_counts(self, names, start=0):
+        lookup = [self.column(name) for name in names]
+        present = [column for column in lookup if column is not None]
+        if not present:
+            return {}
+        if start:
+            combos = Counter(zip(*[column.codes[start:] for column in present]))
+        else:
+            combos = Counter(zip(*[column.codes for column in present]))
+        result = {}
+        for codes, count in combos.items():
+            values = iter(column.categories[code] for column, code in zip(present, codes))
+            key = tuple(next(values) if column is not None else '' for column in lookup)
+            result[key] = result.get(key, 0) + count
+        return result
+
+    def where(self, names, predicate):
+        """Return indices of rows whose values for ``names`` satisfy ``predicate``
+
+        ``predicate`` receives a tuple of values (missing columns give '') and
+        is evaluated once per distinct combination, not once per row.
+        """
+        lookup = [self.column(name) for name in names]
+        present = [column for column in lookup if column is not None]
+        if not present:
+            return list(range(self._length)) if predicate(tuple('' for _ in names)) else []
+        decisions = {}
+        indices = []
+        for i, codes in enumerate(zip(*[column.codes for column in present])):
+            keep = decisions.get(codes)
+            if keep is None:
+                values = iter(column.categories[code] for column, code in zip(present, codes))
+                keep = decisions[codes] = bool(predicate(tuple(
+                    next(values) if column is not None else '' for column in lookup)))
+            if keep:
+                indices.append(i)
+        return indices
+
+    def take(self, indices):
+        """Return a new table with only the given rows (columns share categories)"""
+        indices = list(indices)
+        table = SheetTable.__new__(SheetTable)
+        table.sheet_name = self.sheet_name
+        table.headers = self.headers
+        table.column_names = self.column_names
+        table.columns = {name: column.take(indices) for name, column in self.columns.items()}
+        table.derived_columns = {name: column.take(indices) for name, column in self.derived_columns.items()}
+        table._positions = self._positions
+        table._length = len(indices)
+        table._derived = {}
+        table._relabelled_from = None
+        return table
+
+    def extend_rows(self, rows):
+        """Return a new table with ``rows`` (raw cell lists) appended
+
+        The existing table is left untouched so readers holding it are not
+        affected; categories are shared and only grow, codes are copied.
+        Derived columns and registered aggregates are updated from the new
+        rows alone, so a sync that appends a few responses costs O(new rows)
+        plus the code copy instead of a full recount.
+        """
+        table = SheetTable.__new__(SheetTable)
+        table.__dict__.update(self.__dict__)
+        table.columns = {
+            name: Column(name, column.categories, column._index, array('I', column.codes))
+            for name, column in self.columns.items()
+        }
+        table.derived_columns = {}
+        table._derived = {}
+        table._relabelled_from = None
+        start = self._length
+        for row in rows:
+            table.append_row(row)
+
+        # Bring derived columns and aggregates forward by looking at the new
+        # rows only; anything without an extender is recomputed on demand
+        table.derived_columns = {
+            name: column.extended(table)
+            for name, column in self.derived_columns.items() if isinstance(column, DerivedColumn)
+        }
+        derived = dict(self._derived)
+        source = self._relabelled_from
+        if source is not None:
+            # A relabelled view keeps its label-independent values on the table it relabels
+            derived.update((key, value) for key, value in source._derived.items()
+                           if _kind(key) in self.label_independent)
+        for key, value in derived.items():
+            extend = self.extenders.get(_kind(key))
+            if extend is not None:
+                value = extend(table, key, value, start)
+                if value is not None:
+                    table._derived[key] = value
+        return table
+
+    def raw_row(self, i):
+        """Return row ``i`` as a list of cells in export order (None if headers repeat)"""
+        if len(self.column_names) != len(self.headers):
+            return None
+        return [self.columns[header][i] for header in self.headers]
+
+    def with_name(self, sheet_name):
+        """Return the same data labelled with another sheet name
+
+        Label-independent aggregates (see register_label_independent) are
+        shared with this table; anything else is computed per label.
+        """
+        if sheet_name == self.sheet_name:
+            return self
+        source = self._relabelled_from or self
+        if sheet_name == source.sheet_name:
+            return source
+        return source.derive(('with_name', sheet_name), lambda table: table._relabel(sheet_name))
+
+    def _relabel(self, sheet_name):
+        table = SheetTable.__new__(SheetTable)
+        table.__dict__.update(self.__dict__)
+        table.sheet_name = sheet_name
+        table._derived = {}
+        table._relabelled_from = self
+        return table
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        return (RowView(self, i) for i in range(self._length))
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [RowView(self, j) for j in range(*i.indices(self._length))]
+        if i < 0:
+            i += self._length
+        if not 0 <= i < self._length:
+            raise IndexError('row index out of range')
+        return RowView(self, i)
+
+    def __repr__(self):
+        return f"<SheetTable {self.sheet_name!r}: {self._length} rows x {len(self.column_names)} columns>"
+
+
+def _kind(key):
+    """Kind of a derive key: the key itself or a tuple key's first item"""
+    return key[0] if isinstance(key, tuple) else key
+
+
+def add_counts(previous, delta):
+    """Counts dict ``previous`` plus ``delta`` (neither is modified)"""
+    counts = dict(previous)
+    for key, count in delta.items():
+        counts[key] = counts.get(key, 0) + count
+    return counts
+
+
+SheetTable.register_extender('value_counts', lambda table, key, previous, start: add_counts(
+    previous, table._value_counts(key[1], start)))
+SheetTable.register_extender('joint_counts', lambda table, key, previous, start: add_counts(
+    previous, table._joint_counts(key[1], start)))
+SheetTable.register_label_independent('value_counts')
+SheetTable.register_label_independent('joint_counts')
+SheetTable.register_label_independent('rows_by_code')
+
+
+def as_sheet_table(data, sheet_name=None):
+    """Return ``data`` as a SheetTable, converting a list of row dicts if needed"""
+    if isinstance(data, SheetTable):
+        return data
+    return SheetTable.from_rows(data or [], sheet_name)
@@ -0,0 +1,135 @@
+"""
+On-disk snapshot store so a restarted worker can serve the last known data
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+
+class SnapshotStore:
+    """Raw upstream payloads plus fetch metadata in a small SQLite file
+
+    Payloads are stored zlib-compressed exactly as they were downloaded (CSV
+    export bytes, Docs text), so the parsing code stays the single source of
+    truth and a deploy never has to read objects pickled by older code. WAL
+    mode lets several gunicorn workers share one file.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=10)
+        if not self._initialized:
+            with self._lock:
+                if not self._initialized:
+                    connection.execute('PRAGMA journal_mode=WAL')
+                    connection.execute('''
+                        CREATE TABLE IF NOT EXISTS snapshots (
+                            namespace TEXT NOT NULL,
+                            key TEXT NOT NULL,
+                            digest TEXT,
+                            fetched_at REAL NOT NULL,
+                            meta TEXT,
+                            payload BLOB NOT NULL,
+                            PRIMARY KEY (namespace, key)
+                        )
+                    ''')
+                    connection.commit()
+                    self._initialized = True
+        return connection
+
+    def load(self, namespace, key):
+        """Return (payload, digest, fetched_at, meta) or None"""
+        try:
+            connection = self._connect()
+            try:
+                row = connection.execute(
+                    'SELECT payload, digest, fetched_at, meta FROM snapshots WHERE namespace = ? AND key = ?',
+                    (namespace, key)
+                ).fetchone()
+            finally:
+                connection.close()
+        except Exception as e:
+            print(f"[STORE] Could not read {namespace}:{key}: {str(e)}")
+            return None
+
+        if row is None:
+            return None
+        payload, digest, fetched_at, meta = row
+        return zlib.decompress(payload), digest, fetched_at, json.loads(meta) if meta else {}
+
+    def load_meta(self, namespace, key):
+        """Return (digest, fetched_at, meta) without reading the payload, or None"""
+        try:
+            connection = self._connect()
+            try:
+                row = connection.execute(
+                    'SELECT digest, fetched_at, meta FROM snapshots WHERE namespace = ? AND key = ?',
+                    (namespace, key)
+                ).fetchone()
+            finally:
+                connection.close()
+        except Exception as e:
+            print(f"[STORE] Could not read {namespace}:{key}: {str(e)}")
+            return None
+
+        if row is None:
+            return None
+        digest, fetched_at, meta = row
+        return digest, fetched_at, json.loads(meta) if meta else {}
+
+    def save(self, namespace, key, payload, digest, fetched_at=None, meta=None):
+        """Insert or replace one snapshot (``payload`` is bytes or a binary file)"""
+        try:
+            if isinstance(payload, (bytes, bytearray)):
+                compressed = zlib.compress(payload, 6)
+            else:
+                # Compress a file chunk by chunk instead of reading it whole
+                compressor = zlib.compressobj(6)
+                parts = [compressor.compress(chunk) for chunk in iter(lambda: payload.read(1 << 16), b'')]
+                parts.append(compressor.flush())
+                compressed = b''.join(parts)
+            connection = self._connect()
+            try:
+                connection.execute(
+                    'INSERT OR REPLACE INTO snapshots (namespace, key, digest, fetched_at, meta, payload) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (namespace, key, digest, fetched_at or time.time(),
+                     json.dumps(meta or {}, ensure_ascii=False), compressed)
+                )
+                connection.commit()
+            finally:
+                connection.close()
+            return True
+        except Exception as e:
+            print(f"[STORE] Could not save {namespace}:{key}: {str(e)}")
+            return False
+
+    def touch(self, namespace, key, fetched_at=None):
+        """Record that the stored payload was just revalidated unchanged"""
+        try:
+            connection = self._connect()
+            try:
+                connection.execute(
+                    'UPDATE snapshots SET fetched_at = ? WHERE namespace = ? AND key = ?',
+                    (fetched_at or time.time(), namespace, key)
+                )
+                connection.commit()
+            finally:
+                connection.close()
+        except Exception as e:
+            print(f"[STORE] Could not update {namespace}:{key}: {str(e)}")
+
+
+def open_snapshot_store(path):
+    """Return a SnapshotStore for ``path`` (None when persistence is disabled)"""
+    if not path:
+        return None
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    return SnapshotStore(path)
@@ -0,0 +1,154 @@
+"""
+Survey period detection from the form's submission timestamps
+"""
+from datetime import datetime
+
+from sheet_table import SHEET_NAME_KEY, SheetTable
+
+TIMESTAMP_COLUMNS = ['Submitted At', 'Submitted at']
+TIMESTAMP_FORMATS = ['%Y-%m-%d %H:%M:%S', '%m/%d/%Y %H:%M:%S', '%Y/%m/%d %H:%M:%S', '%d/%m/%Y %H:%M:%S']
+
+
+def parse_submitted_at(value):
+    """Parse one 'Submitted At' cell (None if it is not a known format)
+
+    Handles the Korean export ("2025. 1. 19 오후 3:00:00", with or without a
+    trailing period after the day), the short "2025. 01" form and the usual
+    numeric formats.
+    """
+    value = value.strip()
+    if not value:
+        return None
+
+    if '오전' in value or '오후' in value:
+        date_part = value.split(' 오')[0].strip()
+        for fmt in ('%Y. %m. %d', '%Y. %m. %d.'):
+            try:
+                return datetime.strptime(date_part, fmt)
+            except ValueError:
+                pass
+
+    if '. ' in value and len(value) <= 10:
+        parts = value.split('. ')
+        if len(parts) == 2:
+            try:
+                return datetime(int(parts[0]), int(parts[1]), 1)
+            except ValueError:
+                pass
+
+    for fmt in TIMESTAMP_FORMATS:
+        try:
+            return datetime.strptime(value.split('.')[0], fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def month_label(date):
+    return f"{date.year}년 {date.month}월"
+
+
+class SurveyPeriod:
+    """When a sheet's responses were submitted
+
+    ``first`` is the first response's date (what answers have always been
+    labelled with); ``start``/``end`` span every parseable response.
+    """
+    def __init__(self, first, start, end):
+        self.first = first
+        self.start = start
+        self.end = end
+
+    @property
+    def label(self):
+        """Month of the first response, e.g. '2025년 1월'"""
+        return month_label(self.first or self.start)
+
+    @property
+    def range_label(self):
+        """'2025년 1월' or '2025년 1월 ~ 2025년 3월'"""
+        start, end = month_label(self.start), month_label(self.end)
+        return start if start == end else f"{start} ~ {end}"
+
+    def to_dict(self):
+        return {
+            'label': self.label,
+            'start': self.start.date().isoformat(),
+            'end': self.end.date().isoformat(),
+        }
+
+
+def _timestamp_column(table):
+    for name in TIMESTAMP_COLUMNS:
+        if name in table.columns:
+            return name
+    return None
+
+
+def _period_of(values, first_value):
+    """SurveyPeriod from distinct timestamp strings (None if none parse)"""
+    dates = [date for date in map(parse_submitted_at, values) if date is not None]
+    if not dates:
+        return None
+    first = parse_submitted_at(first_value) if first_value else None
+    return SurveyPeriod(first, min(dates), max(dates))
+
+
+def survey_period(table):
+    """Return the table's SurveyPeriod (None without timestamps), computed once per table
+
+    Only the distinct timestamp strings are parsed, so a form with thousands of
+    responses costs one parse per distinct submission time. Values are taken
+    from the table's own codes: categories are shared with the tables it was
+    taken from or extended from, and may hold timestamps of rows not in it.
+    """
+    def build(table):
+        name = _timestamp_column(table)
+        if name is None or len(table) == 0:
+            return None
+        column = table.columns[name]
+        return _period_of([column.categories[code] for code in set(column.codes)], column[0])
+    return table.derive('survey_period', build)
+
+
+def _extend_survey_period(table, key, period, start):
+    """Widen a table's period with the timestamps of rows ``start:``"""
+    name = _timestamp_column(table)
+    if name is None:
+        return None
+    column = table.columns[name]
+    added = _period_of([column.categories[code] for code in set(column.codes[start:])], column[0])
+    if period is None or added is None:
+        return period or added
+    return SurveyPeriod(period.first, min(period.start, added.start), max(period.end, added.end))
+
+
+SheetTable.register_extender('survey_period', _extend_survey_period)
+SheetTable.register_label_independent('survey_period')
+
+
+def survey_periods_by_sheet(table):
+    """{sheet name: SurveyPeriod} for a single sheet or a merge of several sheets"""
+    def build(table):
+        if SHEET_NAME_KEY not in table.columns:
+            period = survey_period(table)
+            return {table.sheet_name: period} if period and table.sheet_name else {}
+        name = _timestamp_column(table)
+        if name is None:
+            return {}
+        sheets = table.columns[SHEET_NAME_KEY]
+        timestamps = table.columns[name]
+        # First row and the distinct timestamps of every sheet, one pass over the codes
+        first_row = {}
+        values = {}
+        for row, (sheet_code, timestamp_code) in enumerate(zip(sheets.codes, timestamps.codes)):
+            if sheet_code not in first_row:
+                first_row[sheet_code] = row
+            values.setdefault(sheet_code, set()).add(timestamp_code)
+        periods = {}
+        for sheet_code, row in first_row.items():
+            period = _period_of([timestamps.categories[code] for code in values[sheet_code]], timestamps[row])
+            if period:
+                periods[sheets.categories[sheet_code]] = period
+        return periods
+    return table.derive('survey_periods_by_sheet', build)
@@ -0,0 +1,48 @@
+"""
+Shared fixtures: synthetic survey exports parsed the way /api/chat parses them
+
+Tests run offline - the snapshot store, background prefetch and incremental
+sync are switched off before app is imported.
+"""
+import csv
+import io
+import os
+import random
+import sys
+
+os.environ['SNAPSHOT_STORE_PATH'] = ''
+os.environ['PREFETCH_ENABLED'] = 'false'
+os.environ['SHEET_INCREMENTAL_SYNC'] = 'false'
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import benchmark
+
+
+def survey_rows(count, seed=0, first_index=0):
+    """``count`` synthetic response rows (raw cell lists in HEADERS order)"""
+    rng = random.Random(seed)
+    return [benchmark.synthetic_row(rng, index) for index in range(first_index, first_index + count)]
+
+
+def survey_csv(rows, headers=benchmark.HEADERS):
+    """CSV export bytes for ``rows``"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(headers)
+    writer.writerows(rows)
+    return buffer.getvalue().encode('utf-8')
+
+
+@pytest.fixture
+def make_survey():
+    """parse(rows=None, count=200, name='Sheet1') -> normalized SheetTable"""
+    from app import parse_sheet_csv
+
+    def make(rows=None, count=200, name='Sheet1', headers=benchmark.HEADERS):
+        if rows is None:
+            rows = survey_rows(count)
+        return parse_sheet_csv(survey_csv(rows, headers), '0', name)
+    return make
@@ -0,0 +1,79 @@
+import app
+import keyword_index
+from app import build_chat_messages, build_chat_system, build_follow_up_filter, build_prompt_sections
+from normalization import GRADE_BAND
+
+QUESTION = '그 중에서 중학생은 몇 명이야?'
+HISTORY = [
+    {'role': 'user', 'content': '학교급별 응답자 수는?'},
+    {'role': 'assistant', 'content': '고등학생은 120명(40%)입니다.'},
+]
+
+
+def middle_school(table):
+    return build_follow_up_filter(QUESTION, HISTORY, table).rows(table)
+
+
+def test_data_card_is_the_same_for_filtered_follow_ups(make_survey):
+    table = make_survey(count=300)
+    subset = middle_school(table)
+
+    card, request, usage = build_prompt_sections(QUESTION, table, selection=subset)
+    unfiltered_card, unfiltered_request, _ = build_prompt_sections('학년별 응답자 수는?', table)
+
+    assert card == unfiltered_card
+    assert f'전체 {len(table)}명 중 조건에 맞는 응답자: {len(subset)}명' in request
+    assert '조건에 맞는 응답자' not in unfiltered_request
+    assert usage['total_rows'] == len(subset)
+
+
+def test_filtered_summary_counts_only_the_subset(make_survey):
+    table = make_survey(count=300)
+    subset = middle_school(table)
+
+    _, request, _ = build_prompt_sections(QUESTION, table, selection=subset)
+
+    assert {table.column(GRADE_BAND)[row] for row in subset} == {'중학생'}
+    assert f'  - 중학생: {len(subset)}명 (100.0%)' in request
+    assert f'총 {len(subset)}개 중' in request
+
+
+def test_follow_ups_reuse_the_sheet_indexes(make_survey, monkeypatch):
+    table = make_survey(count=300)
+    build_prompt_sections('태블릿 불편한 점은?', table)
+    built = []
+
+    class CountingIndex(keyword_index.KeywordIndex):
+        def __init__(self, table):
+            built.append(table)
+            super().__init__(table)
+
+    monkeypatch.setattr(keyword_index, 'KeywordIndex', CountingIndex)
+    subset = middle_school(table)
+    _, request, _ = build_prompt_sections('그 중에서 중학생은 태블릿 불편한 점이 뭐야?', table, selection=subset)
+
+    assert built == []
+    assert f'총 {len(subset)}개 중' in request
+
+
+def test_system_blocks_and_last_history_turn_are_cache_breakpoints(monkeypatch):
+    monkeypatch.setattr(app, 'PROMPT_CACHING', True)
+    history = [{'role': 'user', 'content': '질문'}, {'role': 'assistant', 'content': '답변'}]
+
+    system = build_chat_system('card', search_results=[{'title': 't'}])
+    messages = build_chat_messages(history, 'request')
+
+    assert [block.get('cache_control') for block in system] == [{'type': 'ephemeral'}] * 2 + [None]
+    assert system[1]['text'] == 'card'
+    assert messages[1]['content'] == [{'type': 'text', 'text': '답변', 'cache_control': {'type': 'ephemeral'}}]
+    assert messages[-1] == {'role': 'user', 'content': 'request'}
+
+
+def test_caching_off_sends_plain_blocks(monkeypatch):
+    monkeypatch.setattr(app, 'PROMPT_CACHING', False)
+
+    system = build_chat_system('card')
+    messages = build_chat_messages([{'role': 'assistant', 'content': '답변'}], 'request')
+
+    assert all('cache_control' not in block for block in system)
+    assert messages[0]['content'] == '답변'
@@ -0,0 +1,134 @@
+import io
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import app
+from conftest import survey_csv, survey_rows
+
+QUESTION = '중학생은 몇 명이야?'
+# survey_rows(300) are all submitted in February 2025
+PREFIX = '2025년 2월 진행된 조사 결과에 따르면, '
+
+
+class FakeStream:
+    def __init__(self, chunks, fail=None):
+        self.chunks = chunks
+        self.fail = fail
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    @property
+    def text_stream(self):
+        for chunk in self.chunks:
+            yield chunk
+        if self.fail:
+            raise self.fail
+
+    def get_final_message(self):
+        usage = SimpleNamespace(input_tokens=50, output_tokens=9,
+                                cache_read_input_tokens=1200, cache_creation_input_tokens=0)
+        return SimpleNamespace(usage=usage)
+
+
+class FakeClient:
+    def __init__(self):
+        self.chunks = []
+        self.fail = None
+        self.calls = []
+        self.messages = SimpleNamespace(stream=self.stream)
+
+    def stream(self, **request):
+        self.calls.append(request)
+        return FakeStream(self.chunks, self.fail)
+
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    content = survey_csv(survey_rows(300))
+    monkeypatch.setattr(app, 'fetch_sheet_export', lambda *args, **kwargs: (io.BytesIO(content), 'digest'))
+    fake = FakeClient()
+    monkeypatch.setattr(app, 'client', fake)
+    app.sheet_cache.invalidate()
+    yield fake
+    app.sheet_cache.invalidate()
+
+
+def stream_chat(chunks, fake, **data):
+    fake.chunks = chunks
+    response = app.app.test_client().post('/api/chat/stream', json=dict(question=QUESTION, sheet_gid='0', **data))
+    events = []
+    for event in response.get_data(as_text=True).strip().split('\n\n'):
+        name, payload = event.split('\n')
+        events.append((name[len('event: '):], json.loads(payload[len('data: '):])))
+    return response, events
+
+
+def deltas(events):
+    return [data['text'] for name, data in events if name == 'delta']
+
+
+def test_partial_prefix_split_across_chunks_is_rewritten(fake_client):
+    response, events = stream_chat(['조사', ' 결과에', ' 따르면, 중학생은', ' 120명입니다.'], fake_client)
+
+    assert response.mimetype == 'text/event-stream'
+    assert 'no-cache' in response.headers['Cache-Control']
+    name, done = events[-1]
+    assert name == 'done'
+    assert done['answer'] == PREFIX + '중학생은 120명입니다.'
+    # The held-back head goes out as one rewritten delta, later chunks as they come
+    assert deltas(events) == [PREFIX + '중학생은', ' 120명입니다.']
+    assert done['prompt_usage']['cache_read_input_tokens'] == 1200
+
+
+def test_answer_without_a_prefix_gets_one(fake_client):
+    _, events = stream_chat(['중학생은 ', '120명'], fake_client)
+
+    assert events[-1][1]['answer'] == PREFIX + '중학생은 120명'
+    assert ''.join(deltas(events)) == PREFIX + '중학생은 120명'
+
+
+def test_answer_with_a_required_prefix_is_unchanged(fake_client):
+    chunks = ['최근 수집된 조사 자료에 의하면, 1', '20명']
+
+    _, events = stream_chat(chunks, fake_client)
+
+    assert deltas(events) == chunks
+    assert events[-1][1]['answer'] == ''.join(chunks)
+
+
+def test_answer_shorter_than_any_prefix_is_flushed_at_the_end(fake_client):
+    _, events = stream_chat(['네'], fake_client)
+
+    assert deltas(events) == [PREFIX + '네']
+    assert events[-1][1]['answer'] == PREFIX + '네'
+
+
+def test_empty_stream_still_sends_the_prefix(fake_client):
+    _, events = stream_chat([], fake_client)
+
+    assert [name for name, _ in events] == ['delta', 'done']
+    assert deltas(events) == [PREFIX]
+    assert events[-1][1]['answer'] == PREFIX
+
+
+def test_failure_while_streaming_ends_with_an_error_event(fake_client):
+    fake_client.fail = RuntimeError('overloaded')
+
+    _, events = stream_chat(['중학생은 ', '120명입니다.'], fake_client)
+
+    assert events[-1] == ('error', {'error': '처리 중 오류가 발생했습니다: overloaded'})
+    assert 'done' not in [name for name, _ in events]
+
+
+def test_errors_before_the_stream_are_json(fake_client):
+    response = app.app.test_client().post('/api/chat/stream', json={'question': ''})
+
+    assert response.status_code == 400
+    assert response.get_json() == {'error': '질문을 입력해주세요.'}
+    assert fake_client.calls == []
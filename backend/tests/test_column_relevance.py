@@ -0,0 +1,31 @@
+from column_relevance import column_index
+
+TUTORING = '과외를 하고 있나요?'
+TABLET = '태블릿으로 공부할 때 불편한 점을 적어주세요'
+SUBJECT = '다음 중 가장 *재미있는* 과목을 선택해주세요'
+
+
+def test_header_matches_pick_the_question_column(make_survey):
+    table = make_survey(count=200)
+
+    assert column_index(table).top('과외 하는 학생 비율은?', 1) == [TUTORING]
+    assert TABLET in column_index(table).top('태블릿 쓸 때 불편한 점', 2)
+
+
+def test_answer_vocabulary_counts_for_columns(make_survey):
+    table = make_survey(count=200)
+
+    scores = column_index(table).scores('아이패드 필기')
+
+    assert scores
+    assert all(name not in scores for name in (TUTORING, SUBJECT))
+
+
+def test_top_keeps_sheet_order_and_limit(make_survey):
+    table = make_survey(count=200)
+
+    top = column_index(table).top('재미있는 과목과 과외와 태블릿', 3)
+
+    assert top == [name for name in table.column_names if name in top]
+    assert len(top) <= 3
+    assert column_index(table).top('', 3) == []
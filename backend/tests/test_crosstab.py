@@ -0,0 +1,36 @@
+from collections import Counter
+
+from crosstab import crosstab
+from normalization import GRADE
+
+
+SUBJECT = '다음 중 가장 *재미있는* 과목을 선택해주세요'
+
+
+def test_crosstab_matches_row_by_row_count(make_survey):
+    table = make_survey(count=300)
+
+    table_counts = crosstab(table, GRADE, SUBJECT)
+
+    expected = Counter((row_grade, row[SUBJECT].strip())
+                       for row, row_grade in zip(table, table.column(GRADE))
+                       if row_grade and row[SUBJECT].strip())
+    assert {(group, answer): count
+            for group, answers in table_counts.counts.items()
+            for answer, count in answers.items()} == dict(expected)
+    assert table_counts.total == sum(expected.values())
+
+
+def test_top_answers_are_sorted_with_group_percentages(make_survey):
+    table_counts = crosstab(make_survey(count=300), GRADE, SUBJECT)
+    group = table_counts.groups()[0]
+
+    answers = table_counts.top_answers(group, limit=3)
+
+    assert len(answers) == 3
+    assert [count for _, count, _ in answers] == sorted((count for _, count, _ in answers), reverse=True)
+    assert answers[0][2] == answers[0][1] / table_counts.group_totals[group] * 100
+
+
+def test_blank_groups_are_left_out(make_survey):
+    assert '' not in crosstab(make_survey(count=300), GRADE, SUBJECT).counts
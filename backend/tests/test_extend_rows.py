@@ -0,0 +1,71 @@
+import pytest
+
+from app import create_prompt, prepare_sheet_table, process_sheet_data
+from conftest import survey_rows
+from keyword_index import keyword_index
+from normalization import GENDER, GRADE, GRADE_BAND, LLM_USAGE, REGION
+from row_filter import column_bitsets
+from survey_dates import survey_period
+
+QUESTIONS = ['GPT를 어떻게 사용하고 있어?', '학년별로 가장 재미있는 과목은?', '태블릿으로 공부할 때 불편한 점은?']
+CANONICAL = [GRADE, GRADE_BAND, GENDER, REGION, LLM_USAGE]
+TUTORING = '과외를 하고 있나요?'
+
+
+@pytest.fixture(scope='module')
+def rows():
+    rows = survey_rows(900)
+    # Appended rows bring values (and a month) the first batch never had
+    for index, row in enumerate(rows[600:650]):
+        row[0] = '2025. 5. 2 오후 3:00:00'
+        row[3] = '고4'
+        row[4] = '제주 '
+        row[10] = f'새로운 태블릿 불만 {index}'
+    return rows
+
+
+def warm(table):
+    for question in QUESTIONS:
+        create_prompt(question, table)
+        process_sheet_data('Sheet1', table, question)
+    for name in CANONICAL + [TUTORING]:
+        column_bitsets(table, name)
+        table.value_counts(name)
+    survey_period(table)
+    keyword_index(table).mentions(['태블릿'])
+
+
+def test_extend_rows_equals_full_rebuild(make_survey, rows):
+    base = make_survey(rows[:600])
+    warm(base)
+
+    extended = base
+    for chunk in (rows[600:650], rows[650:800], rows[800:]):
+        extended = prepare_sheet_table(extended.extend_rows(chunk))
+    full = make_survey(rows)
+
+    assert len(extended) == len(full) == 900
+    for name in CANONICAL:
+        assert list(extended.column(name)) == list(full.column(name)), name
+        assert extended.value_counts(name) == full.value_counts(name), name
+    for name in CANONICAL + [TUTORING]:
+        expected = {value: bits for value, bits in column_bitsets(full, name).items() if bits}
+        assert {value: bits for value, bits in column_bitsets(extended, name).items() if bits} == expected
+    assert survey_period(extended).to_dict() == survey_period(full).to_dict()
+    assert extended.top_values(REGION, 20) == full.top_values(REGION, 20)
+    for keyword in ['태블릿', '불만', 'gpt', '새로운 태블릿']:
+        assert keyword_index(extended).mentions([keyword]) == keyword_index(full).mentions([keyword])
+    for question in QUESTIONS:
+        assert create_prompt(question, extended) == create_prompt(question, full)
+        assert process_sheet_data('Sheet1', extended, question) == process_sheet_data('Sheet1', full, question)
+
+
+def test_extend_rows_carries_aggregates_instead_of_recounting(make_survey, rows):
+    base = make_survey(rows[:600])
+    warm(base)
+
+    extended = base.extend_rows(rows[600:])
+
+    assert ('value_counts', TUTORING) in extended._derived
+    assert ('bitsets', TUTORING) in extended._derived
+    assert len(base) == 600 and base.value_counts(TUTORING) != extended.value_counts(TUTORING)
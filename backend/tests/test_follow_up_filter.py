@@ -0,0 +1,73 @@
+import pytest
+
+from app import build_follow_up_filter, header_keywords
+from conftest import survey_rows
+from normalization import GENDER, GRADE_BAND, REGION
+
+TUTORING = '과외를 하고 있나요?'
+LLM_DAILY = 'GPT, Gemini와 같은 LLM 인공지능 서비스를 *평소에 활용*하고 계신가요?'
+HIGH_SCHOOL_ANSWER = [
+    {'role': 'user', 'content': '학교급별 응답자 수는?'},
+    {'role': 'assistant', 'content': '고등학생은 120명(40%)입니다.'},
+]
+
+
+@pytest.fixture(scope='module')
+def table():
+    from app import parse_sheet_csv
+    from conftest import survey_csv
+    return parse_sheet_csv(survey_csv(survey_rows(600)), '0', 'Sheet1')
+
+
+def selected(table, question, history=None):
+    row_filter = build_follow_up_filter(question, history or [], table)
+    return None if row_filter is None else row_filter.rows(table)
+
+
+def test_question_grade_replaces_grade_from_previous_answer(table):
+    rows = selected(table, '그 중에서 중학생은 몇 명이야?', HIGH_SCHOOL_ANSWER)
+
+    band = table.column(GRADE_BAND)
+    assert rows
+    assert rows == [i for i in range(len(table)) if band[i] == '중학생']
+
+
+def test_previous_answer_grade_applies_when_question_has_none(table):
+    rows = selected(table, '그 중에서 과외 하는 학생은?', HIGH_SCHOOL_ANSWER)
+
+    band = table.column(GRADE_BAND)
+    assert rows == [i for i, row in enumerate(table)
+                    if band[i] == '고등학생' and row[TUTORING].startswith('네')]
+
+
+def test_choice_questions_are_not_follow_ups(table):
+    assert selected(table, '수학과 영어 중에 뭐가 더 인기야?') is None
+    assert selected(table, '그 중에서 제일 많은 건?') is None  # no history to refer to
+
+
+def test_nested_question_resolves_without_history(table):
+    rows = selected(table, '고등학생 중에서 과외 하는 여학생은 몇 명이야?')
+
+    band, gender = table.column(GRADE_BAND), table.column(GENDER)
+    assert rows == [i for i, row in enumerate(table)
+                    if band[i] == '고등학생' and gender[i] == '여' and row[TUTORING].startswith('네')]
+
+
+def test_words_shared_by_several_headers_select_no_column(table):
+    row_filter = build_follow_up_filter('GPT 같은 서비스를 쓰는 학생 중에서 과외 하는 학생은?', [], table)
+
+    assert repr(row_filter) == f"(ColumnWhere({TUTORING!r}, '네*'))"
+
+
+def test_negation_applies_only_to_the_condition_it_follows(table):
+    rows = selected(table, '서울 사는 학생 중에서 과외를 안 하는 학생 중에 평소에 활용하는 학생은?')
+
+    region = table.column(REGION)
+    assert rows == [i for i, row in enumerate(table)
+                    if region[i] == '서울' and row[TUTORING].startswith('아니')
+                    and row[LLM_DAILY].startswith('네')]
+
+
+def test_header_keywords_drop_particles_and_generic_words():
+    assert header_keywords(TUTORING) == {'과외'}
+    assert header_keywords(LLM_DAILY) == {'GPT', 'Gemini', 'LLM', '인공지능', '서비스', '평소', '활용'}
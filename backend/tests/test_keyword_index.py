@@ -0,0 +1,40 @@
+from keyword_index import keyword_index
+from sheet_table import SHEET_NAME_KEY
+
+
+def scan(table, keyword):
+    rows, columns = set(), {}
+    for i, row in enumerate(table):
+        for name, value in row.items():
+            if name != SHEET_NAME_KEY and keyword in str(value).lower():
+                rows.add(i)
+                columns[name] = columns.get(name, 0) + 1
+    return sorted(rows), columns
+
+
+def test_mentions_match_a_cell_scan(make_survey):
+    table = make_survey(count=300)
+    index = keyword_index(table)
+
+    for keyword in ['태블릿', 'gpt', '아이패드', '화면', '없는말']:
+        assert index.mentions([keyword]) == scan(table, keyword), keyword
+
+
+def test_mentions_of_several_keywords_are_merged(make_survey):
+    table = make_survey(count=300)
+
+    rows, _ = keyword_index(table).mentions(['아이패드', '갤탭'])
+
+    assert rows == sorted(set(scan(table, '아이패드')[0]) | set(scan(table, '갤탭')[0]))
+
+
+def test_matching_cells_lists_codes_per_column(make_survey):
+    table = make_survey(count=100)
+
+    cells = keyword_index(table).matching_cells('과외')
+
+    assert cells == {}  # only the header mentions 과외, never an answer
+    tablet = keyword_index(table).matching_cells('태블릿')
+    assert tablet
+    for name, codes in tablet.items():
+        assert all('태블릿' in table.column(name).categories[code].lower() for code in codes)
@@ -0,0 +1,56 @@
+import io
+
+import pytest
+
+import app
+from conftest import survey_csv, survey_rows
+from normalization import SCHOOL
+
+SCHOOL_HEADER = '현재 다니고 있는 학교 이름을 적어주세요'
+
+
+@pytest.fixture
+def school_rows():
+    """100 schools: 20, 10 and 3 responses for the top three, one each for the other 97"""
+    schools = ['가람고'] * 20 + ['누리중'] * 10 + ['하늘초'] * 3 + [f'학교{i}' for i in range(97)]
+    rows = survey_rows(len(schools))
+    for row, school in zip(rows, schools):
+        row[5] = school
+    return rows
+
+
+def test_top_values_are_exact_past_64_distinct_values(make_survey, school_rows):
+    table = make_survey(school_rows)
+
+    assert table.top_values(SCHOOL, 3) == [('가람고', 20), ('누리중', 10), ('하늘초', 3)]
+    assert table.distinct_count(SCHOOL) == 100
+
+
+def test_blank_answers_are_not_values(make_survey, school_rows):
+    school_rows[0][5] = ' '
+    table = make_survey(school_rows)
+
+    assert table.top_values(SCHOOL, 1) == [('가람고', 19)]
+    assert table.distinct_count(SCHOOL) == 100
+
+
+def test_distinct_count_of_a_subset_counts_only_its_rows(make_survey, school_rows):
+    table = make_survey(school_rows)
+
+    assert table.take(range(30)).distinct_count(SCHOOL) == 2
+
+
+def test_prompt_and_demographics_use_exact_counts(make_survey, school_rows, monkeypatch):
+    table = make_survey(school_rows)
+    content = survey_csv(school_rows)
+    monkeypatch.setattr(app, 'fetch_sheet_export', lambda *args, **kwargs: (io.BytesIO(content), 'digest'))
+    app.sheet_cache.invalidate()
+
+    prompt = app.create_prompt('학교별 응답은?', table)
+    schools = app.app.test_client().get('/api/demographics').get_json()['schools']
+    app.sheet_cache.invalidate()
+
+    assert '  - 가람고: 20명 (15.4%)\n  - 누리중: 10명 (7.7%)\n  - 하늘초: 3명 (2.3%)\n' in prompt
+    assert '  - 기타 95개 학교\n' in prompt
+    assert list(schools['top'].items())[:3] == [('가람고', 15.4), ('누리중', 7.7), ('하늘초', 2.3)]
+    assert schools['distinct_count'] == 100
@@ -0,0 +1,34 @@
+from normalization import (GENDER, GRADE, GRADE_BAND, REGION, grade_band, normalize_table,
+                           strip_option_number)
+from sheet_table import SheetTable
+
+
+def test_strip_option_number():
+    assert strip_option_number(' 01. 중2 ') == '중2'
+    assert strip_option_number(' 고1 ') == '고1'
+
+
+def test_grade_band_falls_back_to_school_level():
+    assert grade_band('중3') == '중학생'
+    assert grade_band('', '고등') == '고등학생'
+    assert grade_band('대학생') == '대학생'
+    assert grade_band('') == ''
+
+
+def test_alias_headers_map_onto_canonical_columns():
+    table = SheetTable(['성별', '학년', '거주지역'])
+    table.append_row(['02. 여', '01. 중2', '서울'])
+    table.append_row(['남', ' 고1 ', ''])
+    normalize_table(table)
+
+    assert table.value_counts(GENDER) == {'여': 1, '남': 1}
+    assert table.value_counts(GRADE) == {'중2': 1, '고1': 1}
+    assert table.value_counts(GRADE_BAND) == {'중학생': 1, '고등학생': 1}
+    assert table.value_counts(REGION) == {'서울': 1, '': 1}
+
+
+def test_canonical_columns_are_not_part_of_rows():
+    table = normalize_table(SheetTable.from_rows([{'성별': '남'}]))
+
+    assert GENDER not in dict(table[0])
+    assert table.column(GENDER)[0] == '남'
@@ -0,0 +1,41 @@
+from app import build_prompt
+from prompt_budget import PromptBudget, estimate_tokens, truncate_to_tokens
+
+
+def test_estimate_counts_hangul_per_character_and_ascii_per_four():
+    assert estimate_tokens('') == 0
+    assert estimate_tokens('abcd') == 1
+    assert estimate_tokens('abcde') == 2
+    assert estimate_tokens('학생 abcd') == 2 + 2
+
+
+def test_truncate_fits_the_marker_in_the_limit():
+    text = '가' * 100
+
+    cut = truncate_to_tokens(text, 10, '...')
+
+    assert cut.endswith('...')
+    assert estimate_tokens(cut) <= 10
+    assert truncate_to_tokens('short', 10) == 'short'
+
+
+def test_budget_charges_required_and_optional_sections():
+    budget = PromptBudget(10)
+    budget.charge('required', '가' * 8)
+
+    assert budget.try_charge('optional', '가') is True
+    assert budget.try_charge('optional', '가가') is False
+    assert budget.remaining == 1
+    assert budget.usage() == {'estimated_tokens': 9, 'budget': 10, 'sections': {'required': 8, 'optional': 1}}
+
+
+def test_prompt_stays_within_budget(make_survey, monkeypatch):
+    table = make_survey(count=2000)
+    monkeypatch.setattr('app.PROMPT_TOKEN_BUDGET', 3000)
+
+    prompt, usage = build_prompt('태블릿으로 공부할 때 불편한 점은?', table)
+
+    assert estimate_tokens(prompt) <= 3000
+    assert usage['estimated_tokens'] <= 3000
+    assert 0 < usage['sample_rows'] < 2000
+    assert usage['total_rows'] == 2000
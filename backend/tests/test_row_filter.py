@@ -0,0 +1,45 @@
+from normalization import GENDER, GRADE_BAND, REGION
+from row_filter import AllOf, AnyOf, ColumnIn, ColumnWhere, Not, bitset_rows, column_bitsets, popcount
+
+
+def brute_force(table, predicate):
+    return [i for i, row in enumerate(table) if predicate(i, row)]
+
+
+def test_column_bitsets_cover_every_row_once(make_survey):
+    table = make_survey(count=300)
+
+    bitsets = column_bitsets(table, GENDER)
+
+    assert sum(popcount(bits) for bits in bitsets.values()) == len(table)
+    assert {value: popcount(bits) for value, bits in bitsets.items()} == table.value_counts(GENDER)
+
+
+def test_combined_filters_match_row_scan(make_survey):
+    table = make_survey(count=300)
+    gender, band, region = table.column(GENDER), table.column(GRADE_BAND), table.column(REGION)
+    tutoring = '과외를 하고 있나요?'
+    row_filter = AllOf(
+        AnyOf(ColumnIn(GRADE_BAND, ['고등학생']), ColumnIn(REGION, ['서울'])),
+        Not(ColumnIn(GENDER, ['남'])),
+        ColumnWhere(tutoring, lambda value: value.startswith('네')),
+    )
+
+    expected = brute_force(table, lambda i, row: (band[i] == '고등학생' or region[i] == '서울')
+                           and gender[i] != '남' and row[tutoring].startswith('네'))
+    assert row_filter.rows(table) == expected
+    assert (ColumnIn(GENDER, ['여']) & ~ColumnIn(GENDER, ['여'])).rows(table) == []
+
+
+def test_free_text_columns_are_scanned_without_bitsets(make_survey):
+    table = make_survey(count=100)
+    name = 'AI 서비스로 공부했던 경험을 자유롭게 적어주세요'
+    value = table[7][name]
+
+    assert ColumnIn(name, [value]).rows(table) == [7]
+
+
+def test_bitset_rows():
+    assert bitset_rows(0) == []
+    assert bitset_rows(0b1000_0101) == [0, 2, 7]
+    assert bitset_rows(1 << 20) == [20]
@@ -0,0 +1,40 @@
+from row_ranking import char_ngrams, row_ranker
+from sheet_table import SheetTable
+
+
+def answers_table(answers):
+    return SheetTable.from_rows([{'이름': f'학생{i}', '답변': answer} for i, answer in enumerate(answers)])
+
+
+def test_char_ngrams():
+    assert char_ngrams('태블릿으로 수학') == ['태블', '블릿', '릿으', '으로', '수학']
+    assert char_ngrams('GPT 네') == ['gp', 'pt', '네']
+
+
+def test_matching_rows_come_first_then_sheet_order():
+    table = answers_table(['수학 학원', '태블릿 화면이 작아요', '영어 단어', '태블릿으로 필기', '국어'])
+
+    ranking = row_ranker(table).rank('태블릿 불편한 점')
+
+    assert set(ranking[:2]) == {1, 3}
+    assert ranking[2:] == [0, 2, 4]
+
+
+def test_more_matching_terms_rank_higher():
+    table = answers_table(['태블릿 좋아요', '태블릿 화면이 작아서 불편해요', '화면 밝기'])
+
+    assert row_ranker(table).rank('태블릿 화면 불편', limit=1) == [1]
+
+
+def test_limit_pads_with_unmatched_rows():
+    table = answers_table(['태블릿', '국어', '영어', '수학'])
+
+    assert row_ranker(table).rank('태블릿', limit=3) == [0, 1, 2]
+    assert row_ranker(table).rank('없는말', limit=2) == [0, 1]
+
+
+def test_rows_restrict_the_ranking_to_a_selection():
+    table = answers_table(['태블릿', '국어', '태블릿 화면', '영어', '수학', '과학'])
+
+    assert row_ranker(table).rank('태블릿', rows=[1, 2, 3, 5]) == [2, 1, 3, 5]
+    assert row_ranker(table).rank('태블릿', limit=2, rows=[1, 3, 4]) == [1, 3]
@@ -0,0 +1,47 @@
+from sheet_table import SHEET_NAME_KEY, SheetTable
+from survey_dates import survey_periods_by_sheet
+
+
+def test_rows_read_like_dicts_with_sheet_name():
+    table = SheetTable.from_rows([{'a': '1', 'b': 'x'}, {'a': '2'}], sheet_name='S')
+
+    assert len(table) == 2
+    assert dict(table[0]) == {'a': '1', 'b': 'x', SHEET_NAME_KEY: 'S'}
+    assert table[1]['b'] == ''
+
+
+def test_duplicate_headers_keep_last_value():
+    table = SheetTable(['q', 'q', 'r'])
+    table.append_row(['first', 'second', 'r1'])
+
+    assert table.column_names == ['q', 'r']
+    assert table[0]['q'] == 'second'
+
+
+def test_take_keeps_selected_rows():
+    table = SheetTable.from_rows([{'a': str(i)} for i in range(5)])
+
+    subset = table.take([4, 1])
+
+    assert [row['a'] for row in subset] == ['4', '1']
+    assert subset.value_counts('a') == {'4': 1, '1': 1}
+
+
+def test_relabelled_views_do_not_share_label_dependent_memos(make_survey):
+    table = make_survey(count=50, name='Sheet1')
+    first = table.with_name('설문 A')
+    second = table.with_name('설문 B')
+
+    assert list(survey_periods_by_sheet(first)) == ['설문 A']
+    assert list(survey_periods_by_sheet(second)) == ['설문 B']
+    assert first.derive('label', lambda view: view.sheet_name) == '설문 A'
+    assert second.derive('label', lambda view: view.sheet_name) == '설문 B'
+
+
+def test_relabelled_views_share_label_independent_aggregates(make_survey):
+    table = make_survey(count=50)
+    view = table.with_name('Other')
+
+    assert view.value_counts('과외를 하고 있나요?') is table.value_counts('과외를 하고 있나요?')
+    assert view.with_name('Sheet1') is table
+    assert view.with_name('Third') is table.with_name('Third')
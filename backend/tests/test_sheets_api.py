@@ -0,0 +1,30 @@
+import pytest
+
+import app
+from sheet_cache import Snapshot
+from sheet_table import SheetTable
+
+
+@pytest.fixture
+def sheets(monkeypatch):
+    listed = [
+        {'name': 'Cached', 'gid': '1', 'grid_row_count': 1000},
+        {'name': 'New', 'gid': '2', 'grid_row_count': 1000},
+    ]
+    monkeypatch.setattr(app, 'get_all_sheet_names', lambda: listed)
+    app.sheet_cache.invalidate()
+    table = SheetTable.from_rows([{'q': str(i)} for i in range(120)])
+    app.sheet_cache.get((app.SPREADSHEET_ID, '1'), lambda previous: Snapshot(table, fetched_at=1700000000))
+    yield
+    app.sheet_cache.invalidate()
+
+
+def test_row_counts_come_from_snapshots_only(sheets):
+    result = app.app.test_client().get('/api/sheets').get_json()
+
+    cached, new = result['sheets']
+    assert (cached['row_count'], cached['row_count_source']) == (120, 'snapshot')
+    assert cached['stale_as_of'] is not None
+    # The grid size counts blank rows, so it is never presented as a row count
+    assert (new['row_count'], new['row_count_source'], new['stale_as_of']) == (None, None, None)
+    assert new['grid_rows'] == 999
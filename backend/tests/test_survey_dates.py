@@ -0,0 +1,53 @@
+from datetime import datetime
+
+from sheet_table import SheetTable
+from survey_dates import parse_submitted_at, survey_period, survey_periods_by_sheet
+
+
+def timestamps_table(values, sheet_name='Sheet1'):
+    return SheetTable.from_rows([{'Submitted At': value, 'q': 'a'} for value in values], sheet_name)
+
+
+def test_parse_submitted_at_formats():
+    assert parse_submitted_at('2025. 1. 19 오후 3:00:00') == datetime(2025, 1, 19)
+    assert parse_submitted_at('2025. 1. 19. 오전 9:10:00') == datetime(2025, 1, 19)
+    assert parse_submitted_at('2025. 03') == datetime(2025, 3, 1)
+    assert parse_submitted_at('2025-02-03 10:00:00') == datetime(2025, 2, 3, 10)
+    assert parse_submitted_at('') is None
+    assert parse_submitted_at('어제') is None
+
+
+def test_period_spans_all_responses_but_is_labelled_by_the_first():
+    table = timestamps_table(['2025. 2. 1 오전 9:00:00', '2025. 1. 5 오후 1:00:00', '잘못된 값', '2025. 3. 9 오후 2:00:00'])
+
+    period = survey_period(table)
+
+    assert period.label == '2025년 2월'
+    assert period.range_label == '2025년 1월 ~ 2025년 3월'
+    assert period.to_dict() == {'label': '2025년 2월', 'start': '2025-01-05', 'end': '2025-03-09'}
+
+
+def test_period_of_a_subset_covers_only_its_rows():
+    table = timestamps_table(['2025. 1. 5 오후 1:00:00', '2025. 6. 5 오후 1:00:00'])
+
+    assert survey_period(table.take([0])).to_dict() == {'label': '2025년 1월', 'start': '2025-01-05',
+                                                         'end': '2025-01-05'}
+
+
+def test_no_timestamp_column():
+    table = SheetTable.from_rows([{'q': 'a'}])
+
+    assert survey_period(table) is None
+    assert survey_periods_by_sheet(table) == {}
+
+
+def test_periods_by_sheet_for_merged_sheets():
+    merged = SheetTable.concat([
+        timestamps_table(['2025. 1. 2 오전 9:00:00'], 'Sheet1'),
+        timestamps_table(['2025. 4. 2 오전 9:00:00', '2025. 5. 2 오전 9:00:00'], 'Sheet2'),
+    ])
+
+    periods = survey_periods_by_sheet(merged)
+
+    assert {name: period.range_label for name, period in periods.items()} == {
+        'Sheet1': '2025년 1월', 'Sheet2': '2025년 4월 ~ 2025년 5월'}
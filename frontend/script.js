@@ -10,6 +10,8 @@ const API_BASE_URL = window.location.hostname === 'localhost'
     : 'https://sheet-llm-chatbot-backend.onrender.com'; // Render backend URL
 
 const API_URL = `${API_BASE_URL}/api/chat`;
+// 답변을 생성되는 대로 받아 표시하는 스트리밍 엔드포인트 (server-sent events)
+const STREAM_API_URL = `${API_BASE_URL}/api/chat/stream`;
 console.log('API Base URL:', API_BASE_URL);
 
 // 현재 선택된 시트 정보
@@ -120,7 +122,7 @@ async function sendMessage() {
     chatMessages.scrollTop = chatMessages.scrollHeight;
     
     try {
-        console.log('Sending request to:', API_URL);
+        console.log('Sending request to:', STREAM_API_URL);
         console.log('Conversation history length:', conversationContexts[contextId].length);
         console.log('Request payload:', { 
             question: question,
@@ -130,7 +132,7 @@ async function sendMessage() {
             conversation_history: conversationContexts[contextId].slice(-10) // 최근 10개 메시지만 전송
         });
         
-        const response = await fetch(API_URL, {
+        const response = await fetch(STREAM_API_URL, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -147,41 +149,19 @@ async function sendMessage() {
         });
         
         console.log('Response status:', response.status);
-        console.log('Response headers:', response.headers);
         
-        const data = await response.json();
+        // 답변 시작 전 오류(잘못된 요청, 시트 접근 실패 등)는 /api/chat과 같은 JSON으로 옴
+        const contentType = response.headers.get('Content-Type') || '';
+        let data;
+        if (response.ok && contentType.includes('text/event-stream')) {
+            data = await readAnswerStream(response, botMessageElement, chatMessages);
+        } else {
+            data = await response.json();
+        }
         console.log('Response data:', data);
         
-        if (response.ok && data.answer) {
-            // 로딩 제거하고 답변 표시
-            let responseHTML = `<div class="message-content">${formatAnswer(data.answer)}</div>`;
-            
-            // 웹 검색 결과가 있으면 별도로 표시
-            if (data.web_search_count && data.web_search_count > 0 && data.search_sources) {
-                responseHTML += `
-                    <div class="web-search-results">
-                        <h4>🔍 관련 웹 검색 결과</h4>
-                        <div class="search-results-list">
-                `;
-                
-                data.search_sources.forEach((source, index) => {
-                    responseHTML += `
-                        <div class="search-result-item">
-                            <a href="${source.link}" target="_blank" rel="noopener noreferrer">
-                                <strong>${index + 1}. ${source.title}</strong>
-                            </a>
-                            <div class="search-source">출처: ${source.source}</div>
-                        </div>
-                    `;
-                });
-                
-                responseHTML += `
-                        </div>
-                    </div>
-                `;
-            }
-            
-            botMessageElement.innerHTML = responseHTML;
+        if (data && data.answer) {
+            botMessageElement.innerHTML = renderAnswer(data);
             
             // 봇 답변을 대화 컨텍스트에 추가
             conversationContexts[contextId].push({
@@ -190,7 +170,7 @@ async function sendMessage() {
             });
         } else {
             console.error('Error in response:', data);
-            botMessageElement.innerHTML = `<div class="message-content">오류: ${data.error || '알 수 없는 오류가 발생했습니다.'}</div>`;
+            botMessageElement.innerHTML = `<div class="message-content">오류: ${(data && data.error) || '알 수 없는 오류가 발생했습니다.'}</div>`;
         }
         
     } catch (error) {
@@ -207,6 +187,86 @@ async function sendMessage() {
     }
 }
 
+// 스트리밍 응답(server-sent events)을 읽으며 답변을 생성되는 대로 표시
+// 'done' 이벤트의 응답 본문(/api/chat과 같은 형식) 또는 'error' 이벤트의 내용을 반환
+async function readAnswerStream(response, botMessageElement, chatMessages) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder('utf-8');
+    let buffer = '';
+    let answer = '';
+    let result = null;
+    let contentElement = null;
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        
+        // 이벤트는 빈 줄로 구분됨
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) >= 0) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            
+            let eventType = 'message';
+            let eventData = '';
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event: ')) eventType = line.slice(7);
+                else if (line.startsWith('data: ')) eventData += line.slice(6);
+            });
+            if (!eventData) continue;
+            const payload = JSON.parse(eventData);
+            
+            if (eventType === 'delta') {
+                answer += payload.text;
+                if (!contentElement) {
+                    // 첫 토큰이 오면 로딩 표시를 답변으로 교체
+                    botMessageElement.innerHTML = '<div class="message-content"></div>';
+                    contentElement = botMessageElement.querySelector('.message-content');
+                }
+                contentElement.innerHTML = formatAnswer(answer);
+                chatMessages.scrollTop = chatMessages.scrollHeight;
+            } else if (eventType === 'done' || eventType === 'error') {
+                result = payload;
+            }
+        }
+    }
+    
+    return result || { error: '응답이 중간에 끊겼습니다.' };
+}
+
+// 답변과 (있으면) 웹 검색 결과 HTML
+function renderAnswer(data) {
+    let responseHTML = `<div class="message-content">${formatAnswer(data.answer)}</div>`;
+    
+    // 웹 검색 결과가 있으면 별도로 표시
+    if (data.web_search_count && data.web_search_count > 0 && data.search_sources) {
+        responseHTML += `
+            <div class="web-search-results">
+                <h4>🔍 관련 웹 검색 결과</h4>
+                <div class="search-results-list">
+        `;
+        
+        data.search_sources.forEach((source, index) => {
+            responseHTML += `
+                <div class="search-result-item">
+                    <a href="${source.link}" target="_blank" rel="noopener noreferrer">
+                        <strong>${index + 1}. ${source.title}</strong>
+                    </a>
+                    <div class="search-source">출처: ${source.source}</div>
+                </div>
+            `;
+        });
+        
+        responseHTML += `
+                </div>
+            </div>
+        `;
+    }
+    
+    return responseHTML;
+}
+
 // 메시지 추가 헬퍼 함수
 function addMessage(content, sender, isLoading = false) {
     const chatMessages = document.getElementById('chat-messages');